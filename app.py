@@ -1,14 +1,279 @@
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, simpledialog
+import numpy as np
 import pandas as pd
 import json
 import os
+import queue
+import threading
 from datetime import datetime
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.units import inch
+
+import bitacora
+from bitacora import Bitacora
+from busqueda import IndiceNombres
+from exportacion import COLUMNAS_EXPORTACION, exportar, formato_archivo, lotes_dataframe, mascara_filtros
+from importacion import (COLUMNA_NOMBRE, COLUMNAS_CATEGORICAS, ErrorFormato, agregar_categorias, calcular_diferencias,
+                         columnas_combinables, compactar_asociados, hash_filas, leer_por_bloques, nombres_completos,
+                         normalizar_cedula, normalizar_nombre, tipos_compactos)
+from reportes import COLUMNAS_RECIBO, COLUMNAS_REPORTE, generar_recibos, generar_reporte
+
+# Filas extra materializadas bajo la ventana visible de la tabla
+BUFFER_TABLA = 2
+
+# Búsqueda en tiempo real: espera tras la última tecla (ms) y máximo de
+# coincidencias calculadas por búsqueda
+DEMORA_BUSQUEDA = 250
+LIMITE_COINCIDENCIAS = 5000
+
+# Alto aproximado de una tarjeta de resultado (px) para calcular cuántas caben
+ALTO_TARJETA = 150
+
+# Filas cambiadas por una reimportación que se repintan una a una; con más se
+# reconstruyen la tabla y las vistas de una vez (unos 3 ms por fila contra
+# unos 45 ms la reconstrucción de 50.000 registros)
+MAX_CAMBIOS_FILA_A_FILA = 20
+
+# Lotes ya copiados que esperan al hilo de exportación: la memoria extra de una
+# exportación queda acotada a estos lotes
+LOTES_EN_ESPERA = 2
+
+
+def columnas_tabla(df):
+    """Precalcular las columnas de texto que muestra la tabla de registros"""
+    if df.empty:
+        return [[] for _ in range(6)]
+    
+    def texto(columna):
+        if columna not in df.columns:
+            return pd.Series('', index=df.index)
+        return df[columna].fillna('').astype(str)
+    
+    nombre_completo = (texto('NOMBRE 1') + ' ' + texto('NOMBRE 2') + ' ' +
+                       texto('APELLIDO 1') + ' ' + texto('APELLIDO 2'))
+    observaciones = texto('OBSERVACIONES')
+    observaciones = observaciones.where(observaciones.str.len() <= 50, observaciones.str[:50] + '...')
+    
+    # Estado con icono: entregado, pendiente con novedad o pendiente
+    estado = pd.Series('⏳ PENDIENTE', index=df.index)
+    estado = estado.mask(observaciones.str.strip() != '', '⚠️ PENDIENTE')
+    estado = estado.mask(texto('ESTADO') == 'ENTREGADO', '✅ ENTREGADO')
+    
+    return [texto('CEDULA').tolist(), nombre_completo.tolist(), texto('AGENCIA').tolist(),
+            texto('EMPRESA').tolist(), estado.tolist(), observaciones.tolist()]
+
+
+class ContadoresEntregas:
+    """Contadores de entregas por agencia y empresa, actualizados por deltas"""
+    
+    CAMPOS = ['AGENCIA', 'EMPRESA', 'ESTADO', 'OBSERVACIONES']
+    
+    def __init__(self):
+        # (agencia, empresa) -> [total, entregados, novedades]
+        self.grupos = {}
+        self.total = 0
+        self.entregados = 0
+        self.novedades = 0
+    
+    @property
+    def pendientes(self):
+        return self.total - self.entregados
+    
+    def reconstruir(self, df):
+        """Calcular todos los contadores en una sola pasada (al importar)"""
+        self.grupos = {}
+        self.total = self.entregados = self.novedades = 0
+        if df.empty:
+            return
+        
+        agrupado = pd.DataFrame({
+            'AGENCIA': df['AGENCIA'].fillna('').astype(str),
+            'EMPRESA': df['EMPRESA'].fillna('').astype(str),
+            'TOTAL': 1,
+            'ENTREGADOS': (df['ESTADO'] == 'ENTREGADO').astype(int),
+            'NOVEDADES': (df['OBSERVACIONES'].fillna('').astype(str).str.strip() != '').astype(int),
+        }).groupby(['AGENCIA', 'EMPRESA']).sum()
+        
+        for clave, total, entregados, novedades in zip(agrupado.index, agrupado['TOTAL'],
+                                                      agrupado['ENTREGADOS'], agrupado['NOVEDADES']):
+            self.grupos[clave] = [int(total), int(entregados), int(novedades)]
+            self.total += int(total)
+            self.entregados += int(entregados)
+            self.novedades += int(novedades)
+    
+    def agregar(self, fila):
+        self._sumar(fila, 1)
+    
+    def quitar(self, fila):
+        self._sumar(fila, -1)
+    
+    def _sumar(self, fila, signo):
+        agencia = fila.get('AGENCIA')
+        empresa = fila.get('EMPRESA')
+        clave = (str(agencia) if pd.notna(agencia) else '', str(empresa) if pd.notna(empresa) else '')
+        observaciones = fila.get('OBSERVACIONES')
+        entregado = int(fila.get('ESTADO') == 'ENTREGADO')
+        novedad = int(pd.notna(observaciones) and str(observaciones).strip() != '')
+        
+        grupo = self.grupos.setdefault(clave, [0, 0, 0])
+        grupo[0] += signo
+        grupo[1] += signo * entregado
+        grupo[2] += signo * novedad
+        if grupo[0] == 0:
+            del self.grupos[clave]
+        self.total += signo
+        self.entregados += signo * entregado
+        self.novedades += signo * novedad
+    
+    def actualizar(self, fila_anterior, fila_nueva):
+        """Aplicar el cambio de una fila en O(1): restar la versión anterior y sumar la nueva"""
+        self._sumar(fila_anterior, -1)
+        self._sumar(fila_nueva, 1)
+    
+    def por_agencia(self):
+        """Totales por agencia: {agencia: (total, entregados, pendientes, novedades)}"""
+        agencias = {}
+        for (agencia, _), (total, entregados, novedades) in self.grupos.items():
+            acumulado = agencias.setdefault(agencia, [0, 0, 0])
+            acumulado[0] += total
+            acumulado[1] += entregados
+            acumulado[2] += novedades
+        return {agencia: (t, e, t - e, n) for agencia, (t, e, n) in agencias.items() if t > 0}
+
+
+class VistasFiltro:
+    """Filas de cada filtro de la tabla como máscaras booleanas, actualizadas por deltas
+
+    Las posiciones de cada vista se calculan solo cuando su máscara cambió; cambiar
+    de filtro sin entregas de por medio reutiliza el mismo arreglo.
+    """
+    
+    FILTROS = ('entregados', 'pendientes', 'novedades')
+    
+    def __init__(self):
+        self.mascaras = {}
+        self.posiciones = {'todos': np.arange(0)}
+    
+    def reconstruir(self, df):
+        """Calcular todas las máscaras en una pasada vectorizada (al cambiar las filas)"""
+        self.posiciones = {'todos': np.arange(len(df))}
+        if df.empty:
+            self.mascaras = {nombre: np.zeros(0, dtype=bool) for nombre in self.FILTROS}
+            return
+        
+        entregado = (df['ESTADO'] == 'ENTREGADO').to_numpy(dtype=bool, copy=True)
+        novedad = (df['OBSERVACIONES'].fillna('').astype(str).str.strip() != '').to_numpy(dtype=bool, copy=True)
+        self.mascaras = {'entregados': entregado, 'pendientes': ~entregado, 'novedades': novedad}
+    
+    def actualizar(self, posicion, fila):
+        """Reflejar el cambio de una fila en O(1) e invalidar solo las vistas afectadas"""
+        observaciones = fila.get('OBSERVACIONES')
+        entregado = fila.get('ESTADO') == 'ENTREGADO'
+        valores = {
+            'entregados': entregado,
+            'pendientes': not entregado,
+            'novedades': pd.notna(observaciones) and str(observaciones).strip() != '',
+        }
+        for nombre, valor in valores.items():
+            if self.mascaras[nombre][posicion] != valor:
+                self.mascaras[nombre][posicion] = valor
+                self.posiciones.pop(nombre, None)
+    
+    def vista(self, nombre):
+        """Posiciones (en el orden de los datos) de las filas del filtro `nombre`"""
+        if nombre not in self.posiciones:
+            self.posiciones[nombre] = np.flatnonzero(self.mascaras[nombre])
+        return self.posiciones[nombre]
+
+
+def enlazar_rueda(widget, desplazar):
+    """Desplazar con la rueda del ratón sobre el widget y todos sus hijos"""
+    widget.bind('<MouseWheel>', lambda e: desplazar('scroll', -1 if e.delta > 0 else 1, 'units'))
+    widget.bind('<Button-4>', lambda e: desplazar('scroll', -1, 'units'))
+    widget.bind('<Button-5>', lambda e: desplazar('scroll', 1, 'units'))
+    for hijo in widget.winfo_children():
+        enlazar_rueda(hijo, desplazar)
+
+
+class TarjetaResultado:
+    """Tarjeta de resultado de búsqueda reutilizable
+
+    Los widgets se crean una sola vez; al desplazar la lista la misma tarjeta
+    se rellena con otra fila (ver SistemaEntregaRegalos.renderizar_ventana_resultados).
+    """
+    
+    def __init__(self, parent, sistema):
+        self.index = None
+        
+        # Frame principal de la tarjeta
+        self.frame = tk.Frame(parent, bg='#f8f9fa', relief='raised', bd=1)
+        
+        # Header de la tarjeta
+        header_frame = tk.Frame(self.frame, bg='#2E8B57')
+        header_frame.pack(fill='x')
+        self.nombre = tk.Label(header_frame, font=('Arial', 12, 'bold'), fg='white', bg='#2E8B57')
+        self.nombre.pack(side='left', padx=10, pady=5)
+        self.estado = tk.Label(header_frame, font=('Arial', 10, 'bold'), fg='white')
+        self.estado.pack(side='right', padx=10, pady=5)
+        
+        # Contenido de la tarjeta
+        content_frame = tk.Frame(self.frame, bg='white')
+        content_frame.pack(fill='x', padx=10, pady=10)
+        self.info = tk.Label(content_frame, justify='left', font=('Arial', 10), bg='white')
+        self.info.pack(anchor='w')
+        
+        # Observaciones (solo se empaqueta si existen)
+        self.obs_frame = tk.Frame(content_frame, bg='#fff3cd', relief='solid', bd=1)
+        tk.Label(self.obs_frame, text="⚠️ OBSERVACIONES:", font=('Arial', 10, 'bold'),
+                fg='#856404', bg='#fff3cd').pack(anchor='w', padx=5, pady=2)
+        self.observaciones = tk.Label(self.obs_frame, font=('Arial', 10),
+                                      fg='#856404', bg='#fff3cd', wraplength=400)
+        self.observaciones.pack(anchor='w', padx=5, pady=2)
+        
+        # Botones de acción
+        self.btn_frame = tk.Frame(content_frame, bg='white')
+        self.btn_frame.pack(fill='x', pady=(10,0))
+        self.btn_entregar = tk.Button(self.btn_frame, text="✅ Marcar como Entregado", bg='#28a745', fg='white',
+                                      command=lambda: sistema.marcar_entregado(self.index),
+                                      relief='flat', padx=10, pady=5)
+        self.btn_editar = tk.Button(self.btn_frame, text="✏️ Editar", bg='#007bff', fg='white',
+                                    command=lambda: sistema.editar_registro_busqueda(self.index),
+                                    relief='flat', padx=10, pady=5)
+        self.btn_editar.pack(side='left', padx=5)
+        
+        enlazar_rueda(self.frame, sistema.desplazar_resultados)
+    
+    def mostrar(self, index, row):
+        """Rellenar la tarjeta con la fila `index`"""
+        self.index = index
+        self.nombre.config(text=f"👤 {row['NOMBRE 1']} {row['NOMBRE 2']} {row['APELLIDO 1']} {row['APELLIDO 2']}")
+        
+        estado = row.get('ESTADO', 'PENDIENTE')
+        self.estado.config(text=estado, bg='#28a745' if estado == 'ENTREGADO' else '#ffc107')
+        
+        self.info.config(text=f"""📊 Cédula: {row['CEDULA']}
+🏢 Agencia: {row['AGENCIA']}
+🏭 Empresa: {row['EMPRESA']}""")
+        
+        # Observaciones (destacadas si existen)
+        observaciones = row['OBSERVACIONES']
+        if pd.notna(observaciones) and str(observaciones).strip():
+            self.observaciones.config(text=str(observaciones))
+            self.obs_frame.pack(fill='x', pady=(10,0), before=self.btn_frame)
+        else:
+            self.obs_frame.pack_forget()
+        
+        if estado == 'PENDIENTE':
+            self.btn_entregar.pack(side='left', padx=5, before=self.btn_editar)
+        else:
+            self.btn_entregar.pack_forget()
+        
+        if not self.frame.winfo_manager():
+            self.frame.pack(fill='x', padx=10, pady=5)
+    
+    def ocultar(self):
+        self.index = None
+        self.frame.pack_forget()
+
 
 class SistemaEntregaRegalos:
     def __init__(self, root):
@@ -19,9 +284,62 @@ class SistemaEntregaRegalos:
         
         # Datos del sistema
         self.datos_asociados = pd.DataFrame()
-        self.datos_filtrados = pd.DataFrame()
         self.archivo_actual = None
         
+        # Bitácora de eventos junto al archivo cargado (ver bitacora.py)
+        self.bitacora = None
+        
+        # Tabla virtualizada: columnas precalculadas de todas las filas y ventana visible
+        self.columnas_registro = columnas_tabla(self.datos_asociados)
+        self.indices_registro = []
+        self.posicion_registro = {}  # índice del DataFrame -> posición en los datos
+        self.vistas = VistasFiltro()
+        self.vista_registro = self.vistas.vista('todos')  # posiciones mostradas, en orden
+        self.tabla_inicio = 0
+        self.filas_visibles = 15
+        self.items_tabla = {}  # item del Treeview -> índice del DataFrame
+        
+        # Resultados de búsqueda virtualizados: solo existen las tarjetas que caben
+        self.claves_resultado = []  # todas las coincidencias, en orden
+        self.resultados_inicio = 0
+        self.tarjetas_visibles = 4
+        self.tarjetas = []  # TarjetaResultado reutilizables
+        self.lista_resultados = None
+        self.resultados_scrollbar = None
+        self.tarjetas_resultado = {}  # índice del DataFrame -> tarjeta visible
+        
+        # Suscriptores a cambios de una fila, notificados con su índice
+        self.observadores_cambios = [
+            self.actualizar_nombre_fila,
+            self.actualizar_vistas,
+            self.actualizar_fila_tabla,
+            self.actualizar_tarjeta_resultado,
+            self.actualizar_hash_fila,
+            lambda index: self.actualizar_estadisticas(),
+        ]
+        
+        # Índice hash cédula -> índice del DataFrame para búsquedas exactas
+        self.indice_cedulas = {}
+        
+        # Índice de trigramas de los nombres para búsquedas aproximadas
+        self.indice_nombres = IndiceNombres([], [])
+        
+        # Búsqueda en un hilo de trabajo: solo vale el resultado de la última generación
+        self.generacion_busqueda = 0
+        self.solicitud_busqueda = None
+        self.condicion_busqueda = threading.Condition()
+        self.cola_busqueda = queue.Queue()
+        self.busqueda_programada = None
+        self.hilo_busqueda = None
+        self.buscando = False
+        self.revisando_busqueda = False
+        
+        # Huella de los datos de cada fila para combinar reimportaciones
+        self.hashes_filas = hash_filas(self.datos_asociados)
+        
+        # Contadores de estadísticas mantenidos incrementalmente
+        self.contadores = ContadoresEntregas()
+        
         # Variables de estadísticas
         self.var_total = tk.StringVar(value="0")
         self.var_entregados = tk.StringVar(value="0")
@@ -30,6 +348,7 @@ class SistemaEntregaRegalos:
         
         self.crear_interfaz()
         self.actualizar_estadisticas()
+        self.root.after(100, self.ofrecer_recuperacion)
     
     def crear_interfaz(self):
         # Header
@@ -79,7 +398,7 @@ class SistemaEntregaRegalos:
         frame.grid(row=0, column=column, padx=5, pady=5, sticky='ew')
         parent.columnconfigure(column, weight=1)
         
-        tk.Label(frame, text=variable.get(), font=('Arial', 24, 'bold'), 
+        tk.Label(frame, textvariable=variable, font=('Arial', 24, 'bold'), 
                 bg=color, fg='#333').pack(pady=5)
         tk.Label(frame, text=titulo, font=('Arial', 10), 
                 bg=color, fg='#666').pack(pady=(0,5))
@@ -159,12 +478,25 @@ class SistemaEntregaRegalos:
                                font=('Arial', 12), width=40)
         search_entry.pack(side='left', padx=(0,10))
         search_entry.bind('<KeyRelease>', self.buscar_tiempo_real)
+        search_entry.bind('<Return>', self.procesar_escaneo)
+        self.search_entry = search_entry
         
         tk.Button(entry_frame, text="🔍 Buscar", bg='#007bff', fg='white',
                  command=self.buscar_asociado, relief='flat', padx=15).pack(side='left', padx=2)
         tk.Button(entry_frame, text="🗑️ Limpiar", bg='#6c757d', fg='white',
                  command=self.limpiar_busqueda, relief='flat', padx=15).pack(side='left', padx=2)
         
+        # Modo escáner (lector de código de barras o de cédula)
+        scan_frame = tk.Frame(search_frame)
+        scan_frame.pack(fill='x', pady=(5,0))
+        
+        self.modo_escaner = tk.BooleanVar(value=False)
+        self.entrega_automatica = tk.BooleanVar(value=False)
+        tk.Checkbutton(scan_frame, text="📷 Modo escáner (Enter busca la cédula exacta)",
+                      variable=self.modo_escaner, font=('Arial', 9)).pack(side='left')
+        tk.Checkbutton(scan_frame, text="⚡ Entregar automáticamente",
+                      variable=self.entrega_automatica, font=('Arial', 9)).pack(side='left', padx=10)
+        
         # Resultados de búsqueda
         self.resultado_frame = tk.Frame(busqueda_frame, bg='white')
         self.resultado_frame.pack(fill='both', expand=True, padx=20, pady=10)
@@ -182,8 +514,12 @@ class SistemaEntregaRegalos:
                  font=('Arial', 10, 'bold'), command=self.generar_reporte_pdf,
                  relief='flat', padx=15, pady=8).pack(side='left', padx=5)
         
-        tk.Button(control_frame, text="📊 Exportar CSV", bg='#ffc107', fg='black',
-                 font=('Arial', 10, 'bold'), command=self.exportar_csv,
+        tk.Button(control_frame, text="🧾 Recibos de Entrega", bg='#6f42c1', fg='white',
+                 font=('Arial', 10, 'bold'), command=self.generar_recibos_entrega,
+                 relief='flat', padx=15, pady=8).pack(side='left', padx=5)
+        
+        tk.Button(control_frame, text="📊 Exportar Datos", bg='#ffc107', fg='black',
+                 font=('Arial', 10, 'bold'), command=self.exportar_datos,
                  relief='flat', padx=15, pady=8).pack(side='left', padx=5)
         
         tk.Button(control_frame, text="📈 Ver Historial", bg='#17a2b8', fg='white',
@@ -206,10 +542,12 @@ class SistemaEntregaRegalos:
             self.tree.heading(col, text=col)
             self.tree.column(col, width=column_widths.get(col, 100))
         
-        # Scrollbars
-        v_scrollbar = ttk.Scrollbar(tabla_frame, orient='vertical', command=self.tree.yview)
+        # Scrollbars: la vertical recorre todos los datos, el Treeview solo tiene la ventana visible
+        v_scrollbar = ttk.Scrollbar(tabla_frame, orient='vertical', command=self.desplazar_tabla)
         h_scrollbar = ttk.Scrollbar(tabla_frame, orient='horizontal', command=self.tree.xview)
-        self.tree.configure(yscrollcommand=v_scrollbar.set, xscrollcommand=h_scrollbar.set)
+        self.tree.configure(xscrollcommand=h_scrollbar.set)
+        self.tabla_scrollbar = v_scrollbar
+        self.alto_fila = int(ttk.Style().lookup('Treeview', 'rowheight') or 20)
         
         # Empaquetar tabla y scrollbars
         self.tree.pack(side='left', fill='both', expand=True)
@@ -218,6 +556,14 @@ class SistemaEntregaRegalos:
         
         # Eventos
         self.tree.bind('<Double-1>', self.editar_registro)
+        self.tree.bind('<Configure>', self.redimensionar_tabla)
+        self.tree.bind('<MouseWheel>', lambda e: self.desplazar_tabla('scroll', -3 if e.delta > 0 else 3, 'units'))
+        self.tree.bind('<Button-4>', lambda e: self.desplazar_tabla('scroll', -3, 'units'))
+        self.tree.bind('<Button-5>', lambda e: self.desplazar_tabla('scroll', 3, 'units'))
+        self.tree.bind('<Up>', lambda e: self.mover_seleccion_tabla(-1))
+        self.tree.bind('<Down>', lambda e: self.mover_seleccion_tabla(1))
+        self.tree.bind('<Prior>', lambda e: self.desplazar_tabla('scroll', -1, 'pages'))
+        self.tree.bind('<Next>', lambda e: self.desplazar_tabla('scroll', 1, 'pages'))
     
     def crear_pestaña_herramientas(self):
         # Frame para herramientas avanzadas
@@ -275,41 +621,263 @@ class SistemaEntregaRegalos:
         )
         
         if archivo:
-            try:
-                # Cargar según el tipo de archivo
-                if archivo.endswith('.csv'):
-                    df = pd.read_csv(archivo)
-                else:
-                    df = pd.read_excel(archivo)
-                
-                # Validar columnas requeridas
-                columnas_requeridas = ['CEDULA', 'APELLIDO 1', 'APELLIDO 2', 
-                                     'NOMBRE 1', 'NOMBRE 2', 'AGENCIA', 'EMPRESA']
-                
-                columnas_faltantes = [col for col in columnas_requeridas if col not in df.columns]
-                
-                if columnas_faltantes:
-                    messagebox.showerror("Error de formato", 
-                                       f"El archivo no contiene las columnas requeridas:\n{', '.join(columnas_faltantes)}")
+            combinar = False
+            if not self.datos_asociados.empty:
+                combinar = messagebox.askyesnocancel(
+                    "Importar archivo",
+                    "Ya hay datos cargados.\n\n"
+                    "Sí: combinar con los datos actuales (solo aplica los cambios y conserva las entregas registradas)\n"
+                    "No: reemplazar todos los datos")
+                if combinar is None:
                     return
+            self.iniciar_importacion(archivo, combinar)
+    
+    def iniciar_importacion(self, archivo, combinar=False):
+        """Leer el archivo en un hilo de trabajo mostrando el progreso"""
+        self.cola_importacion = queue.Queue()
+        self.cancelar_importacion = threading.Event()
+        self.archivo_importando = archivo
+        self.combinar_importando = combinar
+        
+        self.ventana_importacion, self.progreso_importacion, self.estado_importacion = self.crear_ventana_progreso(
+            "Importando archivo", f"📂 {os.path.basename(archivo)}", "Leyendo...", self.cancelar_importacion.set)
+        
+        threading.Thread(target=self.leer_archivo_en_hilo,
+                         args=(archivo, self.cola_importacion, self.cancelar_importacion),
+                         daemon=True).start()
+        self.root.after(100, self.revisar_importacion)
+    
+    def crear_ventana_progreso(self, titulo, texto, estado, cancelar=None):
+        """Ventana modal con barra de progreso; devuelve (ventana, barra, etiqueta de estado)"""
+        ventana = tk.Toplevel(self.root)
+        ventana.title(titulo)
+        ventana.geometry("420x150")
+        ventana.transient(self.root)
+        ventana.grab_set()
+        # Sin cancelación la ventana no se puede cerrar hasta que termine el trabajo
+        ventana.protocol("WM_DELETE_WINDOW", cancelar or (lambda: None))
+        
+        tk.Label(ventana, text=texto, font=('Arial', 10, 'bold')).pack(pady=(15,5))
+        barra = ttk.Progressbar(ventana, length=360, maximum=100)
+        barra.pack(pady=5)
+        etiqueta = tk.Label(ventana, text=estado, font=('Arial', 9))
+        etiqueta.pack()
+        if cancelar:
+            tk.Button(ventana, text="❌ Cancelar", bg='#6c757d', fg='white',
+                     command=cancelar, relief='flat', padx=15).pack(pady=8)
+        return ventana, barra, etiqueta
+    
+    def leer_archivo_en_hilo(self, archivo, cola, cancelar):
+        """Hilo de trabajo: leer por bloques y comunicar el avance por la cola"""
+        try:
+            bloques = []
+            filas = 0
+            for bloque, progreso in leer_por_bloques(archivo):
+                if cancelar.is_set():
+                    cola.put(('cancelado',))
+                    return
+                bloques.append(bloque)
+                filas += len(bloque)
+                cola.put(('progreso', progreso, filas))
+            
+            # Tipos compactos y nombre normalizado se calculan aquí, fuera de la interfaz;
+            # sin columna OBSERVACIONES en el archivo validar_bloque la deja vacía (None)
+            df = pd.concat(bloques, ignore_index=True)
+            con_observaciones = bool(df['OBSERVACIONES'].notna().any())
+            cola.put(('fin', compactar_asociados(df), con_observaciones))
+        except ErrorFormato as e:
+            cola.put(('formato', str(e)))
+        except Exception as e:
+            cola.put(('error', str(e)))
+    
+    def revisar_importacion(self):
+        """Atender los mensajes del hilo de importación desde el hilo de la interfaz"""
+        try:
+            while True:
+                mensaje = self.cola_importacion.get_nowait()
+                tipo = mensaje[0]
                 
-                # Agregar columnas adicionales si no existen
-                if 'OBSERVACIONES' not in df.columns:
-                    df['OBSERVACIONES'] = ''
-                if 'ESTADO' not in df.columns:
-                    df['ESTADO'] = 'PENDIENTE'
-                if 'FECHA_ENTREGA' not in df.columns:
-                    df['FECHA_ENTREGA'] = ''
-                
-                self.datos_asociados = df
-                self.archivo_actual = archivo
-                self.actualizar_tabla()
-                self.actualizar_estadisticas()
+                if tipo == 'progreso':
+                    self.progreso_importacion['value'] = mensaje[1] * 100
+                    self.estado_importacion.config(text=f"{mensaje[2]:,} registros leídos")
+                    continue
                 
-                messagebox.showinfo("Éxito", f"Archivo cargado correctamente.\n{len(df)} registros importados.")
+                self.ventana_importacion.destroy()
+                if tipo == 'fin' and self.cancelar_importacion.is_set():
+                    tipo = 'cancelado'
                 
-            except Exception as e:
-                messagebox.showerror("Error", f"Error al cargar el archivo:\n{str(e)}")
+                if tipo == 'fin' and self.combinar_importando:
+                    self.combinar_importacion(mensaje[1], self.archivo_importando, mensaje[2])
+                elif tipo == 'fin':
+                    self.aplicar_importacion(mensaje[1], self.archivo_importando)
+                elif tipo == 'formato':
+                    messagebox.showerror("Error de formato", mensaje[1])
+                elif tipo == 'error':
+                    messagebox.showerror("Error", f"Error al cargar el archivo:\n{mensaje[1]}")
+                else:
+                    messagebox.showinfo("Importación cancelada", "No se modificaron los datos cargados.")
+                return
+        except queue.Empty:
+            pass
+        
+        self.root.after(100, self.revisar_importacion)
+    
+    def aplicar_importacion(self, df, archivo):
+        """Reemplazar los datos cargados por los del archivo importado"""
+        self.datos_asociados = df
+        self.archivo_actual = archivo
+        self.iniciar_bitacora(archivo, df)
+        self.reconstruir_indices()
+        self.actualizar_tabla()
+        self.actualizar_estadisticas()
+        
+        messagebox.showinfo("Éxito", f"Archivo cargado correctamente.\n{len(df)} registros importados.")
+    
+    def iniciar_bitacora(self, archivo, df=None, secuencia=0):
+        """Abrir la bitácora del archivo; con `df` empieza una sesión nueva desde esos datos"""
+        self.cerrar_bitacora()
+        try:
+            self.bitacora = Bitacora(archivo, secuencia, df)
+        except OSError as e:
+            messagebox.showwarning("Sin respaldo automático",
+                                  f"No se pudo crear la bitácora junto al archivo:\n{e}\n\n"
+                                  "Las entregas no se guardarán hasta exportar los datos.")
+    
+    def cerrar_bitacora(self):
+        if self.bitacora is not None:
+            self.bitacora.cerrar()
+            self.bitacora = None
+    
+    def registrar_evento(self, tipo, index=None, valores=None):
+        """Anexar el cambio a la bitácora y compactarla cada tanto en una instantánea"""
+        if self.bitacora is None:
+            return
+        self.bitacora.registrar(tipo, index, valores)
+        if self.bitacora.necesita_instantanea():
+            self.bitacora.solicitar_instantanea(self.datos_asociados)
+    
+    def ofrecer_recuperacion(self):
+        """Al iniciar, recuperar la última sesión (instantánea más bitácora) si existe"""
+        archivo = bitacora.ultima_sesion()
+        if archivo is None or not self.datos_asociados.empty:
+            return
+        if not messagebox.askyesno("Recuperar sesión",
+                                   f"Se encontraron entregas registradas para:\n{archivo}\n\n"
+                                   "¿Desea recuperar la última sesión?"):
+            return
+        
+        try:
+            df, secuencia, reproducidos = bitacora.recuperar(archivo)
+        except Exception as e:
+            messagebox.showerror("Error", f"No se pudo recuperar la sesión:\n{str(e)}")
+            return
+        
+        self.datos_asociados = df
+        self.archivo_actual = archivo
+        self.iniciar_bitacora(archivo, secuencia=secuencia)
+        self.reconstruir_indices()
+        self.actualizar_tabla()
+        self.actualizar_estadisticas()
+        messagebox.showinfo("Sesión recuperada",
+                           f"{len(df)} registros cargados.\n{reproducidos} cambios recuperados de la bitácora.")
+    
+    def combinar_importacion(self, df, archivo, con_observaciones=True):
+        """Aplicar solo las altas, cambios y bajas del archivo conservando las entregas
+
+        Sin columna OBSERVACIONES en el archivo se conservan las observaciones guardadas.
+        """
+        # Un archivo sin registros daría de baja a todos los asociados
+        if df.empty:
+            messagebox.showwarning("Archivo vacío", "El archivo no contiene registros.\n"
+                                   "No se modificaron los datos cargados.")
+            return None
+        
+        columnas = columnas_combinables(con_observaciones)
+        nuevos, cambiados, indices_cambiados, eliminados = calcular_diferencias(
+            self.datos_asociados, self.hashes_filas, df, columnas)
+        eliminados = [int(index) for index in eliminados]
+        
+        # Altas con índices nuevos a continuación de los existentes
+        inicio = self.datos_asociados.index.max() + 1 if not self.datos_asociados.empty else 0
+        nuevos = nuevos.set_axis(pd.RangeIndex(inicio, inicio + len(nuevos)))
+        
+        # El evento se arma antes de tocar los datos: si algo falla al armarlo, la
+        # memoria sigue igual a lo que reproduce la bitácora
+        evento = {
+            'archivo': archivo,
+            'nuevos': nuevos.drop(columns=COLUMNA_NOMBRE, errors='ignore').astype(str).to_dict('index'),
+            'cambiados': dict(zip(map(int, indices_cambiados), cambiados[columnas].astype(str).to_dict('records'))),
+            'eliminados': eliminados,
+        }
+        
+        # Cambios: solo se sobrescriben los datos del asociado, nunca ESTADO ni FECHA_ENTREGA
+        if len(cambiados):
+            anteriores = self.datos_asociados.loc[indices_cambiados, ContadoresEntregas.CAMPOS].to_dict('records')
+            for columna in COLUMNAS_CATEGORICAS:
+                if columna in columnas:
+                    agregar_categorias(self.datos_asociados, columna, cambiados[columna].unique())
+            self.datos_asociados.loc[indices_cambiados, columnas] = cambiados[columnas].to_numpy()
+            self.datos_asociados.loc[indices_cambiados, COLUMNA_NOMBRE] = nombres_completos(
+                self.datos_asociados.loc[indices_cambiados]).to_numpy()
+            for index, nombre in self.datos_asociados.loc[indices_cambiados, COLUMNA_NOMBRE].items():
+                self.indice_nombres.actualizar(index, nombre)
+            posteriores = self.datos_asociados.loc[indices_cambiados, ContadoresEntregas.CAMPOS].to_dict('records')
+            for anterior, posterior in zip(anteriores, posteriores):
+                self.contadores.actualizar(anterior, posterior)
+            self.hashes_filas.loc[indices_cambiados] = hash_filas(self.datos_asociados.loc[indices_cambiados]).to_numpy()
+        
+        # Bajas
+        if eliminados:
+            for fila in self.datos_asociados.loc[eliminados, ContadoresEntregas.CAMPOS].to_dict('records'):
+                self.contadores.quitar(fila)
+            for cedula in self.datos_asociados.loc[eliminados, 'CEDULA']:
+                self.indice_cedulas.pop(normalizar_cedula(cedula), None)
+            for index in eliminados:
+                self.indice_nombres.eliminar(index)
+            self.datos_asociados = self.datos_asociados.drop(index=eliminados)
+            self.hashes_filas = self.hashes_filas.drop(index=eliminados)
+        
+        # Altas
+        if len(nuevos):
+            for fila in nuevos[ContadoresEntregas.CAMPOS].to_dict('records'):
+                self.contadores.agregar(fila)
+            for index, cedula in zip(nuevos.index, nuevos['CEDULA']):
+                self.indice_cedulas.setdefault(normalizar_cedula(cedula), index)
+            for index, nombre in nuevos[COLUMNA_NOMBRE].items():
+                self.indice_nombres.actualizar(index, nombre)
+            # Cada archivo trae sus propias categorías: se unifican tras concatenar
+            self.datos_asociados = tipos_compactos(pd.concat([self.datos_asociados, nuevos]))
+            self.hashes_filas = pd.concat([self.hashes_filas, hash_filas(nuevos).set_axis(nuevos.index)])
+        
+        # Las altas, cambios y bajas van completos a la bitácora para poder reproducirlos
+        if len(nuevos) or len(cambiados) or eliminados:
+            self.registrar_evento('importacion', valores=evento)
+        
+        self.archivo_actual = archivo
+        if self.indice_nombres.desactualizado():
+            self.indice_nombres = IndiceNombres.desde_asociados(self.datos_asociados)
+        
+        # Nombre, huella y contadores ya se actualizaron en bloque: solo falta la
+        # interfaz. Pocos cambios se repintan fila a fila; si cambió el conjunto de
+        # filas o son muchos, se reconstruyen la tabla y las vistas
+        if len(nuevos) or eliminados or len(cambiados) > MAX_CAMBIOS_FILA_A_FILA:
+            self.limpiar_busqueda()
+            self.actualizar_tabla()
+        else:
+            self.refrescar_filas(indices_cambiados)
+        self.actualizar_estadisticas()
+        
+        resumen = {
+            'nuevos': len(nuevos),
+            'actualizados': len(cambiados),
+            'eliminados': len(eliminados),
+            'sin_cambios': len(df) - len(nuevos) - len(cambiados),
+        }
+        messagebox.showinfo("Archivo combinado",
+                           f"➕ {resumen['nuevos']} nuevos\n✏️ {resumen['actualizados']} actualizados\n"
+                           f"➖ {resumen['eliminados']} eliminados\n✔️ {resumen['sin_cambios']} sin cambios\n\n"
+                           "Las entregas registradas se conservaron.")
+        return resumen
     
     def cargar_datos_ejemplo(self):
         """Cargar datos de ejemplo para demostración"""
@@ -326,154 +894,329 @@ class SistemaEntregaRegalos:
             'FECHA_ENTREGA': ['', '', '2024-12-15', '']
         }
         
-        self.datos_asociados = pd.DataFrame(datos_ejemplo)
+        self.cerrar_bitacora()  # Los datos de ejemplo no tienen archivo ni bitácora
+        self.datos_asociados = compactar_asociados(pd.DataFrame(datos_ejemplo))
+        self.archivo_actual = None
+        self.reconstruir_indices()
         self.actualizar_tabla()
         self.actualizar_estadisticas()
         
         messagebox.showinfo("Datos de ejemplo", "Se han cargado 4 registros de ejemplo.")
     
+    def reconstruir_indices(self):
+        """Reconstruir los índices auxiliares tras reemplazar los datos"""
+        self.indice_cedulas = {}
+        self.contadores.reconstruir(self.datos_asociados)
+        self.hashes_filas = hash_filas(self.datos_asociados).set_axis(self.datos_asociados.index)
+        self.indice_nombres = IndiceNombres.desde_asociados(self.datos_asociados)
+        if self.datos_asociados.empty:
+            return
+        
+        for index, cedula in zip(self.datos_asociados.index, self.datos_asociados['CEDULA']):
+            # Ante cédulas duplicadas se conserva la primera aparición
+            self.indice_cedulas.setdefault(normalizar_cedula(cedula), index)
+    
     def buscar_asociado(self):
         """Buscar asociado por cédula o nombre"""
         if self.datos_asociados.empty:
             messagebox.showwarning("Sin datos", "Primero debe cargar un archivo de asociados.")
             return
         
-        termino = self.search_var.get().strip().upper()
+        termino = normalizar_nombre(self.search_var.get())
         if not termino:
             messagebox.showwarning("Campo vacío", "Ingrese un término de búsqueda.")
             return
         
-        # Buscar en cédula o nombre completo
-        mask = (
-            self.datos_asociados['CEDULA'].astype(str).str.contains(termino, na=False) |
-            (self.datos_asociados['NOMBRE 1'] + ' ' + 
-             self.datos_asociados['NOMBRE 2'] + ' ' +
-             self.datos_asociados['APELLIDO 1'] + ' ' + 
-             self.datos_asociados['APELLIDO 2']).str.upper().str.contains(termino, na=False)
-        )
-        
-        resultados = self.datos_asociados[mask]
+        self.cancelar_busqueda()
+        self.lanzar_busqueda(termino)
+    
+    def coincidencias(self, datos, indice_nombres, termino):
+        """Índices del DataFrame que coinciden con el término (se ejecuta en el hilo de búsqueda)"""
+        if datos.empty:
+            return []
+        
+        # Cédula completa: acceso directo por el índice hash
+        index = self.indice_cedulas.get(termino) if termino.isdigit() else None
+        if index is not None:
+            return [index]
+        if termino.isdigit():
+            # Parte de una cédula
+            mascara = datos['CEDULA'].str.contains(termino, regex=False, na=False)
+            return datos.index[mascara.to_numpy()][:LIMITE_COINCIDENCIAS].tolist()
+        
+        # Nombre: búsqueda aproximada por trigramas, ordenada por similitud
+        return [clave for clave, _ in indice_nombres.buscar(termino, LIMITE_COINCIDENCIAS)]
+    
+    def buscar_tiempo_real(self, event):
+        """Búsqueda en tiempo real: se lanza cuando se deja de escribir"""
+        if self.modo_escaner.get():  # En modo escáner se espera el Enter del lector
+            return
         
-        # Limpiar frame de resultados
-        for widget in self.resultado_frame.winfo_children():
-            widget.destroy()
+        self.cancelar_busqueda()
+        termino = normalizar_nombre(self.search_var.get())
+        if len(termino) >= 3 and not self.datos_asociados.empty:  # Al menos 3 caracteres
+            self.busqueda_programada = self.root.after(DEMORA_BUSQUEDA, self.lanzar_busqueda, termino)
+    
+    def cancelar_busqueda(self):
+        """Descartar la búsqueda programada y el resultado de la que esté en curso"""
+        if self.busqueda_programada is not None:
+            self.root.after_cancel(self.busqueda_programada)
+            self.busqueda_programada = None
+        self.generacion_busqueda += 1
+    
+    def lanzar_busqueda(self, termino):
+        """Entregar el término al hilo de búsqueda; una solicitud pendiente se reemplaza"""
+        self.busqueda_programada = None
+        self.generacion_busqueda += 1
+        with self.condicion_busqueda:
+            self.solicitud_busqueda = (self.generacion_busqueda, termino,
+                                       self.datos_asociados, self.indice_nombres)
+            self.condicion_busqueda.notify()
+        
+        if self.hilo_busqueda is None:
+            self.hilo_busqueda = threading.Thread(target=self.ejecutar_busquedas, daemon=True)
+            self.hilo_busqueda.start()
+        if not self.revisando_busqueda:
+            self.revisando_busqueda = True
+            self.root.after(50, self.revisar_busqueda)
+    
+    def ejecutar_busquedas(self):
+        """Hilo de búsqueda: atiende siempre la solicitud más reciente"""
+        while True:
+            with self.condicion_busqueda:
+                while self.solicitud_busqueda is None:
+                    self.condicion_busqueda.wait()
+                generacion, termino, datos, indice_nombres = self.solicitud_busqueda
+                self.solicitud_busqueda = None
+                self.buscando = True
+            try:
+                self.cola_busqueda.put(('fin', generacion, termino,
+                                        self.coincidencias(datos, indice_nombres, termino)))
+            except Exception as e:
+                self.cola_busqueda.put(('error', generacion, termino, str(e)))
+            finally:
+                with self.condicion_busqueda:
+                    self.buscando = False
+    
+    def revisar_busqueda(self):
+        """Mostrar el resultado de la última búsqueda e ignorar los obsoletos"""
+        try:
+            while True:
+                tipo, generacion, termino, resultado = self.cola_busqueda.get_nowait()
+                if generacion != self.generacion_busqueda:
+                    continue
+                
+                self.limpiar_resultados()
+                if tipo == 'error':
+                    messagebox.showerror("Error", f"Error en la búsqueda:\n{resultado}")
+                elif not resultado:
+                    tk.Label(self.resultado_frame, text="❌ No se encontraron resultados", 
+                            font=('Arial', 12), fg='red').pack(pady=20)
+                else:
+                    self.mostrar_resultados_busqueda(resultado)
+        except queue.Empty:
+            pass
         
-        if resultados.empty:
-            tk.Label(self.resultado_frame, text="❌ No se encontraron resultados", 
-                    font=('Arial', 12), fg='red').pack(pady=20)
+        with self.condicion_busqueda:
+            en_curso = self.solicitud_busqueda is not None or self.buscando
+        if en_curso or not self.cola_busqueda.empty():
+            self.root.after(50, self.revisar_busqueda)
         else:
-            self.mostrar_resultados_busqueda(resultados)
+            self.revisando_busqueda = False
     
-    def buscar_tiempo_real(self, event):
-        """Búsqueda en tiempo real mientras se escribe"""
-        if len(self.search_var.get()) >= 3:  # Buscar cuando hay al menos 3 caracteres
-            self.buscar_asociado()
-    
-    def mostrar_resultados_busqueda(self, resultados):
-        """Mostrar resultados de búsqueda en tarjetas"""
-        # Título de resultados
-        titulo_frame = tk.Frame(self.resultado_frame)
-        titulo_frame.pack(fill='x', pady=10)
+    def procesar_escaneo(self, event=None):
+        """Procesar una cédula leída por el escáner (búsqueda exacta O(1))"""
+        if not self.modo_escaner.get():
+            return
         
-        tk.Label(titulo_frame, text=f"✅ {len(resultados)} resultado(s) encontrado(s)", 
-                font=('Arial', 12, 'bold'), fg='green').pack(anchor='w')
+        if self.datos_asociados.empty:
+            messagebox.showwarning("Sin datos", "Primero debe cargar un archivo de asociados.")
+            return
         
-        # Crear scrollable frame
-        canvas = tk.Canvas(self.resultado_frame, bg='white')
-        scrollbar = ttk.Scrollbar(self.resultado_frame, orient="vertical", command=canvas.yview)
-        scrollable_frame = tk.Frame(canvas, bg='white')
+        cedula = normalizar_cedula(self.search_var.get())
+        self.search_var.set("")  # Campo listo para la siguiente lectura
         
-        scrollable_frame.bind(
-            "<Configure>",
-            lambda e: canvas.configure(scrollregion=canvas.bbox("all"))
-        )
+        self.cancelar_busqueda()
+        self.limpiar_resultados()
         
-        canvas.create_window((0, 0), window=scrollable_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scrollbar.set)
+        index = self.indice_cedulas.get(cedula) if cedula.isdigit() else None
+        if index is None:
+            self.root.bell()
+            tk.Label(self.resultado_frame, text=f"❌ Cédula no encontrada: {cedula}", 
+                    font=('Arial', 12), fg='red').pack(pady=20)
+            return
         
-        # Mostrar cada resultado
-        for index, row in resultados.iterrows():
-            self.crear_tarjeta_resultado(scrollable_frame, index, row)
+        row = self.datos_asociados.loc[index]
+        if self.entrega_automatica.get() and row.get('ESTADO', 'PENDIENTE') != 'ENTREGADO':
+            observaciones = row.get('OBSERVACIONES', '')
+            if pd.notna(observaciones) and str(observaciones).strip():
+                # Los asociados con novedades siempre requieren confirmación manual
+                self.root.bell()
+                tk.Label(self.resultado_frame, text="⚠️ Tiene observaciones: confirme la entrega manualmente", 
+                        font=('Arial', 12, 'bold'), fg='#856404').pack(pady=(10,0))
+            else:
+                self.registrar_entrega(index)
+                tk.Label(self.resultado_frame, text=f"✅ Entregado: {row['NOMBRE 1']} {row['APELLIDO 1']}", 
+                        font=('Arial', 12, 'bold'), fg='green').pack(pady=(10,0))
         
-        canvas.pack(side="left", fill="both", expand=True)
-        scrollbar.pack(side="right", fill="y")
+        self.mostrar_resultados_busqueda([index])
     
-    def crear_tarjeta_resultado(self, parent, index, row):
-        """Crear una tarjeta para mostrar un resultado de búsqueda"""
-        # Frame principal de la tarjeta
-        card_frame = tk.Frame(parent, bg='#f8f9fa', relief='raised', bd=1)
-        card_frame.pack(fill='x', padx=10, pady=5)
-        
-        # Header de la tarjeta
-        header_frame = tk.Frame(card_frame, bg='#2E8B57')
-        header_frame.pack(fill='x')
-        
-        nombre_completo = f"{row['NOMBRE 1']} {row['NOMBRE 2']} {row['APELLIDO 1']} {row['APELLIDO 2']}"
-        tk.Label(header_frame, text=f"👤 {nombre_completo}", font=('Arial', 12, 'bold'),
-                fg='white', bg='#2E8B57').pack(side='left', padx=10, pady=5)
-        
-        # Estado
-        estado = row.get('ESTADO', 'PENDIENTE')
-        color_estado = '#28a745' if estado == 'ENTREGADO' else '#ffc107'
-        tk.Label(header_frame, text=estado, font=('Arial', 10, 'bold'),
-                fg='white', bg=color_estado).pack(side='right', padx=10, pady=5)
-        
-        # Contenido de la tarjeta
-        content_frame = tk.Frame(card_frame, bg='white')
-        content_frame.pack(fill='x', padx=10, pady=10)
+    def limpiar_resultados(self):
+        self.claves_resultado = []
+        self.tarjetas = []
+        self.tarjetas_resultado = {}
+        self.lista_resultados = None
+        for widget in self.resultado_frame.winfo_children():
+            widget.destroy()
+    
+    def mostrar_resultados_busqueda(self, claves):
+        """Mostrar resultados de búsqueda en tarjetas, materializando solo las visibles"""
+        # Título de resultados
+        titulo_frame = tk.Frame(self.resultado_frame)
+        titulo_frame.pack(fill='x', pady=10)
         
-        # Información básica
-        info_text = f"""📊 Cédula: {row['CEDULA']}
-🏢 Agencia: {row['AGENCIA']}
-🏭 Empresa: {row['EMPRESA']}"""
+        limite = "+" if len(claves) >= LIMITE_COINCIDENCIAS else ""
+        tk.Label(titulo_frame, text=f"✅ {len(claves)}{limite} resultado(s) encontrado(s)", 
+                font=('Arial', 12, 'bold'), fg='green').pack(anchor='w')
         
-        tk.Label(content_frame, text=info_text, justify='left', font=('Arial', 10),
-                bg='white').pack(anchor='w')
+        # Lista de tamaño fijo: la barra de desplazamiento mueve la ventana de tarjetas
+        self.resultados_scrollbar = ttk.Scrollbar(self.resultado_frame, orient="vertical",
+                                                  command=self.desplazar_resultados)
+        self.lista_resultados = tk.Frame(self.resultado_frame, bg='white')
+        self.lista_resultados.pack_propagate(False)
+        self.resultados_scrollbar.pack(side="right", fill="y")
+        self.lista_resultados.pack(side="left", fill="both", expand=True)
+        self.lista_resultados.bind('<Configure>', self.redimensionar_resultados)
+        enlazar_rueda(self.lista_resultados, self.desplazar_resultados)
+        
+        self.claves_resultado = claves
+        self.resultados_inicio = 0
+        self.tarjetas = []
+        self.renderizar_ventana_resultados()
+    
+    def renderizar_ventana_resultados(self):
+        """Rellenar las tarjetas reutilizables con las filas de la ventana visible"""
+        total = len(self.claves_resultado)
+        self.resultados_inicio = max(0, min(self.resultados_inicio, total - self.tarjetas_visibles))
+        claves = self.claves_resultado[self.resultados_inicio:self.resultados_inicio + self.tarjetas_visibles]
+        # Descarta claves que ya no existen (p. ej. tras reimportar durante la búsqueda)
+        filas = self.datos_asociados.loc[[clave for clave in claves if clave in self.datos_asociados.index]]
+        
+        # Crear solo las tarjetas que falten y ocultar las sobrantes
+        for _ in range(len(self.tarjetas), len(filas)):
+            self.tarjetas.append(TarjetaResultado(self.lista_resultados, self))
+        self.tarjetas_resultado = {}
+        for tarjeta, (index, row) in zip(self.tarjetas, filas.iterrows()):
+            tarjeta.mostrar(index, row)
+            self.tarjetas_resultado[index] = tarjeta
+        for tarjeta in self.tarjetas[len(filas):]:
+            tarjeta.ocultar()
+        
+        if total:
+            self.resultados_scrollbar.set(self.resultados_inicio / total,
+                                          min(1.0, (self.resultados_inicio + self.tarjetas_visibles) / total))
+        else:
+            self.resultados_scrollbar.set(0, 1)
+    
+    def desplazar_resultados(self, *args):
+        """Mover la ventana de tarjetas (comando de la barra de desplazamiento y de la rueda)"""
+        if self.lista_resultados is None:
+            return 'break'
+        
+        total = len(self.claves_resultado)
+        if args[0] == 'moveto':
+            inicio = int(float(args[1]) * total)
+        else:
+            paso = int(args[1]) * (self.tarjetas_visibles if args[2] == 'pages' else 1)
+            inicio = self.resultados_inicio + paso
+        
+        inicio = max(0, min(inicio, total - self.tarjetas_visibles))
+        if inicio != self.resultados_inicio:
+            self.resultados_inicio = inicio
+            self.renderizar_ventana_resultados()
+        return 'break'
+    
+    def redimensionar_resultados(self, event):
+        """Recalcular cuántas tarjetas caben al cambiar el tamaño de la lista"""
+        tarjetas = max(1, event.height // ALTO_TARJETA)
+        if tarjetas != self.tarjetas_visibles:
+            self.tarjetas_visibles = tarjetas
+            self.renderizar_ventana_resultados()
+    
+    def notificar_cambio(self, index):
+        """Avisar a los suscriptores que la fila `index` cambió"""
+        for observador in self.observadores_cambios:
+            observador(index)
+    
+    def refrescar_filas(self, indices):
+        """Repintar filas cuyo nombre, huella y contadores ya se recalcularon en bloque"""
+        for index in indices:
+            self.actualizar_vistas(index)
+            self.actualizar_fila_tabla(index)
+            self.actualizar_tarjeta_resultado(index)
+    
+    def actualizar_nombre_fila(self, index):
+        """Recalcular el nombre normalizado de la fila editada"""
+        nombre = nombres_completos(self.datos_asociados.loc[[index]]).iloc[0]
+        self.datos_asociados.loc[index, COLUMNA_NOMBRE] = nombre
+        self.indice_nombres.actualizar(index, nombre)
+    
+    def actualizar_vistas(self, index):
+        """Mantener las máscaras de los filtros al día con la fila modificada"""
+        posicion = self.posicion_registro.get(index)
+        if posicion is not None:
+            self.vistas.actualizar(posicion, self.fila_contadores(index))
+    
+    def actualizar_fila_tabla(self, index):
+        """Refrescar solo la fila modificada en la tabla de registros"""
+        posicion = self.posicion_registro.get(index)
+        if posicion is None:
+            return
         
-        # Observaciones (destacadas si existen)
-        if row['OBSERVACIONES'] and str(row['OBSERVACIONES']).strip():
-            obs_frame = tk.Frame(content_frame, bg='#fff3cd', relief='solid', bd=1)
-            obs_frame.pack(fill='x', pady=(10,0))
-            
-            tk.Label(obs_frame, text="⚠️ OBSERVACIONES:", font=('Arial', 10, 'bold'),
-                    fg='#856404', bg='#fff3cd').pack(anchor='w', padx=5, pady=2)
-            tk.Label(obs_frame, text=str(row['OBSERVACIONES']), font=('Arial', 10),
-                    fg='#856404', bg='#fff3cd', wraplength=400).pack(anchor='w', padx=5, pady=2)
+        valores = columnas_tabla(self.datos_asociados.loc[[index]])
+        for columna, valor in zip(self.columnas_registro, valores):
+            columna[posicion] = valor[0]
         
-        # Botones de acción
-        btn_frame = tk.Frame(content_frame, bg='white')
-        btn_frame.pack(fill='x', pady=(10,0))
-        
-        if estado == 'PENDIENTE':
-            tk.Button(btn_frame, text="✅ Marcar como Entregado", bg='#28a745', fg='white',
-                     command=lambda idx=index: self.marcar_entregado(idx),
-                     relief='flat', padx=10, pady=5).pack(side='left', padx=5)
+        # La vista mostrada no cambia hasta elegir otro filtro: solo se repinta la fila
+        orden = int(np.searchsorted(self.vista_registro, posicion))
+        if orden < len(self.vista_registro) and self.vista_registro[orden] == posicion:
+            slot = orden - self.tabla_inicio
+            if 0 <= slot < len(self.items_tabla):
+                self.tree.item(f'fila{slot}', values=[columna[posicion] for columna in self.columnas_registro])
+    
+    def actualizar_tarjeta_resultado(self, index):
+        """Redibujar solo la tarjeta de búsqueda del registro modificado"""
+        tarjeta = self.tarjetas_resultado.get(index)
+        if tarjeta is None or not tarjeta.frame.winfo_exists():
+            return
         
-        tk.Button(btn_frame, text="✏️ Editar", bg='#007bff', fg='white',
-                 command=lambda idx=index: self.editar_registro_busqueda(idx),
-                 relief='flat', padx=10, pady=5).pack(side='left', padx=5)
+        tarjeta.mostrar(index, self.datos_asociados.loc[index])
+    
+    def actualizar_hash_fila(self, index):
+        """Mantener la huella de la fila editada para futuras reimportaciones"""
+        self.hashes_filas.loc[index] = hash_filas(self.datos_asociados.loc[[index]]).iloc[0]
+    
+    def fila_contadores(self, index):
+        """Campos de una fila que afectan a los contadores de estadísticas"""
+        return self.datos_asociados.loc[index, ContadoresEntregas.CAMPOS].to_dict()
+    
+    def registrar_entrega(self, index):
+        """Registrar la entrega en los datos y refrescar la interfaz"""
+        fila_anterior = self.fila_contadores(index)
+        fecha = datetime.now().strftime('%Y-%m-%d %H:%M')
+        self.datos_asociados.loc[index, 'ESTADO'] = 'ENTREGADO'
+        self.datos_asociados.loc[index, 'FECHA_ENTREGA'] = fecha
+        self.contadores.actualizar(fila_anterior, self.fila_contadores(index))
+        self.registrar_evento('entrega', int(index), {'ESTADO': 'ENTREGADO', 'FECHA_ENTREGA': fecha})
+        
+        # Actualizar solo la fila, la tarjeta y los contadores afectados
+        self.notificar_cambio(index)
     
     def marcar_entregado(self, index):
         """Marcar un registro como entregado"""
         if messagebox.askyesno("Confirmar", "¿Marcar este regalo como entregado?"):
-            self.datos_asociados.loc[index, 'ESTADO'] = 'ENTREGADO'
-            self.datos_asociados.loc[index, 'FECHA_ENTREGA'] = datetime.now().strftime('%Y-%m-%d %H:%M')
-            
-            # Actualizar todo inmediatamente
-            self.actualizar_tabla()
-            self.actualizar_estadisticas()
-            
-            # Forzar actualización de la ventana
-            self.root.update_idletasks()
-            
-            # Actualizar resultados de búsqueda si están visibles
-            if hasattr(self, 'search_var') and self.search_var.get().strip():
-                self.buscar_asociado()
-            
+            self.registrar_entrega(index)
             messagebox.showinfo("Éxito", "Regalo marcado como entregado.")
-            
-            # Segunda actualización para asegurar que todo se vea
-            self.root.after(100, self.actualizar_estadisticas)
     
     def editar_registro_busqueda(self, index):
         """Editar un registro desde los resultados de búsqueda"""
@@ -483,11 +1226,17 @@ class SistemaEntregaRegalos:
         """Editar registro desde la tabla principal"""
         selection = self.tree.selection()
         if selection:
+            if selection[0] in self.items_tabla:
+                self.abrir_editor_registro(self.items_tabla[selection[0]])
+                return
+            
             item = self.tree.item(selection[0])
             cedula = item['values'][0]
             
             # Encontrar el índice en el DataFrame
-            index = self.datos_asociados[self.datos_asociados['CEDULA'].astype(str) == str(cedula)].index[0]
+            index = self.indice_cedulas.get(normalizar_cedula(cedula))
+            if index is None:
+                index = self.datos_asociados[self.datos_asociados['CEDULA'].astype(str) == str(cedula)].index[0]
             self.abrir_editor_registro(index)
     
     def abrir_editor_registro(self, index):
@@ -581,7 +1330,8 @@ class SistemaEntregaRegalos:
                         return
                 
                 # Guardar todos los cambios
-                cambios_realizados = False
+                fila_anterior = self.fila_contadores(index)
+                valores = {}
                 for campo in campos:
                     if campo == 'OBSERVACIONES':
                         # Para el Text widget
@@ -593,34 +1343,33 @@ class SistemaEntregaRegalos:
                     valor_anterior = str(self.datos_asociados.loc[index, campo]) if pd.notna(self.datos_asociados.loc[index, campo]) else ''
                     
                     if nuevo_valor != valor_anterior:
+                        agregar_categorias(self.datos_asociados, campo, [nuevo_valor])
                         self.datos_asociados.loc[index, campo] = nuevo_valor
-                        cambios_realizados = True
+                        valores[campo] = nuevo_valor
+                        
+                        if campo == 'CEDULA':
+                            # Mantener el índice hash al cambiar la cédula
+                            if self.indice_cedulas.get(normalizar_cedula(valor_anterior)) == index:
+                                del self.indice_cedulas[normalizar_cedula(valor_anterior)]
+                            self.indice_cedulas.setdefault(normalizar_cedula(nuevo_valor), index)
                 
                 # Si se marca como entregado y antes no estaba, agregar fecha
                 estado_nuevo = vars_campos['ESTADO'].get()
                 estado_anterior = str(row['ESTADO']) if pd.notna(row['ESTADO']) else 'PENDIENTE'
                 
                 if estado_nuevo == 'ENTREGADO' and estado_anterior != 'ENTREGADO':
-                    self.datos_asociados.loc[index, 'FECHA_ENTREGA'] = datetime.now().strftime('%Y-%m-%d %H:%M')
-                    cambios_realizados = True
+                    valores['FECHA_ENTREGA'] = datetime.now().strftime('%Y-%m-%d %H:%M')
+                    self.datos_asociados.loc[index, 'FECHA_ENTREGA'] = valores['FECHA_ENTREGA']
                 
-                if cambios_realizados:
-                    # Actualizar todo inmediatamente
-                    self.actualizar_tabla()
-                    self.actualizar_estadisticas()
+                if valores:
+                    self.contadores.actualizar(fila_anterior, self.fila_contadores(index))
+                    self.registrar_evento('edicion', int(index), valores)
                     
-                    # Forzar actualización visual
-                    self.root.update_idletasks()
+                    # Actualizar solo la fila, la tarjeta y los contadores afectados
+                    self.notificar_cambio(index)
                     
                     edit_window.destroy()
                     messagebox.showinfo("Éxito", "Registro actualizado correctamente.")
-                    
-                    # Actualizar búsqueda si está activa
-                    if hasattr(self, 'search_var') and self.search_var.get().strip():
-                        self.root.after(100, self.buscar_asociado)
-                    
-                    # Segunda actualización para asegurar que todo se vea
-                    self.root.after(100, self.actualizar_estadisticas)
                 else:
                     edit_window.destroy()
                     messagebox.showinfo("Sin cambios", "No se realizaron cambios en el registro.")
@@ -662,103 +1411,108 @@ class SistemaEntregaRegalos:
     
     def actualizar_tabla(self):
         """Actualizar la tabla principal con los datos actuales"""
-        # Limpiar tabla
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        if self.datos_asociados.empty:
-            return
-        
-        # Agregar datos
-        for index, row in self.datos_asociados.iterrows():
-            nombre_completo = f"{row['NOMBRE 1']} {row['NOMBRE 2']} {row['APELLIDO 1']} {row['APELLIDO 2']}"
-            estado = row.get('ESTADO', 'PENDIENTE')
-            observaciones = str(row.get('OBSERVACIONES', ''))[:50] + '...' if len(str(row.get('OBSERVACIONES', ''))) > 50 else str(row.get('OBSERVACIONES', ''))
-            
-            # Insertar fila
-            item_id = self.tree.insert('', 'end', values=(
-                row['CEDULA'],
-                nombre_completo,
-                row['AGENCIA'],
-                row['EMPRESA'],
-                estado,
-                observaciones
-            ))
-            
-            # Colorear según estado
-            if estado == 'ENTREGADO':
-                self.tree.set(item_id, 'Estado', '✅ ENTREGADO')
-            elif observaciones and observaciones.strip():
-                self.tree.set(item_id, 'Estado', '⚠️ PENDIENTE')
-            else:
-                self.tree.set(item_id, 'Estado', '⏳ PENDIENTE')
+        # Columnas de texto calculadas de forma vectorizada, una vez por cambio de datos
+        self.columnas_registro = columnas_tabla(self.datos_asociados)
+        self.indices_registro = self.datos_asociados.index.tolist()
+        self.posicion_registro = {index: posicion for posicion, index in enumerate(self.indices_registro)}
+        self.vistas.reconstruir(self.datos_asociados)
+        self.mostrar_vista('todos')
+    
+    def mostrar_vista(self, nombre):
+        """Mostrar en la tabla las filas de un filtro, sin copiar ni recalcular datos"""
+        self.vista_registro = self.vistas.vista(nombre)
+        self.tabla_inicio = 0
+        if self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+        self.renderizar_ventana_tabla()
+        return len(self.vista_registro)
+    
+    def renderizar_ventana_tabla(self):
+        """Materializar en el Treeview solo las filas de la ventana visible"""
+        total = len(self.vista_registro)
+        self.tabla_inicio = max(0, min(self.tabla_inicio, total - self.filas_visibles))
+        cantidad = min(self.filas_visibles + BUFFER_TABLA, total - self.tabla_inicio)
+        
+        # Reciclar los items existentes y crear o borrar solo la diferencia
+        items = self.tree.get_children()
+        if len(items) > cantidad:
+            self.tree.delete(*items[cantidad:])
+        for slot in range(len(items), cantidad):
+            self.tree.insert('', 'end', iid=f'fila{slot}')
+        
+        self.items_tabla = {}
+        for slot in range(cantidad):
+            posicion = self.vista_registro[self.tabla_inicio + slot]
+            item_id = f'fila{slot}'
+            self.tree.item(item_id, values=[columna[posicion] for columna in self.columnas_registro])
+            self.items_tabla[item_id] = self.indices_registro[posicion]
+        
+        self.tree.yview_moveto(0)
+        if total:
+            self.tabla_scrollbar.set(self.tabla_inicio / total,
+                                     min(1.0, (self.tabla_inicio + self.filas_visibles) / total))
+        else:
+            self.tabla_scrollbar.set(0, 1)
+    
+    def desplazar_tabla(self, *args):
+        """Mover la ventana visible (comando de la barra de desplazamiento y de la rueda)"""
+        total = len(self.vista_registro)
+        if args[0] == 'moveto':
+            inicio = int(float(args[1]) * total)
+        else:
+            paso = int(args[1]) * (self.filas_visibles if args[2] == 'pages' else 1)
+            inicio = self.tabla_inicio + paso
+        
+        inicio = max(0, min(inicio, total - self.filas_visibles))
+        if inicio != self.tabla_inicio:
+            if self.tree.selection():
+                self.tree.selection_remove(*self.tree.selection())
+            self.tabla_inicio = inicio
+            self.renderizar_ventana_tabla()
+        return 'break'
+    
+    def mover_seleccion_tabla(self, paso):
+        """Mover la selección con el teclado desplazando la ventana en los bordes"""
+        seleccion = self.tree.selection()
+        slot = int(seleccion[0][4:]) + paso if seleccion else 0
+        
+        if slot < 0 or slot >= self.filas_visibles:
+            anterior = self.tabla_inicio
+            self.desplazar_tabla('scroll', paso, 'units')
+            if self.tabla_inicio == anterior:
+                return 'break'
+            slot = max(0, min(slot, self.filas_visibles - 1))
+        
+        item_id = f'fila{slot}'
+        if self.tree.exists(item_id):
+            self.tree.selection_set(item_id)
+            self.tree.focus(item_id)
+        return 'break'
+    
+    def redimensionar_tabla(self, event):
+        """Recalcular cuántas filas caben al cambiar el tamaño del Treeview"""
+        # Se descuenta aproximadamente una fila para los encabezados
+        filas = max(1, event.height // self.alto_fila - 1)
+        if filas != self.filas_visibles:
+            self.filas_visibles = filas
+            self.renderizar_ventana_tabla()
     
     def actualizar_estadisticas(self):
         """Actualizar las estadísticas mostradas"""
-        if self.datos_asociados.empty:
-            self.var_total.set("0")
-            self.var_entregados.set("0")
-            self.var_pendientes.set("0")
-            self.var_novedades.set("0")
-            # Actualizar tarjetas visuales
-            self.actualizar_tarjetas_estadisticas()
-            return
-        
-        total = len(self.datos_asociados)
-        entregados = len(self.datos_asociados[self.datos_asociados['ESTADO'] == 'ENTREGADO'])
-        pendientes = total - entregados
-        
-        # Contar novedades (registros con observaciones no vacías)
-        novedades = len(self.datos_asociados[
-            (self.datos_asociados['OBSERVACIONES'].notna()) & 
-            (self.datos_asociados['OBSERVACIONES'].str.strip() != '')
-        ])
-        
-        self.var_total.set(str(total))
-        self.var_entregados.set(str(entregados))
-        self.var_pendientes.set(str(pendientes))
-        self.var_novedades.set(str(novedades))
-        
-        # Actualizar tarjetas visuales
-        self.actualizar_tarjetas_estadisticas()
-    
-    def actualizar_tarjetas_estadisticas(self):
-        """Actualizar visualmente las tarjetas de estadísticas"""
-        try:
-            # Buscar y actualizar cada tarjeta
-            for widget in self.root.winfo_children():
-                if isinstance(widget, tk.Frame):
-                    for child in widget.winfo_children():
-                        if isinstance(child, tk.Frame):
-                            # Buscar frames de estadísticas
-                            labels = [w for w in child.winfo_children() if isinstance(w, tk.Label)]
-                            if len(labels) >= 2:
-                                # El primer label tiene el número, el segundo el título
-                                numero_label = labels[0]
-                                titulo_label = labels[1]
-                                titulo = titulo_label.cget('text')
-                                
-                                # Actualizar según el título
-                                if 'Total' in titulo:
-                                    numero_label.config(text=self.var_total.get())
-                                elif 'Entregados' in titulo:
-                                    numero_label.config(text=self.var_entregados.get())
-                                elif 'Pendientes' in titulo:
-                                    numero_label.config(text=self.var_pendientes.get())
-                                elif 'Novedad' in titulo:
-                                    numero_label.config(text=self.var_novedades.get())
-        except Exception as e:
-            # Si hay algún error en la actualización visual, continuar silenciosamente
-            pass
+        # Los contadores ya están al día: solo se leen, sin recorrer los datos
+        self.var_total.set(str(self.contadores.total))
+        self.var_entregados.set(str(self.contadores.entregados))
+        self.var_pendientes.set(str(self.contadores.pendientes))
+        self.var_novedades.set(str(self.contadores.novedades))
     
     def limpiar_busqueda(self):
         """Limpiar campo de búsqueda y resultados"""
         self.search_var.set("")
-        for widget in self.resultado_frame.winfo_children():
-            widget.destroy()
+        self.cancelar_busqueda()
+        self.limpiar_resultados()
     
     def generar_reporte_pdf(self):
-        """Generar reporte en PDF"""
+        """Generar reporte en PDF en un hilo de trabajo"""
         if self.datos_asociados.empty:
             messagebox.showwarning("Sin datos", "No hay datos para generar el reporte.")
             return
@@ -769,109 +1523,327 @@ class SistemaEntregaRegalos:
             title="Guardar reporte PDF"
         )
         
-        if archivo_pdf:
-            try:
-                # Crear documento PDF
-                doc = SimpleDocTemplate(archivo_pdf, pagesize=A4)
-                story = []
-                styles = getSampleStyleSheet()
-                
-                # Título
-                title_style = ParagraphStyle(
-                    'CustomTitle',
-                    parent=styles['Heading1'],
-                    fontSize=16,
-                    spaceAfter=30,
-                    alignment=1  # Centrado
-                )
-                
-                story.append(Paragraph("COOPERENKA", title_style))
-                story.append(Paragraph("Reporte de Entrega de Regalos", title_style))
-                story.append(Paragraph(f"Fecha: {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']))
-                story.append(Spacer(1, 20))
-                
-                # Estadísticas
-                stats_data = [
-                    ['Estadística', 'Cantidad'],
-                    ['Total Asociados', self.var_total.get()],
-                    ['Entregados', self.var_entregados.get()],
-                    ['Pendientes', self.var_pendientes.get()],
-                    ['Con Novedades', self.var_novedades.get()]
-                ]
-                
-                stats_table = Table(stats_data)
-                stats_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 14),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black)
-                ]))
-                
-                story.append(stats_table)
-                story.append(Spacer(1, 30))
-                
-                # Tabla de datos
-                data = [['Cédula', 'Nombre Completo', 'Agencia', 'Empresa', 'Estado', 'Observaciones']]
-                
-                for index, row in self.datos_asociados.iterrows():
-                    nombre_completo = f"{row['NOMBRE 1']} {row['NOMBRE 2']} {row['APELLIDO 1']} {row['APELLIDO 2']}"
-                    observaciones = str(row.get('OBSERVACIONES', ''))[:30] + '...' if len(str(row.get('OBSERVACIONES', ''))) > 30 else str(row.get('OBSERVACIONES', ''))
-                    
-                    data.append([
-                        str(row['CEDULA']),
-                        nombre_completo,
-                        str(row['AGENCIA']),
-                        str(row['EMPRESA']),
-                        str(row.get('ESTADO', 'PENDIENTE')),
-                        observaciones
-                    ])
-                
-                # Crear tabla
-                table = Table(data)
-                table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                    ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ]))
-                
-                story.append(table)
+        if not archivo_pdf:
+            return
+        
+        por_agencia = messagebox.askyesno(
+            "Reporte PDF",
+            "¿Generar el reporte separado por agencia?\n\n"
+            "Sí: una sección por AGENCIA, generadas en paralelo y unidas en un solo PDF\n"
+            "No: un solo listado con todos los asociados")
+        
+        # El hilo trabaja sobre una copia: la interfaz puede seguir registrando entregas
+        datos = self.datos_asociados.reindex(columns=COLUMNAS_REPORTE).copy()
+        self.cola_reporte = queue.Queue()
+        self.archivo_reporte = archivo_pdf
+        self.ventana_reporte, self.progreso_reporte, self.estado_reporte = self.crear_ventana_progreso(
+            "Generando reporte", f"📄 {os.path.basename(archivo_pdf)}", "Generando...")
+        
+        threading.Thread(target=self.generar_reporte_en_hilo,
+                         args=(datos, archivo_pdf, por_agencia, self.cola_reporte),
+                         daemon=True).start()
+        self.root.after(100, self.revisar_reporte)
+    
+    def generar_reporte_en_hilo(self, datos, archivo_pdf, por_agencia, cola):
+        """Hilo de trabajo: construir el PDF y comunicar el avance por la cola"""
+        try:
+            resultado = generar_reporte(datos, archivo_pdf, por_agencia,
+                                        progreso=lambda avance: cola.put(('progreso', avance)))
+            cola.put(('fin', resultado))
+        except Exception as e:
+            cola.put(('error', str(e)))
+    
+    def revisar_reporte(self):
+        """Atender los mensajes del hilo del reporte desde el hilo de la interfaz"""
+        try:
+            while True:
+                mensaje = self.cola_reporte.get_nowait()
+                if mensaje[0] == 'progreso':
+                    self.progreso_reporte['value'] = mensaje[1] * 100
+                    self.estado_reporte.config(text=f"{mensaje[1]:.0%} completado")
+                    continue
                 
-                # Construir PDF
-                doc.build(story)
+                self.ventana_reporte.destroy()
+                if mensaje[0] == 'error':
+                    messagebox.showerror("Error", f"Error al generar el PDF:\n{mensaje[1]}")
+                    return
                 
-                messagebox.showinfo("Éxito", f"Reporte PDF generado correctamente:\n{archivo_pdf}")
+                resultado = mensaje[1]
+                detalle = f"{resultado['filas']:,} registros en {resultado['documentos']} sección(es)"
+                if resultado['pico_memoria']:
+                    detalle += f"\nMemoria máxima: {resultado['pico_memoria'] / 1024 ** 2:,.0f} MB"
+                messagebox.showinfo("Éxito", f"Reporte PDF generado correctamente:\n{self.archivo_reporte}\n\n{detalle}")
+                return
+        except queue.Empty:
+            pass
+        
+        self.root.after(100, self.revisar_reporte)
+    
+    def generar_recibos_entrega(self):
+        """Elegir filtros y destino de los recibos de entrega en lote"""
+        if self.datos_asociados.empty:
+            messagebox.showwarning("Sin datos", "No hay datos para generar recibos.")
+            return
+        
+        ventana = tk.Toplevel(self.root)
+        ventana.title("Recibos de Entrega")
+        ventana.geometry("400x330")
+        ventana.configure(bg='#f0f0f0')
+        ventana.transient(self.root)
+        ventana.grab_set()
+        
+        agencias = sorted(self.datos_asociados['AGENCIA'].dropna().astype(str).unique())
+        agencia_var = tk.StringVar(value='TODAS')
+        desde_var = tk.StringVar()
+        hasta_var = tk.StringVar()
+        estado_var = tk.StringVar(value='ENTREGADO')
+        salida_var = tk.StringVar(value='pdf')
+        
+        campos_frame = tk.Frame(ventana, bg='#f0f0f0')
+        campos_frame.pack(fill='both', expand=True, padx=20, pady=10)
+        
+        filas = [("Agencia:", ttk.Combobox(campos_frame, textvariable=agencia_var, state='readonly',
+                                           values=['TODAS'] + agencias)),
+                 ("Entregados desde (AAAA-MM-DD):", tk.Entry(campos_frame, textvariable=desde_var)),
+                 ("Entregados hasta (AAAA-MM-DD):", tk.Entry(campos_frame, textvariable=hasta_var)),
+                 ("Estado:", ttk.Combobox(campos_frame, textvariable=estado_var, state='readonly',
+                                          values=['ENTREGADO', 'PENDIENTE', 'TODOS']))]
+        for texto, widget in filas:
+            tk.Label(campos_frame, text=texto, font=('Arial', 10, 'bold'),
+                    bg='#f0f0f0').pack(anchor='w', pady=(6,2))
+            widget.pack(fill='x')
+        
+        salida_frame = tk.Frame(campos_frame, bg='#f0f0f0')
+        salida_frame.pack(fill='x', pady=(10,0))
+        tk.Radiobutton(salida_frame, text="Un solo PDF", variable=salida_var, value='pdf',
+                      bg='#f0f0f0').pack(side='left')
+        tk.Radiobutton(salida_frame, text="ZIP con un PDF por asociado", variable=salida_var, value='zip',
+                      bg='#f0f0f0').pack(side='left', padx=10)
+        
+        def aceptar():
+            desde, hasta = desde_var.get().strip(), hasta_var.get().strip()
+            for fecha in (desde, hasta):
+                if fecha:
+                    try:
+                        datetime.strptime(fecha, '%Y-%m-%d')
+                    except ValueError:
+                        messagebox.showerror("Error", f"Fecha inválida: {fecha}\nUse el formato AAAA-MM-DD",
+                                             parent=ventana)
+                        return
+            
+            zip_por_recibo = salida_var.get() == 'zip'
+            extension = '.zip' if zip_por_recibo else '.pdf'
+            archivo = filedialog.asksaveasfilename(
+                parent=ventana,
+                defaultextension=extension,
+                filetypes=[("ZIP files", "*.zip")] if zip_por_recibo else [("PDF files", "*.pdf")],
+                title="Guardar recibos de entrega"
+            )
+            if not archivo:
+                return
+            
+            ventana.destroy()
+            filtros = {
+                'agencia': None if agencia_var.get() == 'TODAS' else agencia_var.get(),
+                'desde': desde or None,
+                'hasta': hasta or None,
+                'estado': None if estado_var.get() == 'TODOS' else estado_var.get(),
+            }
+            self.iniciar_recibos(archivo, filtros, zip_por_recibo)
+        
+        tk.Button(ventana, text="🧾 Generar", bg='#6f42c1', fg='white', font=('Arial', 10, 'bold'),
+                 command=aceptar, relief='flat', padx=20).pack(pady=(0,15))
+    
+    def iniciar_recibos(self, archivo, filtros, zip_por_recibo):
+        # Igual que el reporte: el hilo trabaja sobre una copia de las columnas del recibo
+        datos = self.datos_asociados.reindex(columns=COLUMNAS_RECIBO).copy()
+        self.cola_recibos = queue.Queue()
+        self.archivo_recibos = archivo
+        self.ventana_recibos, self.progreso_recibos, self.estado_recibos = self.crear_ventana_progreso(
+            "Generando recibos", f"🧾 {os.path.basename(archivo)}", "Generando...")
+        
+        threading.Thread(target=self.generar_recibos_en_hilo,
+                         args=(datos, archivo, filtros, zip_por_recibo, self.cola_recibos),
+                         daemon=True).start()
+        self.root.after(100, self.revisar_recibos)
+    
+    def generar_recibos_en_hilo(self, datos, archivo, filtros, zip_por_recibo, cola):
+        """Hilo de trabajo: generar los recibos y comunicar el avance por la cola"""
+        try:
+            cantidad = generar_recibos(datos, archivo, zip_por_recibo=zip_por_recibo,
+                                       progreso=lambda avance: cola.put(('progreso', avance)), **filtros)
+            cola.put(('fin', cantidad))
+        except Exception as e:
+            cola.put(('error', str(e)))
+    
+    def revisar_recibos(self):
+        """Atender los mensajes del hilo de recibos desde el hilo de la interfaz"""
+        try:
+            while True:
+                mensaje = self.cola_recibos.get_nowait()
+                if mensaje[0] == 'progreso':
+                    self.progreso_recibos['value'] = mensaje[1] * 100
+                    self.estado_recibos.config(text=f"{mensaje[1]:.0%} completado")
+                    continue
                 
-            except Exception as e:
-                messagebox.showerror("Error", f"Error al generar el PDF:\n{str(e)}")
+                self.ventana_recibos.destroy()
+                if mensaje[0] == 'error':
+                    messagebox.showerror("Error", f"Error al generar los recibos:\n{mensaje[1]}")
+                elif mensaje[1] == 0:
+                    messagebox.showinfo("Sin recibos", "Ningún asociado cumple los filtros elegidos.")
+                else:
+                    messagebox.showinfo("Éxito", f"{mensaje[1]:,} recibos generados correctamente:\n{self.archivo_recibos}")
+                return
+        except queue.Empty:
+            pass
+        
+        self.root.after(100, self.revisar_recibos)
     
-    def exportar_csv(self):
-        """Exportar datos a CSV"""
+    def exportar_datos(self):
+        """Elegir columnas, filtros y formato de la exportación"""
         if self.datos_asociados.empty:
             messagebox.showwarning("Sin datos", "No hay datos para exportar.")
             return
         
-        archivo_csv = filedialog.asksaveasfilename(
-            defaultextension=".csv",
-            filetypes=[("CSV files", "*.csv")],
-            title="Exportar a CSV"
-        )
-        
-        if archivo_csv:
+        ventana = tk.Toplevel(self.root)
+        ventana.title("Exportar Datos")
+        ventana.geometry("420x560")
+        ventana.configure(bg='#f0f0f0')
+        ventana.transient(self.root)
+        ventana.grab_set()
+        
+        agencias = sorted(self.datos_asociados['AGENCIA'].dropna().astype(str).unique())
+        agencia_var = tk.StringVar(value='TODAS')
+        estado_var = tk.StringVar(value='TODOS')
+        novedades_var = tk.StringVar(value='Todos')
+        
+        filtros_frame = tk.Frame(ventana, bg='#f0f0f0')
+        filtros_frame.pack(fill='x', padx=20, pady=10)
+        for texto, variable, valores in [("Agencia:", agencia_var, ['TODAS'] + agencias),
+                                         ("Estado:", estado_var, ['TODOS', 'PENDIENTE', 'ENTREGADO']),
+                                         ("Observaciones:", novedades_var, ['Todos', 'Con observaciones', 'Sin observaciones'])]:
+            tk.Label(filtros_frame, text=texto, font=('Arial', 10, 'bold'),
+                    bg='#f0f0f0').pack(anchor='w', pady=(6,2))
+            ttk.Combobox(filtros_frame, textvariable=variable, values=valores,
+                        state='readonly').pack(fill='x')
+        
+        tk.Label(ventana, text="Columnas:", font=('Arial', 10, 'bold'),
+                bg='#f0f0f0').pack(anchor='w', padx=20, pady=(6,2))
+        columnas_frame = tk.Frame(ventana, bg='#f0f0f0')
+        columnas_frame.pack(fill='x', padx=20)
+        vars_columnas = {}
+        for i, columna in enumerate(COLUMNAS_EXPORTACION):
+            vars_columnas[columna] = tk.BooleanVar(value=True)
+            tk.Checkbutton(columnas_frame, text=columna, variable=vars_columnas[columna],
+                          bg='#f0f0f0').grid(row=i // 2, column=i % 2, sticky='w')
+        
+        def aceptar():
+            columnas = [columna for columna, variable in vars_columnas.items() if variable.get()]
+            if not columnas:
+                messagebox.showwarning("Sin columnas", "Seleccione al menos una columna.", parent=ventana)
+                return
+            
+            archivo = filedialog.asksaveasfilename(
+                parent=ventana,
+                defaultextension=".csv",
+                filetypes=[("CSV files", "*.csv"), ("Excel files", "*.xlsx"), ("Parquet files", "*.parquet")],
+                title="Exportar datos"
+            )
+            if not archivo:
+                return
             try:
-                self.datos_asociados.to_csv(archivo_csv, index=False, encoding='utf-8-sig')
-                messagebox.showinfo("Éxito", f"Datos exportados correctamente:\n{archivo_csv}")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error al exportar CSV:\n{str(e)}")
+                formato_archivo(archivo)
+            except ValueError as e:
+                messagebox.showerror("Error", str(e), parent=ventana)
+                return
+            
+            ventana.destroy()
+            filtros = {
+                'agencia': None if agencia_var.get() == 'TODAS' else agencia_var.get(),
+                'estado': None if estado_var.get() == 'TODOS' else estado_var.get(),
+                'observaciones': {"Con observaciones": True, "Sin observaciones": False}.get(novedades_var.get()),
+            }
+            self.iniciar_exportacion(archivo, columnas, filtros)
+        
+        tk.Button(ventana, text="📊 Exportar", bg='#ffc107', fg='black', font=('Arial', 10, 'bold'),
+                 command=aceptar, relief='flat', padx=20).pack(pady=15)
+    
+    def iniciar_exportacion(self, archivo, columnas, filtros):
+        # El hilo no lee el DataFrame, que se sigue modificando con cada entrega: la
+        # interfaz copia un lote a la vez entre eventos y se lo pasa por una cola
+        # acotada, sin copiar nunca todos los datos filtrados
+        columnas = list(columnas or COLUMNAS_EXPORTACION)
+        total = int(mascara_filtros(self.datos_asociados, **filtros).sum())
+        self.lotes_exportacion = lotes_dataframe(self.datos_asociados, columnas, **filtros)
+        self.cola_lotes_exportacion = queue.Queue(maxsize=LOTES_EN_ESPERA)
+        self.cola_exportacion = queue.Queue()
+        self.cancelar_exportacion = threading.Event()
+        self.archivo_exportacion = archivo
+        self.ventana_exportacion, self.progreso_exportacion, self.estado_exportacion = self.crear_ventana_progreso(
+            "Exportando datos", f"📊 {os.path.basename(archivo)}", "Exportando...",
+            cancelar=self.cancelar_exportacion.set)
+        
+        threading.Thread(target=self.exportar_en_hilo,
+                         args=(self.cola_lotes_exportacion, archivo, columnas, total,
+                               self.cola_exportacion, self.cancelar_exportacion),
+                         daemon=True).start()
+        self.enviar_lote_exportacion()
+        self.root.after(100, self.revisar_exportacion)
+    
+    def enviar_lote_exportacion(self):
+        """Copiar el siguiente lote en el hilo de la interfaz; None marca el final"""
+        if self.cancelar_exportacion.is_set():
+            # Despertar al hilo si espera un lote; con la cola llena ya verá la cancelación
+            try:
+                self.cola_lotes_exportacion.put_nowait(None)
+            except queue.Full:
+                pass
+            return
+        if self.cola_lotes_exportacion.full():
+            self.root.after(20, self.enviar_lote_exportacion)
+            return
+        
+        lote = next(self.lotes_exportacion, None)
+        self.cola_lotes_exportacion.put_nowait(lote)
+        if lote is not None:
+            self.root.after(1, self.enviar_lote_exportacion)
+    
+    def exportar_en_hilo(self, lotes, archivo, columnas, total, cola, cancelar):
+        """Hilo de trabajo: escribir los lotes que envía la interfaz y comunicar el avance por la cola"""
+        def recibir():
+            while (lote := lotes.get()) is not None:
+                yield lote
+        
+        try:
+            filas = exportar(recibir(), archivo, columnas, total=total, cancelar=cancelar,
+                             progreso=lambda avance, filas: cola.put(('progreso', avance, filas)))
+            cola.put(('cancelado',) if filas is None else ('fin', filas))
+        except Exception as e:
+            cola.put(('error', str(e)))
+        finally:
+            # La interfaz deja de copiar lotes si el hilo terminó antes de tiempo
+            cancelar.set()
+    
+    def revisar_exportacion(self):
+        """Atender los mensajes del hilo de exportación desde el hilo de la interfaz"""
+        try:
+            while True:
+                mensaje = self.cola_exportacion.get_nowait()
+                if mensaje[0] == 'progreso':
+                    self.progreso_exportacion['value'] = mensaje[1] * 100
+                    self.estado_exportacion.config(text=f"{mensaje[2]:,} filas escritas")
+                    continue
+                
+                self.ventana_exportacion.destroy()
+                if mensaje[0] == 'error':
+                    messagebox.showerror("Error", f"Error al exportar:\n{mensaje[1]}")
+                elif mensaje[0] == 'fin':
+                    messagebox.showinfo("Éxito", f"{mensaje[1]:,} registros exportados correctamente:\n{self.archivo_exportacion}")
+                return
+        except queue.Empty:
+            pass
+        
+        self.root.after(100, self.revisar_exportacion)
     
     def ver_historial(self):
         """Ver historial de entregas"""
@@ -918,8 +1890,7 @@ class SistemaEntregaRegalos:
     
     def mostrar_todos(self):
         """Mostrar todos los registros"""
-        self.datos_filtrados = self.datos_asociados.copy()
-        self.actualizar_tabla()
+        self.mostrar_vista('todos')
     
     def filtrar_entregados(self):
         """Filtrar solo entregados"""
@@ -927,15 +1898,8 @@ class SistemaEntregaRegalos:
             messagebox.showwarning("Sin datos", "No hay datos para filtrar.")
             return
         
-        entregados = self.datos_asociados[self.datos_asociados['ESTADO'] == 'ENTREGADO']
-        
-        # Temporalmente reemplazar datos para mostrar solo entregados
-        datos_originales = self.datos_asociados.copy()
-        self.datos_asociados = entregados
-        self.actualizar_tabla()
-        self.datos_asociados = datos_originales
-        
-        messagebox.showinfo("Filtro aplicado", f"Mostrando {len(entregados)} registros entregados.")
+        cantidad = self.mostrar_vista('entregados')
+        messagebox.showinfo("Filtro aplicado", f"Mostrando {cantidad} registros entregados.")
     
     def filtrar_pendientes(self):
         """Filtrar solo pendientes"""
@@ -943,15 +1907,8 @@ class SistemaEntregaRegalos:
             messagebox.showwarning("Sin datos", "No hay datos para filtrar.")
             return
         
-        pendientes = self.datos_asociados[self.datos_asociados['ESTADO'] != 'ENTREGADO']
-        
-        # Temporalmente reemplazar datos para mostrar solo pendientes
-        datos_originales = self.datos_asociados.copy()
-        self.datos_asociados = pendientes
-        self.actualizar_tabla()
-        self.datos_asociados = datos_originales
-        
-        messagebox.showinfo("Filtro aplicado", f"Mostrando {len(pendientes)} registros pendientes.")
+        cantidad = self.mostrar_vista('pendientes')
+        messagebox.showinfo("Filtro aplicado", f"Mostrando {cantidad} registros pendientes.")
     
     def filtrar_novedades(self):
         """Filtrar solo registros con novedades"""
@@ -959,25 +1916,18 @@ class SistemaEntregaRegalos:
             messagebox.showwarning("Sin datos", "No hay datos para filtrar.")
             return
         
-        novedades = self.datos_asociados[
-            (self.datos_asociados['OBSERVACIONES'].notna()) & 
-            (self.datos_asociados['OBSERVACIONES'].str.strip() != '')
-        ]
-        
-        # Temporalmente reemplazar datos para mostrar solo con novedades
-        datos_originales = self.datos_asociados.copy()
-        self.datos_asociados = novedades
-        self.actualizar_tabla()
-        self.datos_asociados = datos_originales
-        
-        messagebox.showinfo("Filtro aplicado", f"Mostrando {len(novedades)} registros con novedades.")
+        cantidad = self.mostrar_vista('novedades')
+        messagebox.showinfo("Filtro aplicado", f"Mostrando {cantidad} registros con novedades.")
     
     def limpiar_datos(self):
         """Limpiar todos los datos"""
         if messagebox.askyesno("Confirmar", "¿Está seguro de que desea limpiar todos los datos?\nEsta acción no se puede deshacer."):
+            if self.bitacora is not None:
+                self.cerrar_bitacora()
+                bitacora.eliminar_sesion(self.archivo_actual)
             self.datos_asociados = pd.DataFrame()
-            self.datos_filtrados = pd.DataFrame()
             self.archivo_actual = None
+            self.reconstruir_indices()
             
             self.actualizar_tabla()
             self.actualizar_estadisticas()
@@ -993,6 +1943,7 @@ def main():
     root = tk.Tk()
     app = SistemaEntregaRegalos(root)
     root.mainloop()
+    app.cerrar_bitacora()  # Último fsync antes de salir
 
 
 if __name__ == "__main__":
@@ -1003,11 +1954,13 @@ if __name__ == "__main__":
         from tkinter import ttk, filedialog, messagebox
         from reportlab.lib.pagesizes import A4
         from reportlab.platypus import SimpleDocTemplate
+        import pypdf
+        import pyarrow
         print("✅ Todas las dependencias están disponibles")
     except ImportError as e:
         print(f"❌ Error: Falta instalar una dependencia: {e}")
         print("\nPara instalar las dependencias necesarias, ejecute:")
-        print("pip install pandas openpyxl reportlab")
+        print("pip install pandas openpyxl reportlab pypdf pyarrow")
         exit(1)
     
     main()
\ No newline at end of file
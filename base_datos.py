@@ -0,0 +1,779 @@
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future, TimeoutError
+from itertools import repeat
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+DB_PATH = 'cooperenka.db'
+
+# Ajustes aplicados a cada conexión nueva del pool
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',        # lectores y escritor no se bloquean entre sí
+    'PRAGMA synchronous=NORMAL',      # seguro con WAL y mucho más rápido que FULL
+    'PRAGMA busy_timeout=5000',       # esperar hasta 5 s antes de "database is locked"
+    'PRAGMA cache_size=-32000',       # ~32 MB de caché de páginas
+    'PRAGMA mmap_size=268435456',     # 256 MB de lectura mapeada en memoria
+    'PRAGMA temp_store=MEMORY',
+)
+
+# Máximo de resultados devueltos por una búsqueda
+LIMITE_BUSQUEDA = 50
+
+# Filas por página de la lista completa
+TAMANO_PAGINA = 100
+
+# A partir de este tamaño de bloque la importación suspende los triggers y
+# recalcula el resumen al final, en lugar de mantenerlo fila a fila
+UMBRAL_IMPORTACION_MASIVA = 5000
+
+# Escritor agrupado: una transacción junta hasta este número de operaciones
+# encoladas mientras se confirmaba el lote anterior
+MAX_LOTE = 64
+
+# Espera máxima (s) de un llamador por la confirmación de su operación
+ESPERA_CONFIRMACION = 30
+
+# Triggers que mantienen el resumen de contadores y la versión de sincronización
+TRIGGERS = {
+    'resumen_ai': '''
+    CREATE TRIGGER IF NOT EXISTS resumen_ai AFTER INSERT ON asociados BEGIN
+        INSERT INTO resumen_entregas(agencia, empresa)
+        SELECT new.agencia, new.empresa WHERE NOT EXISTS (
+            SELECT 1 FROM resumen_entregas WHERE agencia = new.agencia AND empresa = new.empresa);
+        UPDATE resumen_entregas
+        SET total = total + 1,
+            entregados = entregados + (new.estado = 'ENTREGADO'),
+            novedades = novedades + (TRIM(COALESCE(new.observaciones, '')) != '')
+        WHERE agencia = new.agencia AND empresa = new.empresa;
+    END''',
+    'resumen_ad': '''
+    CREATE TRIGGER IF NOT EXISTS resumen_ad AFTER DELETE ON asociados BEGIN
+        UPDATE resumen_entregas
+        SET total = total - 1,
+            entregados = entregados - (old.estado = 'ENTREGADO'),
+            novedades = novedades - (TRIM(COALESCE(old.observaciones, '')) != '')
+        WHERE agencia = old.agencia AND empresa = old.empresa;
+    END''',
+    'resumen_au': '''
+    CREATE TRIGGER IF NOT EXISTS resumen_au
+    AFTER UPDATE OF agencia, empresa, estado, observaciones ON asociados BEGIN
+        UPDATE resumen_entregas
+        SET total = total - 1,
+            entregados = entregados - (old.estado = 'ENTREGADO'),
+            novedades = novedades - (TRIM(COALESCE(old.observaciones, '')) != '')
+        WHERE agencia = old.agencia AND empresa = old.empresa;
+        INSERT INTO resumen_entregas(agencia, empresa)
+        SELECT new.agencia, new.empresa WHERE NOT EXISTS (
+            SELECT 1 FROM resumen_entregas WHERE agencia = new.agencia AND empresa = new.empresa);
+        UPDATE resumen_entregas
+        SET total = total + 1,
+            entregados = entregados + (new.estado = 'ENTREGADO'),
+            novedades = novedades + (TRIM(COALESCE(new.observaciones, '')) != '')
+        WHERE agencia = new.agencia AND empresa = new.empresa;
+    END''',
+    # Cada cambio recibe la siguiente versión global (sincronización incremental);
+    # las escrituras que ya asignan su versión (importación) no se vuelven a numerar
+    'version_ai': '''
+    CREATE TRIGGER IF NOT EXISTS version_ai AFTER INSERT ON asociados WHEN new.version = 0 BEGIN
+        UPDATE sincronizacion SET version = version + 1;
+        UPDATE asociados SET version = (SELECT version FROM sincronizacion) WHERE id = new.id;
+    END''',
+    'version_au': '''
+    CREATE TRIGGER IF NOT EXISTS version_au
+    AFTER UPDATE OF cedula, nombre1, nombre2, apellido1, apellido2, agencia, empresa,
+                    observaciones, estado, fecha_entrega, usuario_entrega ON asociados
+    WHEN new.version = old.version BEGIN
+        UPDATE sincronizacion SET version = version + 1;
+        UPDATE asociados SET version = (SELECT version FROM sincronizacion) WHERE id = new.id;
+    END''',
+    'version_ad': '''
+    CREATE TRIGGER IF NOT EXISTS version_ad AFTER DELETE ON asociados BEGIN
+        UPDATE sincronizacion SET version = version + 1;
+        INSERT OR REPLACE INTO asociados_eliminados (id, version)
+        VALUES (old.id, (SELECT version FROM sincronizacion));
+    END''',
+}
+
+SQL_RECALCULAR_RESUMEN = '''
+INSERT INTO resumen_entregas (agencia, empresa, total, entregados, novedades)
+SELECT agencia, empresa, COUNT(*),
+       SUM(estado = 'ENTREGADO'),
+       SUM(TRIM(COALESCE(observaciones, '')) != '')
+FROM asociados GROUP BY agencia, empresa
+'''
+
+
+def conectar(ruta=DB_PATH):
+    """Abrir una conexión con los PRAGMAS del sistema"""
+    conn = sqlite3.connect(ruta, timeout=5, check_same_thread=False)
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+class PoolConexiones:
+    """Pool de conexiones SQLite de larga vida, una prestada por hilo"""
+
+    def __init__(self, ruta=DB_PATH, max_conexiones=8):
+        self.ruta = ruta
+        self.max_conexiones = max_conexiones
+        self._libres = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def conexion(self):
+        """Prestar una conexión al hilo actual y devolverla al pool al salir"""
+        # Si el hilo ya tiene una conexión prestada se reutiliza (llamadas anidadas)
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+
+        with self._lock:
+            conn = self._libres.pop() if self._libres else None
+        if conn is None:
+            conn = conectar(self.ruta)
+
+        self._local.conn = conn
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            if conn.in_transaction:
+                conn.rollback()
+            with self._lock:
+                if len(self._libres) < self.max_conexiones:
+                    self._libres.append(conn)
+                    conn = None
+            if conn is not None:
+                conn.close()
+
+    def cerrar(self):
+        """Cerrar todas las conexiones libres del pool"""
+        with self._lock:
+            libres, self._libres = self._libres, []
+        for conn in libres:
+            conn.close()
+
+
+class EscritorAgrupado:
+    """Hilo único de escritura con commit agrupado (group commit)
+
+    Las estaciones encolan operaciones funcion(conn, *args) en lugar de abrir
+    cada una su propia transacción: el hilo ejecuta en una sola transacción
+    todas las que ya esperan en la cola (hasta MAX_LOTE), hace un único commit
+    y entonces responde a cada llamador. Una operación sola no espera a nadie;
+    con muchas estaciones los lotes crecen solos mientras se confirma el
+    anterior. Cada operación corre en su propio SAVEPOINT, así que un error
+    solo deshace la suya. Las funciones no deben hacer commit (ver
+    registrar_entrega, registrar_entrega_cedula y actualizar_asociado).
+
+    Si el hilo no puede abrir la base o falla fuera de una transacción, las
+    operaciones pendientes reciben el error y la siguiente llamada arranca un
+    hilo nuevo.
+    """
+
+    def __init__(self, ruta=DB_PATH, max_lote=MAX_LOTE):
+        self.ruta = ruta
+        self.max_lote = max_lote
+        self.cola = queue.Queue()
+        self._hilo = None
+        self._lock = threading.Lock()
+
+    def enviar(self, funcion, *args):
+        """Encolar una operación; devuelve un Future que se resuelve tras el commit"""
+        futuro = Future()
+        # Bajo el lock: un hilo que termina por error no deja operaciones sin atender
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._procesar, daemon=True)
+                self._hilo.start()
+            self.cola.put((funcion, args, futuro))
+        return futuro
+
+    def ejecutar(self, funcion, *args, timeout=ESPERA_CONFIRMACION):
+        """Encolar una operación y esperar su resultado (o su excepción) ya confirmado
+
+        Si vence `timeout` se lanza TimeoutError; la operación se descarta si
+        todavía no había empezado.
+        """
+        futuro = self.enviar(funcion, *args)
+        try:
+            return futuro.result(timeout)
+        except TimeoutError:
+            futuro.cancel()
+            raise
+
+    def cerrar(self):
+        """Terminar las operaciones encoladas y detener el hilo"""
+        with self._lock:
+            hilo, self._hilo = self._hilo, None
+        if hilo is not None:
+            self.cola.put(None)
+            hilo.join()
+
+    def _procesar(self):
+        try:
+            conn = conectar(self.ruta)
+        except Exception as e:
+            self._abortar(e, [])
+            return
+
+        lote = []
+        try:
+            while True:
+                lote = [self.cola.get()]
+                if lote[0] is None:
+                    return
+                while len(lote) < self.max_lote:
+                    try:
+                        operacion = self.cola.get_nowait()
+                    except queue.Empty:
+                        break
+                    if operacion is None:
+                        self.cola.put(None)  # Se atiende tras confirmar este lote
+                        break
+                    lote.append(operacion)
+                self._ejecutar_lote(conn, lote)
+                lote = []
+        except Exception as e:
+            self._abortar(e, lote)
+        finally:
+            conn.close()
+
+    def _abortar(self, error, lote):
+        """Terminar el hilo por un error: responder a todas las operaciones pendientes"""
+        with self._lock:
+            if self._hilo is threading.current_thread():
+                self._hilo = None
+            pendientes = list(lote)
+            while True:
+                try:
+                    pendientes.append(self.cola.get_nowait())
+                except queue.Empty:
+                    break
+        for operacion in pendientes:
+            if operacion is not None and not operacion[2].done():
+                operacion[2].set_exception(error)
+
+    def _ejecutar_lote(self, conn, lote):
+        # Las operaciones que su llamador ya abandonó (ejecutar con timeout) no se ejecutan
+        lote = [operacion for operacion in lote if operacion[2].set_running_or_notify_cancel()]
+        if not lote:
+            return
+        resultados = []
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            for funcion, args, futuro in lote:
+                conn.execute('SAVEPOINT operacion')
+                try:
+                    resultados.append((futuro, funcion(conn, *args), None))
+                except Exception as e:
+                    conn.execute('ROLLBACK TO operacion')
+                    resultados.append((futuro, None, e))
+                conn.execute('RELEASE operacion')
+            conn.commit()
+        except Exception as e:
+            # Sin commit no se confirma nada del lote (p. ej. "database is locked")
+            if conn.in_transaction:
+                conn.rollback()
+            for _, _, futuro in lote:
+                futuro.set_exception(e)
+            return
+
+        for futuro, resultado, error in resultados:
+            if error is None:
+                futuro.set_result(resultado)
+            else:
+                futuro.set_exception(error)
+
+
+# Crear/conectar base de datos
+def init_db(conn):
+    cursor = conn.cursor()
+
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS asociados (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        cedula TEXT UNIQUE NOT NULL,
+        nombre1 TEXT NOT NULL,
+        nombre2 TEXT,
+        apellido1 TEXT NOT NULL,
+        apellido2 TEXT,
+        agencia TEXT NOT NULL,
+        empresa TEXT NOT NULL,
+        observaciones TEXT,
+        estado TEXT DEFAULT 'PENDIENTE',
+        fecha_entrega TEXT,
+        usuario_entrega TEXT,
+        version INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+
+    # Bases creadas antes de la sincronización incremental
+    columnas = [fila[1] for fila in cursor.execute('PRAGMA table_info(asociados)')]
+    if 'version' not in columnas:
+        cursor.execute('ALTER TABLE asociados ADD COLUMN version INTEGER NOT NULL DEFAULT 0')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_asociados_version ON asociados(version)')
+
+    # Filtros y orden de la lista completa paginada
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_asociados_estado_agencia ON asociados(estado, agencia)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_asociados_orden ON asociados(apellido1, nombre1)')
+
+    # Versión global de los datos y registro de asociados eliminados
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS sincronizacion (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    ''')
+    cursor.execute('INSERT OR IGNORE INTO sincronizacion (id, version) VALUES (1, 0)')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS asociados_eliminados (
+        id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL
+    )
+    ''')
+
+    # Bases anteriores: el índice FTS5 ya no se usa (nombres con busqueda.py,
+    # cédulas con el índice UNIQUE) y sus triggers encarecían cada escritura
+    for nombre in ('asociados_fts_ai', 'asociados_fts_ad', 'asociados_fts_au'):
+        cursor.execute(f'DROP TRIGGER IF EXISTS {nombre}')
+    cursor.execute('DROP TABLE IF EXISTS asociados_fts')
+
+    # Contadores por agencia y empresa
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'resumen_entregas'")
+    resumen_nuevo = cursor.fetchone() is None
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS resumen_entregas (
+        agencia TEXT NOT NULL,
+        empresa TEXT NOT NULL,
+        total INTEGER NOT NULL DEFAULT 0,
+        entregados INTEGER NOT NULL DEFAULT 0,
+        novedades INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (agencia, empresa)
+    )
+    ''')
+
+    # Se mantiene sincronizado por triggers en cada cambio de asociados
+    for sql in TRIGGERS.values():
+        cursor.execute(sql)
+
+    if resumen_nuevo:
+        # Bases creadas antes del resumen: calcular los contadores una sola vez
+        cursor.execute(SQL_RECALCULAR_RESUMEN)
+
+    # Insertar datos de ejemplo si la tabla está vacía
+    cursor.execute('SELECT COUNT(*) FROM asociados')
+    if cursor.fetchone()[0] == 0:
+        datos_ejemplo = [
+            ('12345678', 'JUAN', 'CARLOS', 'GARCIA', 'PEREZ', 'PRINCIPAL', 'EMPRESA A', '', 'PENDIENTE', '', ''),
+            ('87654321', 'MARIA', 'ELENA', 'MARTINEZ', 'GONZALEZ', 'ZONA NORTE', 'EMPRESA B', 'Contactar antes de entregar', 'PENDIENTE', '', ''),
+            ('11223344', 'CARLOS', 'ALBERTO', 'RODRIGUEZ', 'HERNANDEZ', 'CENTRO', 'EMPRESA C', '', 'ENTREGADO', '2024-12-15 10:30', 'Sistema'),
+            ('99887766', 'ANA', 'SOFIA', 'LOPEZ', 'DIAZ', 'SUR', 'EMPRESA D', 'Verificar identidad', 'PENDIENTE', '', ''),
+            ('55443322', 'LUIS', 'MIGUEL', 'HERNANDEZ', 'JIMENEZ', 'ORIENTE', 'EMPRESA E', '', 'PENDIENTE', '', '')
+        ]
+
+        cursor.executemany('''
+        INSERT INTO asociados (cedula, nombre1, nombre2, apellido1, apellido2, agencia, empresa, observaciones, estado, fecha_entrega, usuario_entrega)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', datos_ejemplo)
+
+    # Estadísticas iniciales del planificador (las importaciones las renuevan)
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+    if cursor.fetchone() is None:
+        cursor.execute('ANALYZE asociados')
+
+    conn.commit()
+
+# Funciones de base de datos
+def get_version(conn):
+    """Versión global de los datos: los triggers la incrementan con cada cambio"""
+    return conn.execute('SELECT version FROM sincronizacion').fetchone()[0]
+
+def get_estadisticas(conn):
+    cursor = conn.cursor()
+
+    # Una sola lectura de los contadores precalculados
+    cursor.execute('''
+    SELECT COALESCE(SUM(total), 0), COALESCE(SUM(entregados), 0), COALESCE(SUM(novedades), 0)
+    FROM resumen_entregas
+    ''')
+    total, entregados, novedades = cursor.fetchone()
+    pendientes = total - entregados
+
+    return total, entregados, pendientes, novedades
+
+def get_resumen_agencias(conn):
+    """Totales por agencia leídos del resumen mantenido por triggers"""
+    return pd.read_sql_query('''
+    SELECT agencia,
+           SUM(total) AS total,
+           SUM(entregados) AS entregados,
+           SUM(total) - SUM(entregados) AS pendientes,
+           SUM(novedades) AS novedades
+    FROM resumen_entregas
+    GROUP BY agencia
+    HAVING SUM(total) > 0
+    ORDER BY agencia
+    ''', conn)
+
+def get_agencias(conn):
+    """Agencias con asociados, leídas del resumen (pocas filas) en lugar de la tabla"""
+    cursor = conn.execute('SELECT DISTINCT agencia FROM resumen_entregas WHERE total > 0 ORDER BY agencia')
+    return [fila[0] for fila in cursor.fetchall()]
+
+def filtros_lista(estado=None, agencia=None, observaciones=None):
+    """Condiciones SQL y parámetros de los filtros de la lista completa
+
+    `observaciones` es True (con observaciones), False (sin) o None (todos).
+    """
+    condiciones, params = [], []
+    if estado:
+        condiciones.append('estado = ?')
+        params.append(estado)
+    if agencia:
+        condiciones.append('agencia = ?')
+        params.append(agencia)
+    if observaciones is True:
+        condiciones.append("TRIM(COALESCE(observaciones, '')) != ''")
+    elif observaciones is False:
+        condiciones.append("TRIM(COALESCE(observaciones, '')) = ''")
+    return condiciones, params
+
+def contar_asociados(conn, estado=None, agencia=None, observaciones=None):
+    """Cantidad de asociados que cumplen los filtros"""
+    if observaciones is None:
+        # Sin filtro de observaciones el resumen por agencia basta
+        columna = {'ENTREGADO': 'entregados', 'PENDIENTE': 'total - entregados'}.get(estado, 'total')
+        query = f'SELECT COALESCE(SUM({columna}), 0) FROM resumen_entregas'
+        params = []
+        if agencia:
+            query += ' WHERE agencia = ?'
+            params.append(agencia)
+        return conn.execute(query, params).fetchone()[0]
+
+    condiciones, params = filtros_lista(estado, agencia, observaciones)
+    return conn.execute(f"SELECT COUNT(*) FROM asociados WHERE {' AND '.join(condiciones)}", params).fetchone()[0]
+
+def get_pagina_asociados(conn, estado=None, agencia=None, observaciones=None,
+                         despues=None, limite=TAMANO_PAGINA):
+    """Una página de la lista ordenada por (apellido1, nombre1, id)
+
+    `despues` es la clave (apellido1, nombre1, id) de la última fila de la página
+    anterior: la consulta salta directo a ella por el índice, sin OFFSET.
+    """
+    condiciones, params = filtros_lista(estado, agencia, observaciones)
+    if despues is not None:
+        condiciones.append('(apellido1, nombre1, id) > (?, ?, ?)')
+        params.extend(despues)
+
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+    query = f'SELECT * FROM asociados {where} ORDER BY apellido1, nombre1, id LIMIT ?'
+    return pd.read_sql_query(query, conn, params=[*params, limite])
+
+def es_cedula(termino):
+    """Un término solo de dígitos se trata como cédula (lectura de escáner)"""
+    return termino.strip().isdigit()
+
+SQL_TODOS = 'SELECT * FROM asociados ORDER BY apellido1, nombre1'
+
+SQL_POR_CEDULA = 'SELECT * FROM asociados WHERE cedula = ?'
+
+SQL_POR_ID = 'SELECT * FROM asociados WHERE id = ?'
+
+# Rango sobre el índice UNIQUE de cedula: las que empiezan por un prefijo
+SQL_POR_PREFIJO_CEDULA = 'SELECT * FROM asociados WHERE cedula >= ? AND cedula < ? ORDER BY cedula LIMIT ?'
+
+def buscar_por_cedula(conn, cedula):
+    """Búsqueda exacta por cédula usando el índice UNIQUE de la columna"""
+    return pd.read_sql_query(SQL_POR_CEDULA, conn, params=[cedula.strip()])
+
+def buscar_por_id(conn, asociado_id):
+    return pd.read_sql_query(SQL_POR_ID, conn, params=[asociado_id])
+
+def placeholders(cantidad):
+    return ', '.join('?' * cantidad)
+
+def buscar_por_ids(conn, ids):
+    """Asociados con los ids dados, en el mismo orden de la lista"""
+    df = pd.read_sql_query(f'SELECT * FROM asociados WHERE id IN ({placeholders(len(ids))})', conn, params=list(ids))
+    posiciones = pd.Index(df['id']).get_indexer(ids)
+    return df.iloc[posiciones[posiciones >= 0]].reset_index(drop=True)
+
+def get_nombres(conn):
+    """Versión de los datos y nombre completo de todos los asociados, de una misma lectura"""
+    conn.execute('BEGIN')
+    try:
+        version = get_version(conn)
+        df = pd.read_sql_query(
+            "SELECT id, nombre1 || ' ' || COALESCE(nombre2, '') || ' ' || apellido1 || ' ' || "
+            "COALESCE(apellido2, '') AS nombre FROM asociados", conn)
+    finally:
+        conn.rollback()
+    return version, df
+
+def rango_prefijo(prefijo):
+    """Parámetros (desde, hasta) de SQL_POR_PREFIJO_CEDULA para un prefijo no vacío"""
+    return prefijo, prefijo[:-1] + chr(ord(prefijo[-1]) + 1)
+
+def buscar_cedula(conn, termino, limite=LIMITE_BUSQUEDA):
+    """Cédula completa por igualdad o, si no existe, las que empiezan por el término"""
+    cedula = termino.strip()
+    df = buscar_por_cedula(conn, cedula)
+    if not df.empty or not cedula:
+        return df
+    return pd.read_sql_query(SQL_POR_PREFIJO_CEDULA, conn, params=[*rango_prefijo(cedula), limite])
+
+def registrar_entrega(conn, asociado_id, usuario):
+    """UPDATE de la entrega sin commit (para EscritorAgrupado); devuelve si el asociado existe"""
+    cursor = conn.cursor()
+
+    fecha_actual = datetime.now().strftime('%Y-%m-%d %H:%M')
+    cursor.execute('''
+    UPDATE asociados
+    SET estado = 'ENTREGADO', fecha_entrega = ?, usuario_entrega = ?
+    WHERE id = ?
+    ''', (fecha_actual, usuario, asociado_id))
+    return cursor.rowcount == 1
+
+def registrar_entrega_cedula(conn, cedula, usuario):
+    """UPDATE de la entrega por cédula sin commit; solo pendientes sin observaciones"""
+    cursor = conn.cursor()
+
+    fecha_actual = datetime.now().strftime('%Y-%m-%d %H:%M')
+    cursor.execute('''
+    UPDATE asociados
+    SET estado = 'ENTREGADO', fecha_entrega = ?, usuario_entrega = ?
+    WHERE cedula = ? AND estado != 'ENTREGADO'
+    AND (observaciones IS NULL OR TRIM(observaciones) = '')
+    ''', (fecha_actual, usuario, cedula.strip()))
+    return cursor.rowcount == 1
+
+# Campos que se pueden modificar desde la edición de un registro
+CAMPOS_EDITABLES = ('nombre1', 'nombre2', 'apellido1', 'apellido2',
+                    'agencia', 'empresa', 'observaciones', 'estado')
+
+CAMPOS_OBLIGATORIOS = ('nombre1', 'apellido1', 'agencia', 'empresa')
+
+def actualizar_asociado(conn, asociado_id, datos, usuario):
+    """Actualizar los campos editables de un asociado sin commit; devuelve False si no existe"""
+    cambios = {campo: str(datos[campo] or '').strip() for campo in CAMPOS_EDITABLES if campo in datos}
+    for campo in CAMPOS_OBLIGATORIOS:
+        if campo in cambios and not cambios[campo]:
+            raise ValueError(f"El campo {campo} es obligatorio")
+    if 'estado' in cambios:
+        cambios['estado'] = cambios['estado'].upper()
+        if cambios['estado'] not in ('PENDIENTE', 'ENTREGADO'):
+            raise ValueError(f"Estado no válido: {cambios['estado']}")
+
+    cursor = conn.cursor()
+    cursor.execute('SELECT estado FROM asociados WHERE id = ?', (asociado_id,))
+    fila = cursor.fetchone()
+    if fila is None:
+        return False
+
+    # Pasar a ENTREGADO desde la edición registra fecha y usuario como una entrega
+    if cambios.get('estado') == 'ENTREGADO' and fila[0] != 'ENTREGADO':
+        cambios['fecha_entrega'] = datetime.now().strftime('%Y-%m-%d %H:%M')
+        cambios['usuario_entrega'] = usuario
+
+    if cambios:
+        asignaciones = ', '.join(f'{campo} = ?' for campo in cambios)
+        cursor.execute(f'UPDATE asociados SET {asignaciones} WHERE id = ?',
+                       (*cambios.values(), asociado_id))
+    return True
+
+def nombre_completo(fila):
+    partes = (fila.get('nombre1'), fila.get('nombre2'), fila.get('apellido1'), fila.get('apellido2'))
+    return ' '.join(parte for parte in partes if parte)
+
+def consultar_registros(conn, sql, params=()):
+    """Ejecutar una consulta sobre asociados y devolver diccionarios listos para JSON"""
+    cursor = conn.execute(sql, params)
+    columnas = [descripcion[0] for descripcion in cursor.description]
+    registros = [dict(zip(columnas, fila)) for fila in cursor.fetchall()]
+    for registro in registros:
+        registro['nombre_completo'] = nombre_completo(registro)
+    return registros
+
+def registros_cedula(conn, termino, limite=LIMITE_BUSQUEDA):
+    """Misma búsqueda que buscar_cedula, como lista de diccionarios"""
+    cedula = termino.strip()
+    registros = consultar_registros(conn, SQL_POR_CEDULA, [cedula])
+    if registros or not cedula:
+        return registros
+    return consultar_registros(conn, SQL_POR_PREFIJO_CEDULA, [*rango_prefijo(cedula), limite])
+
+def registros_por_ids(conn, ids):
+    """Como buscar_por_ids, como lista de diccionarios"""
+    registros = consultar_registros(conn, f'SELECT * FROM asociados WHERE id IN ({placeholders(len(ids))})', list(ids))
+    orden = {asociado_id: posicion for posicion, asociado_id in enumerate(ids)}
+    return sorted(registros, key=lambda registro: orden[registro['id']])
+
+def aplicar_cambio(conn, asociado_id, funcion, *args):
+    """Ejecutar funcion(conn, asociado_id, *args) en una transacción exclusiva
+
+    `funcion` no debe hacer commit (registrar_entrega, actualizar_asociado): el
+    registro nuevo se lee dentro de la misma transacción y se confirma al final.
+    Devuelve el registro (anterior, nuevo); (None, None) si el asociado no existe.
+    """
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        anterior = consultar_registros(conn, SQL_POR_ID, [asociado_id])
+        if not anterior:
+            conn.rollback()
+            return None, None
+        funcion(conn, asociado_id, *args)
+        nuevo = consultar_registros(conn, SQL_POR_ID, [asociado_id])[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return anterior[0], nuevo
+
+def delta_contadores(anterior, nuevo):
+    """Variación de los contadores generales entre dos versiones de un registro"""
+    def contadores(registro):
+        entregado = int(registro['estado'] == 'ENTREGADO')
+        novedad = int(bool((registro['observaciones'] or '').strip()))
+        return entregado, novedad
+
+    entregados_antes, novedades_antes = contadores(anterior)
+    entregados, novedades = contadores(nuevo)
+    return {
+        'total': 0,
+        'entregados': entregados - entregados_antes,
+        'pendientes': entregados_antes - entregados,
+        'novedades': novedades - novedades_antes,
+    }
+
+def cambios_desde(conn, version=None):
+    """Asociados modificados y eliminados después de `version` (todos si es None)
+
+    Devuelve {'version', 'asociados', 'eliminados'}; la versión devuelta es la
+    que el cliente debe enviar en la siguiente consulta.
+    """
+    # Una sola transacción de lectura: versión y filas salen de la misma instantánea
+    conn.execute('BEGIN')
+    try:
+        actual = get_version(conn)
+        if version is None:
+            asociados = consultar_registros(conn, SQL_TODOS)
+            eliminados = []
+        else:
+            asociados = consultar_registros(conn, 'SELECT * FROM asociados WHERE version > ? ORDER BY version',
+                                            [version])
+            eliminados = [fila[0] for fila in conn.execute(
+                'SELECT id FROM asociados_eliminados WHERE version > ?', [version])]
+    finally:
+        conn.rollback()
+    return {'version': actual, 'asociados': asociados, 'eliminados': eliminados}
+
+# Columnas del archivo de asociados -> columnas de la tabla
+COLUMNAS_ARCHIVO = {
+    'CEDULA': 'cedula', 'NOMBRE 1': 'nombre1', 'NOMBRE 2': 'nombre2',
+    'APELLIDO 1': 'apellido1', 'APELLIDO 2': 'apellido2', 'AGENCIA': 'agencia',
+    'EMPRESA': 'empresa', 'OBSERVACIONES': 'observaciones',
+    'ESTADO': 'estado', 'FECHA_ENTREGA': 'fecha_entrega',
+}
+
+# Los datos personales se actualizan; el estado de entrega ya registrado se conserva
+SQL_UPSERT_ASOCIADO = '''
+INSERT INTO asociados (cedula, nombre1, nombre2, apellido1, apellido2, agencia, empresa, observaciones, estado, fecha_entrega, version)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(cedula) DO UPDATE SET
+    nombre1 = excluded.nombre1, nombre2 = excluded.nombre2,
+    apellido1 = excluded.apellido1, apellido2 = excluded.apellido2,
+    agencia = excluded.agencia, empresa = excluded.empresa,
+    observaciones = excluded.observaciones, version = excluded.version
+WHERE nombre1 IS NOT excluded.nombre1 OR nombre2 IS NOT excluded.nombre2
+   OR apellido1 IS NOT excluded.apellido1 OR apellido2 IS NOT excluded.apellido2
+   OR agencia IS NOT excluded.agencia OR empresa IS NOT excluded.empresa
+   OR observaciones IS NOT excluded.observaciones
+'''
+
+# Igual, para archivos sin columna OBSERVACIONES: las ya registradas no se tocan
+SQL_UPSERT_SIN_OBSERVACIONES = '''
+INSERT INTO asociados (cedula, nombre1, nombre2, apellido1, apellido2, agencia, empresa, observaciones, estado, fecha_entrega, version)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT(cedula) DO UPDATE SET
+    nombre1 = excluded.nombre1, nombre2 = excluded.nombre2,
+    apellido1 = excluded.apellido1, apellido2 = excluded.apellido2,
+    agencia = excluded.agencia, empresa = excluded.empresa, version = excluded.version
+WHERE nombre1 IS NOT excluded.nombre1 OR nombre2 IS NOT excluded.nombre2
+   OR apellido1 IS NOT excluded.apellido1 OR apellido2 IS NOT excluded.apellido2
+   OR agencia IS NOT excluded.agencia OR empresa IS NOT excluded.empresa
+'''
+
+def preparar_bloque(bloque):
+    """Normalizar un bloque del archivo; devuelve (filas válidas, cantidad rechazada)"""
+    df = bloque[list(COLUMNAS_ARCHIVO)].rename(columns=COLUMNAS_ARCHIVO)
+    df = df.fillna('').astype(str).apply(lambda columna: columna.str.strip())
+    df['estado'] = df['estado'].str.upper().where(df['estado'].str.upper() == 'ENTREGADO', 'PENDIENTE')
+
+    validos = ((df['cedula'] != '') & (df['nombre1'] != '') & (df['apellido1'] != '') &
+               (df['agencia'] != '') & (df['empresa'] != ''))
+    return df[validos], int((~validos).sum())
+
+def importar_asociados(conn, bloques, progreso=None):
+    """Insertar o actualizar (por cédula) los asociados de un archivo en una transacción"""
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        total_antes = cursor.execute('SELECT COALESCE(SUM(total), 0) FROM resumen_entregas').fetchone()[0]
+        procesados = rechazados = modificados = 0
+
+        # Toda la importación comparte una versión nueva
+        cursor.execute('UPDATE sincronizacion SET version = version + 1')
+        version = cursor.execute('SELECT version FROM sincronizacion').fetchone()[0]
+        masiva = False
+
+        for bloque, avance in bloques:
+            # validar_bloque deja OBSERVACIONES en None si el archivo no trae la columna
+            sql = SQL_UPSERT_ASOCIADO if bloque['OBSERVACIONES'].notna().any() else SQL_UPSERT_SIN_OBSERVACIONES
+            filas, rechazados_bloque = preparar_bloque(bloque)
+            rechazados += rechazados_bloque
+
+            if not masiva and len(filas) >= UMBRAL_IMPORTACION_MASIVA:
+                # Carga grande: suspender los triggers dentro de la misma transacción
+                masiva = True
+                for nombre in TRIGGERS:
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {nombre}')
+
+            # zip sobre listas es mucho más rápido que itertuples con columnas de texto
+            cursor.executemany(sql,
+                               zip(*(filas[col].tolist() for col in filas.columns), repeat(version)))
+            modificados += max(cursor.rowcount, 0)
+            procesados += len(filas)
+            if progreso:
+                progreso(avance)
+
+        if masiva:
+            cursor.execute('DELETE FROM resumen_entregas')
+            cursor.execute(SQL_RECALCULAR_RESUMEN)
+            for sql in TRIGGERS.values():
+                cursor.execute(sql)
+
+        # Estadísticas para el planificador: sin ellas un filtro por estado usa
+        # el índice (estado, agencia) y ordena la mitad de la tabla en cada página
+        cursor.execute('ANALYZE asociados')
+
+        total_despues = cursor.execute('SELECT COALESCE(SUM(total), 0) FROM resumen_entregas').fetchone()[0]
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    insertados = total_despues - total_antes
+    return {
+        'insertados': insertados,
+        'actualizados': modificados - insertados,
+        'sin_cambios': procesados - modificados,
+        'rechazados': rechazados,
+    }
@@ -0,0 +1,248 @@
+import json
+import os
+import threading
+import time
+
+import pandas as pd
+
+from importacion import COLUMNA_NOMBRE, agregar_categorias, nombres_completos, tipos_compactos
+
+# Archivos de la sesión, junto al archivo de asociados cargado
+EXTENSION_BITACORA = '.bitacora'
+EXTENSION_INSTANTANEA = '.instantanea.arrow'
+
+# Último archivo con sesión abierta, para ofrecer recuperarla al iniciar
+ARCHIVO_SESION = os.path.join(os.path.expanduser('~'), '.entregas_cooperenka.json')
+
+# Las escrituras de este intervalo (s) se vuelven durables con un solo fsync
+INTERVALO_FSYNC = 0.05
+
+# Eventos tras los que se escribe una instantánea nueva y se recorta la bitácora
+EVENTOS_POR_INSTANTANEA = 5000
+
+
+def rutas_sesion(archivo):
+    return archivo + EXTENSION_BITACORA, archivo + EXTENSION_INSTANTANEA
+
+
+def existe_sesion(archivo):
+    return bool(archivo) and os.path.exists(rutas_sesion(archivo)[1])
+
+
+def ultima_sesion():
+    """Archivo de la última sesión registrada, si todavía se puede recuperar"""
+    try:
+        with open(ARCHIVO_SESION, encoding='utf-8') as f:
+            archivo = json.load(f).get('archivo')
+    except (OSError, ValueError):
+        return None
+    return archivo if existe_sesion(archivo) else None
+
+
+def guardar_sesion(archivo):
+    try:
+        with open(ARCHIVO_SESION, 'w', encoding='utf-8') as f:
+            json.dump({'archivo': archivo}, f, ensure_ascii=False)
+    except OSError:
+        pass  # Sin el puntero solo se pierde la recuperación automática
+
+
+def eliminar_sesion(archivo):
+    for ruta in rutas_sesion(archivo):
+        if os.path.exists(ruta):
+            os.remove(ruta)
+
+
+def escribir_instantanea(df, ruta, secuencia):
+    """Guardar los datos en formato Arrow (conserva índice y categorías) de forma atómica"""
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    tabla = pa.Table.from_pandas(df)
+    tabla = tabla.replace_schema_metadata({**tabla.schema.metadata, b'secuencia': str(secuencia).encode()})
+    temporal = ruta + '.tmp'
+    with open(temporal, 'wb') as f:
+        feather.write_feather(tabla, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temporal, ruta)
+
+
+def leer_instantanea(ruta):
+    """Devuelve (datos, número del último evento incluido)"""
+    import pyarrow.feather as feather
+
+    tabla = feather.read_table(ruta)
+    # to_pandas comparte la memoria de Arrow y deja de solo lectura los códigos de
+    # las categorías: la copia permite registrar entregas sobre los datos recuperados
+    return tabla.to_pandas().copy(), int(tabla.schema.metadata.get(b'secuencia', b'0'))
+
+
+def leer_eventos(ruta, desde=0):
+    """Eventos de la bitácora posteriores a `desde`
+
+    Una última línea incompleta (cierre abrupto a mitad de escritura) se ignora.
+    """
+    if not os.path.exists(ruta):
+        return
+    with open(ruta, encoding='utf-8') as f:
+        for linea in f:
+            try:
+                evento = json.loads(linea)
+            except ValueError:
+                break
+            if evento['n'] > desde:
+                yield evento
+
+
+def asignar_valores(df, index, valores):
+    for campo, valor in valores.items():
+        agregar_categorias(df, campo, [valor])
+        df.loc[index, campo] = valor
+
+
+def aplicar_evento(df, evento):
+    """Reproducir un evento sobre los datos; devuelve los datos y las filas tocadas"""
+    if evento['tipo'] in ('entrega', 'edicion'):
+        if evento['index'] not in df.index:
+            return df, []
+        asignar_valores(df, evento['index'], evento['valores'])
+        return df, [evento['index']]
+
+    # Importación combinada: bajas, cambios y altas del archivo
+    valores = evento['valores']
+    df = df.drop(index=valores['eliminados'])
+    cambiados = [int(index) for index in valores['cambiados']]
+    for index, fila in zip(cambiados, valores['cambiados'].values()):
+        asignar_valores(df, index, fila)
+    if valores['nuevos']:
+        nuevos = pd.DataFrame.from_dict(valores['nuevos'], orient='index')
+        nuevos.index = nuevos.index.astype(int)
+        df = tipos_compactos(pd.concat([df, nuevos]))
+    return df, cambiados + [int(index) for index in valores['nuevos']]
+
+
+def recuperar(archivo):
+    """Reconstruir los datos de la sesión: instantánea más los eventos posteriores
+
+    Devuelve (datos, último número de evento, eventos reproducidos).
+    """
+    ruta_bitacora, ruta_instantanea = rutas_sesion(archivo)
+    df, secuencia = leer_instantanea(ruta_instantanea)
+    tocadas = set()
+    reproducidos = 0
+    for evento in leer_eventos(ruta_bitacora, secuencia):
+        df, filas = aplicar_evento(df, evento)
+        tocadas.update(filas)
+        secuencia = evento['n']
+        reproducidos += 1
+
+    # El nombre normalizado se recalcula una vez para todas las filas editadas
+    tocadas = [index for index in tocadas if index in df.index]
+    if tocadas:
+        df.loc[tocadas, COLUMNA_NOMBRE] = nombres_completos(df.loc[tocadas]).to_numpy()
+    return df, secuencia, reproducidos
+
+
+class Bitacora:
+    """Bitácora de eventos de solo anexado con fsync agrupado
+
+    `registrar` solo escribe la línea en el archivo (queda en el sistema
+    operativo aunque la aplicación se cierre de golpe); un hilo hace fsync una
+    vez por INTERVALO_FSYNC para todas las escrituras acumuladas. El mismo hilo
+    escribe las instantáneas y recorta de la bitácora los eventos ya incluidos.
+    """
+
+    def __init__(self, archivo, secuencia=0, datos=None):
+        """Continuar la sesión de `archivo` desde el evento `secuencia`, o empezar
+        una nueva a partir de `datos` (recién importados) descartando la anterior
+        """
+        self.archivo = archivo
+        self.ruta, self.ruta_instantanea = rutas_sesion(archivo)
+        self.secuencia = secuencia
+        self.eventos_sin_instantanea = 0
+        if datos is not None:
+            eliminar_sesion(archivo)
+            escribir_instantanea(datos, self.ruta_instantanea, secuencia)
+        self.fd = os.open(self.ruta, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+        self.condicion = threading.Condition()
+        self.pendiente = False
+        self.instantanea = None  # (datos, secuencia) por escribir
+        self.cerrada = False
+        self.hilo = threading.Thread(target=self.sincronizar, daemon=True)
+        self.hilo.start()
+        guardar_sesion(archivo)
+
+    def registrar(self, tipo, index=None, valores=None):
+        """Anexar un evento (entrega, edicion o importacion); devuelve su número"""
+        with self.condicion:
+            self.secuencia += 1
+            evento = {'n': self.secuencia, 'tipo': tipo, 'index': index, 'valores': valores,
+                      'fecha': time.strftime('%Y-%m-%d %H:%M:%S')}
+            os.write(self.fd, (json.dumps(evento, ensure_ascii=False) + '\n').encode('utf-8'))
+            self.pendiente = True
+            self.eventos_sin_instantanea += 1
+            self.condicion.notify()
+            return self.secuencia
+
+    def necesita_instantanea(self):
+        return self.eventos_sin_instantanea >= EVENTOS_POR_INSTANTANEA
+
+    def solicitar_instantanea(self, df):
+        """Escribir en segundo plano una instantánea de los datos actuales
+
+        La copia profunda se hace aquí, en el hilo de la interfaz, para que no
+        cambie mientras se siguen registrando entregas sobre `df`. Es barata con
+        texto Arrow (inmutable, se comparte) y categorías; con columnas object
+        copia cada celda.
+        """
+        with self.condicion:
+            self.instantanea = (df.copy(), self.secuencia)
+            self.eventos_sin_instantanea = 0
+            self.condicion.notify()
+
+    def sincronizar(self):
+        """Hilo de la bitácora: fsync agrupado, instantáneas y compactación"""
+        while True:
+            with self.condicion:
+                while not self.pendiente and self.instantanea is None and not self.cerrada:
+                    self.condicion.wait()
+                if self.cerrada and not self.pendiente and self.instantanea is None:
+                    return
+                instantanea, self.instantanea = self.instantanea, None
+
+            if instantanea is None:
+                # Esperar a que lleguen más escrituras para cubrirlas con el mismo fsync
+                time.sleep(INTERVALO_FSYNC)
+            with self.condicion:
+                self.pendiente = False
+            os.fsync(self.fd)
+
+            if instantanea is not None:
+                try:
+                    escribir_instantanea(instantanea[0], self.ruta_instantanea, instantanea[1])
+                    self.compactar(instantanea[1])
+                except OSError:
+                    pass  # La bitácora completa sigue siendo válida; se reintenta en la próxima
+
+    def compactar(self, secuencia):
+        """Reescribir la bitácora solo con los eventos posteriores a la instantánea"""
+        with self.condicion:
+            temporal = self.ruta + '.tmp'
+            with open(temporal, 'w', encoding='utf-8') as f:
+                for evento in leer_eventos(self.ruta, secuencia):
+                    f.write(json.dumps(evento, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temporal, self.ruta)
+            os.close(self.fd)
+            self.fd = os.open(self.ruta, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+
+    def cerrar(self):
+        """Esperar el último fsync y las instantáneas pendientes"""
+        with self.condicion:
+            self.cerrada = True
+            self.condicion.notify()
+        self.hilo.join()
+        os.close(self.fd)
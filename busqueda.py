@@ -0,0 +1,207 @@
+import threading
+
+import numpy as np
+
+import base_datos
+from importacion import COLUMNA_NOMBRE, normalizar_nombre, normalizar_nombres
+
+# Resultados devueltos por búsqueda
+LIMITE_RESULTADOS = base_datos.LIMITE_BUSQUEDA
+
+# Fracción mínima de los trigramas del término que debe tener un nombre
+UMBRAL_SIMILITUD = 0.5
+
+# Con más filas modificadas desde la construcción conviene reconstruir el índice
+MAX_MODIFICADOS = 5000
+
+
+def rellenar(nombre):
+    """Espacios de relleno para que el inicio y el fin de cada palabra formen trigramas"""
+    return '  ' + nombre.replace(' ', '  ') + ' '
+
+
+def trigramas(nombre):
+    """Códigos enteros de los trigramas de un nombre ya normalizado"""
+    datos = rellenar(nombre).encode('ascii', 'replace')
+    return {datos[i] << 16 | datos[i + 1] << 8 | datos[i + 2] for i in range(len(datos) - 2)}
+
+
+def primeros(ordenado):
+    """Máscara de la primera aparición de cada valor en un arreglo ordenado"""
+    mascara = np.ones(len(ordenado), dtype=bool)
+    mascara[1:] = ordenado[1:] != ordenado[:-1]
+    return mascara
+
+
+class IndiceNombres:
+    """Índice invertido de trigramas sobre nombres normalizados (mayúsculas, sin tildes)
+
+    Tolera tildes, errores de digitación y cambios de orden: "Hernandes Juan"
+    encuentra a "JUAN HERNÁNDEZ". Las listas de cada trigrama son arreglos numpy;
+    una consulta suma coincidencias por fila con np.bincount. Las filas editadas
+    o agregadas después de construirlo se guardan aparte y se comparan directo.
+    """
+
+    def __init__(self, claves, nombres):
+        """`claves` identifica cada fila (id o índice); `nombres` ya normalizados"""
+        self.claves = np.asarray(claves)
+        self.nombres = list(nombres)
+        self.posiciones = {clave: posicion for posicion, clave in enumerate(self.claves.tolist())}
+        self.modificados = {}  # clave -> trigramas del nombre actual
+        self.obsoletas = np.zeros(len(self.claves), dtype=bool)  # versión indexada ya no vale
+
+        # Todos los nombres en un solo búfer: el trigrama que empieza en cada byte es
+        # válido si sus tres bytes pertenecen a la misma fila
+        rellenos = [rellenar(nombre) for nombre in self.nombres]
+        longitudes = np.fromiter(map(len, rellenos), dtype=np.int64, count=len(rellenos))
+        datos = np.frombuffer('\n'.join(rellenos).encode('ascii', 'replace'), dtype=np.uint8).astype(np.uint32)
+        fila_byte = np.repeat(np.arange(len(rellenos)), longitudes + 1)[:len(datos)]
+
+        codigos = datos[:-2] << 16 | datos[1:-1] << 8 | datos[2:]
+        validos = (fila_byte[:-2] == fila_byte[2:]) & (datos[:-2] != 10) & (datos[1:-1] != 10) & (datos[2:] != 10)
+
+        # Pares (trigrama, fila) en una clave de 64 bits: un solo ordenamiento deja
+        # las listas de cada trigrama contiguas y sin repetidos
+        pares = np.sort(codigos[validos].astype(np.uint64) << 32 | fila_byte[:-2][validos].astype(np.uint64))
+        pares = pares[primeros(pares)]
+        codigos = (pares >> 32).astype(np.uint32)
+        self.filas = (pares & 0xFFFFFFFF).astype(np.int32)
+        self.cantidad = np.bincount(self.filas, minlength=len(rellenos))
+
+        cambios = np.flatnonzero(primeros(codigos))
+        self.codigos = codigos[cambios]
+        self.inicios = np.append(cambios, len(self.filas))
+
+    @classmethod
+    def desde_nombres(cls, claves, nombres):
+        """Construir el índice a partir de una Serie de nombres sin normalizar"""
+        return cls(claves, normalizar_nombres(nombres).tolist())
+
+    @classmethod
+    def desde_asociados(cls, df):
+        """Índice de los asociados en memoria, por índice del DataFrame (ver compactar_asociados)"""
+        if df.empty:
+            return cls([], [])
+        return cls(df.index, df[COLUMNA_NOMBRE].tolist())
+
+    def actualizar(self, clave, nombre):
+        """Registrar el nombre (ya normalizado) de una fila editada o agregada
+
+        Si el nombre no cambió (p. ej. tras una entrega) no hay nada que hacer.
+        """
+        posicion = self.posiciones.get(clave)
+        if posicion is not None and not self.obsoletas[posicion] and self.nombres[posicion] == nombre:
+            return
+        self.modificados[clave] = trigramas(nombre)
+        self.marcar_obsoleta(clave)
+
+    def eliminar(self, clave):
+        self.modificados.pop(clave, None)
+        self.marcar_obsoleta(clave)
+
+    def marcar_obsoleta(self, clave):
+        posicion = self.posiciones.get(clave)
+        if posicion is not None:
+            self.obsoletas[posicion] = True
+
+    def desactualizado(self):
+        return len(self.modificados) > MAX_MODIFICADOS
+
+    def buscar(self, termino, limite=LIMITE_RESULTADOS, umbral=UMBRAL_SIMILITUD):
+        """Claves de los nombres más parecidos al término, de mayor a menor similitud
+
+        Devuelve una lista de (clave, similitud 0..1): la fracción de trigramas del
+        término presentes en el nombre; a igual fracción gana el nombre más corto.
+        """
+        consulta = trigramas(normalizar_nombre(termino))
+        if not consulta:
+            return []
+        minimo = max(1, int(np.ceil(umbral * len(consulta))))
+
+        # Coincidencias por fila: concatenar las listas de los trigramas del término
+        codigos = np.fromiter(consulta, dtype=np.uint32, count=len(consulta))
+        ubicaciones = np.searchsorted(self.codigos, codigos)
+        presentes = ubicaciones < len(self.codigos)
+        presentes[presentes] = self.codigos[ubicaciones[presentes]] == codigos[presentes]
+        listas = [self.filas[self.inicios[u]:self.inicios[u + 1]] for u in ubicaciones[presentes]]
+        if listas:
+            comunes = np.bincount(np.concatenate(listas), minlength=len(self.claves))
+            comunes[self.obsoletas] = 0
+        else:
+            comunes = np.zeros(len(self.claves), dtype=np.int64)
+
+        candidatos = np.flatnonzero(comunes >= minimo)
+        comunes = comunes[candidatos]
+        similitud = comunes / len(consulta)
+        jaccard = comunes / (len(consulta) + self.cantidad[candidatos] - comunes)
+        claves = self.claves[candidatos]
+
+        # Filas editadas o agregadas después de construir el índice
+        if self.modificados:
+            extra = [(clave, len(consulta & propios), len(propios)) for clave, propios in list(self.modificados.items())]
+            extra = [(clave, n, total) for clave, n, total in extra if n >= minimo]
+            if extra:
+                claves = np.concatenate([claves, np.array([e[0] for e in extra], dtype=claves.dtype)])
+                n = np.array([e[1] for e in extra])
+                total = np.array([e[2] for e in extra])
+                similitud = np.concatenate([similitud, n / len(consulta)])
+                jaccard = np.concatenate([jaccard, n / (len(consulta) + total - n)])
+
+        # La similitud va de 1/len(consulta) en 1/len(consulta): Jaccard solo desempata
+        puntaje = similitud + jaccard * 1e-3
+        if len(puntaje) > limite:
+            mejores = np.argpartition(-puntaje, limite)[:limite]
+        else:
+            mejores = np.arange(len(puntaje))
+        mejores = mejores[np.argsort(-puntaje[mejores], kind='stable')]
+        return list(zip(claves[mejores].tolist(), similitud[mejores].tolist()))
+
+
+class BuscadorAsociados:
+    """Índice de nombres de la base de datos, al día con su versión de datos
+
+    Se construye una vez y después solo aplica los cambios desde la última
+    versión vista (base_datos.cambios_desde). Es seguro entre hilos: lo
+    comparten las sesiones de Streamlit y los hilos del servidor.
+    """
+
+    def __init__(self, lock=None):
+        """`lock` permite usar un candado nativo bajo eventlet (ver servidor.py)"""
+        self.indice = None
+        self.version = None
+        self.lock = lock or threading.Lock()
+
+    def sincronizar(self, conn):
+        with self.lock:
+            if self.indice is not None and base_datos.get_version(conn) != self.version:
+                self.aplicar_cambios(base_datos.cambios_desde(conn, self.version))
+            if self.indice is None or self.indice.desactualizado():
+                self.version, nombres = base_datos.get_nombres(conn)
+                self.indice = IndiceNombres.desde_nombres(nombres['id'], nombres['nombre'])
+            return self.indice
+
+    def aplicar_cambios(self, cambios):
+        self.version = cambios['version']
+        if len(cambios['asociados']) > MAX_MODIFICADOS:
+            # Una importación grande: sale más barato reconstruir el índice
+            self.indice = None
+            return
+        for registro in cambios['asociados']:
+            self.indice.actualizar(registro['id'], normalizar_nombre(base_datos.nombre_completo(registro)))
+        for asociado_id in cambios['eliminados']:
+            self.indice.eliminar(asociado_id)
+
+    def buscar_ids(self, conn, termino, limite=LIMITE_RESULTADOS):
+        return [clave for clave, _ in self.sincronizar(conn).buscar(termino, limite)]
+
+    def buscar(self, conn, termino, limite=LIMITE_RESULTADOS):
+        """Búsqueda de Streamlit: cédula por igualdad o prefijo, nombre aproximado"""
+        if base_datos.es_cedula(termino):
+            return base_datos.buscar_cedula(conn, termino, limite)
+        return base_datos.buscar_por_ids(conn, self.buscar_ids(conn, termino, limite))
+
+    def buscar_registros(self, conn, termino, limite=LIMITE_RESULTADOS):
+        """Misma búsqueda, como lista de diccionarios para la API"""
+        if base_datos.es_cedula(termino):
+            return base_datos.registros_cedula(conn, termino, limite)
+        return base_datos.registros_por_ids(conn, self.buscar_ids(conn, termino, limite))
@@ -0,0 +1,175 @@
+import os
+
+import pandas as pd
+
+from base_datos import COLUMNAS_ARCHIVO, contar_asociados, filtros_lista
+
+# Columnas exportables (nombres del archivo de asociados) -> columnas de la tabla
+COLUMNAS_EXPORTACION = {**COLUMNAS_ARCHIVO, 'USUARIO_ENTREGA': 'usuario_entrega'}
+
+FORMATOS = ('csv', 'xlsx', 'parquet')
+
+# Filas por lote: es lo único que se tiene en memoria durante la exportación
+TAMANO_LOTE = 20000
+
+# Filas de datos por hoja de Excel (el límite del formato es 1.048.576 con encabezado)
+FILAS_POR_HOJA = 1048575
+
+
+def formato_archivo(destino, formato=None):
+    """Formato de exportación indicado o deducido de la extensión del destino"""
+    formato = (formato or os.path.splitext(str(destino))[1].lstrip('.')).lower()
+    if formato not in FORMATOS:
+        raise ValueError(f"Formato no soportado: {formato or 'sin extensión'} (use {', '.join(FORMATOS)})")
+    return formato
+
+
+def validar_columnas(columnas):
+    columnas = list(columnas or COLUMNAS_EXPORTACION)
+    desconocidas = [columna for columna in columnas if columna not in COLUMNAS_EXPORTACION]
+    if desconocidas:
+        raise ValueError(f"Columnas desconocidas: {', '.join(desconocidas)}")
+    return columnas
+
+
+def lotes_base_datos(conn, columnas=None, estado=None, agencia=None, observaciones=None,
+                     tamano_lote=TAMANO_LOTE):
+    """Leer de la tabla asociados en lotes de texto: genera DataFrames de `tamano_lote` filas
+
+    Un solo SELECT recorrido con fetchmany: todos los lotes salen de la misma
+    lectura aunque otras estaciones sigan registrando entregas.
+    """
+    columnas = validar_columnas(columnas)
+    condiciones, params = filtros_lista(estado, agencia, observaciones)
+    where = f"WHERE {' AND '.join(condiciones)}" if condiciones else ''
+    campos = ', '.join(f"COALESCE({COLUMNAS_EXPORTACION[columna]}, '')" for columna in columnas)
+    cursor = conn.execute(f'SELECT {campos} FROM asociados {where} ORDER BY apellido1, nombre1, id', params)
+    try:
+        while True:
+            filas = cursor.fetchmany(tamano_lote)
+            if not filas:
+                return
+            yield pd.DataFrame.from_records(filas, columns=columnas)
+    finally:
+        cursor.close()
+
+
+def mascara_filtros(df, estado=None, agencia=None, observaciones=None):
+    """Equivalente en pandas de base_datos.filtros_lista para los datos en memoria"""
+    mascara = pd.Series(True, index=df.index)
+    if estado:
+        mascara &= df['ESTADO'].fillna('PENDIENTE').replace('', 'PENDIENTE') == estado
+    if agencia:
+        mascara &= df['AGENCIA'] == agencia
+    if observaciones is not None and 'OBSERVACIONES' in df:
+        con_observaciones = df['OBSERVACIONES'].fillna('').astype(str).str.strip() != ''
+        mascara &= con_observaciones if observaciones else ~con_observaciones
+    return mascara
+
+
+def lotes_dataframe(df, columnas=None, estado=None, agencia=None, observaciones=None,
+                    tamano_lote=TAMANO_LOTE):
+    """Recorrer los datos en memoria en lotes filtrados, sin copiar el DataFrame completo"""
+    columnas = validar_columnas(columnas)
+    posiciones = mascara_filtros(df, estado, agencia, observaciones).to_numpy().nonzero()[0]
+    for inicio in range(0, len(posiciones), tamano_lote):
+        lote = df.iloc[posiciones[inicio:inicio + tamano_lote]].reindex(columns=columnas)
+        yield lote.fillna('').astype(str)
+
+
+def escribir_csv(lotes, destino):
+    with open(destino, 'w', newline='', encoding='utf-8-sig') as f:
+        encabezado = True
+        for lote in lotes:
+            lote.to_csv(f, index=False, header=encabezado)
+            encabezado = False
+            yield len(lote)
+
+
+def escribir_xlsx(lotes, destino, columnas):
+    from openpyxl import Workbook
+
+    # Modo write-only: cada fila se serializa al agregarla y no queda en memoria
+    libro = Workbook(write_only=True)
+    hoja, filas_hoja = None, FILAS_POR_HOJA
+    try:
+        for lote in lotes:
+            for fila in lote.itertuples(index=False, name=None):
+                if filas_hoja == FILAS_POR_HOJA:
+                    hoja = libro.create_sheet(f"Asociados {len(libro.worksheets) + 1}")
+                    hoja.append(columnas)
+                    filas_hoja = 0
+                hoja.append(fila)
+                filas_hoja += 1
+            yield len(lote)
+        if hoja is None:
+            libro.create_sheet("Asociados 1").append(columnas)
+    finally:
+        libro.save(destino)
+
+
+def escribir_parquet(lotes, destino, columnas):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    esquema = pa.schema([(columna, pa.string()) for columna in columnas])
+    with pq.ParquetWriter(destino, esquema) as escritor:
+        for lote in lotes:
+            # Cada lote se escribe como un grupo de filas del archivo
+            escritor.write_table(pa.Table.from_pandas(lote, schema=esquema, preserve_index=False))
+            yield len(lote)
+
+
+def exportar(lotes, destino, columnas=None, formato=None, total=None, progreso=None, cancelar=None):
+    """Escribir los lotes en `destino` como CSV, XLSX o Parquet; devuelve las filas escritas
+
+    `progreso(avance 0..1, filas)` se llama tras cada lote; si `cancelar` (un
+    threading.Event) se activa, la exportación se detiene y el archivo parcial
+    se elimina.
+    """
+    formato = formato_archivo(destino, formato)
+    columnas = validar_columnas(columnas)
+    if formato == 'csv':
+        escritor = escribir_csv(lotes, destino)
+    elif formato == 'xlsx':
+        escritor = escribir_xlsx(lotes, destino, columnas)
+    else:
+        escritor = escribir_parquet(lotes, destino, columnas)
+
+    filas = 0
+    try:
+        for escritas in escritor:
+            filas += escritas
+            if progreso:
+                progreso(min(1.0, filas / total) if total else 1.0, filas)
+            if cancelar is not None and cancelar.is_set():
+                break
+    except BaseException:
+        escritor.close()
+        if os.path.exists(destino):
+            os.remove(destino)
+        raise
+
+    # También si se canceló mientras se esperaba el siguiente lote y estos terminaron
+    if cancelar is not None and cancelar.is_set():
+        escritor.close()
+        if os.path.exists(destino):
+            os.remove(destino)
+        return None
+    return filas
+
+
+def exportar_base_datos(conn, destino, columnas=None, formato=None, estado=None, agencia=None,
+                        observaciones=None, progreso=None, cancelar=None):
+    """Exportar de SQLite los asociados que cumplen los filtros de la lista completa"""
+    total = contar_asociados(conn, estado, agencia, observaciones) if progreso else None
+    lotes = lotes_base_datos(conn, columnas, estado, agencia, observaciones)
+    return exportar(lotes, destino, columnas, formato, total, progreso, cancelar)
+
+
+def exportar_dataframe(df, destino, columnas=None, formato=None, estado=None, agencia=None,
+                       observaciones=None, progreso=None, cancelar=None):
+    """Exportar los asociados en memoria que cumplen los filtros"""
+    total = int(mascara_filtros(df, estado, agencia, observaciones).sum()) if progreso else None
+    lotes = lotes_dataframe(df, columnas, estado, agencia, observaciones)
+    return exportar(lotes, destino, columnas, formato, total, progreso, cancelar)
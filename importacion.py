@@ -0,0 +1,253 @@
+import os
+import re
+import unicodedata
+
+import pandas as pd
+
+# Columnas que debe traer todo archivo de asociados
+COLUMNAS_REQUERIDAS = ['CEDULA', 'APELLIDO 1', 'APELLIDO 2',
+                       'NOMBRE 1', 'NOMBRE 2', 'AGENCIA', 'EMPRESA']
+
+# Columnas opcionales y su valor por defecto. Sin columna OBSERVACIONES el valor
+# queda vacío (None) para no borrar al reimportar las observaciones ya guardadas
+COLUMNAS_OPCIONALES = {'OBSERVACIONES': None, 'ESTADO': 'PENDIENTE', 'FECHA_ENTREGA': ''}
+
+# Todo se lee como texto: sin inferencia de tipos y sin perder ceros a la izquierda
+TIPOS_COLUMNAS = {columna: str for columna in COLUMNAS_REQUERIDAS + list(COLUMNAS_OPCIONALES)}
+
+# Filas por bloque durante la lectura
+TAMANO_BLOQUE = 20000
+
+# Texto en búferes Arrow contiguos en lugar de un objeto Python por celda, con
+# NaN como vacío igual que object (es el tipo str por defecto desde pandas 3)
+try:
+    TIPO_TEXTO = pd.StringDtype('pyarrow', na_value=float('nan'))
+except (ImportError, TypeError):
+    TIPO_TEXTO = object
+
+
+# Columnas de datos del asociado; ESTADO y FECHA_ENTREGA son estado de entrega
+COLUMNAS_DATOS = COLUMNAS_REQUERIDAS + ['OBSERVACIONES']
+
+# Columnas con pocos valores distintos: en memoria se guardan como categorías
+COLUMNAS_CATEGORICAS = ['AGENCIA', 'EMPRESA', 'ESTADO']
+ESTADOS = ['PENDIENTE', 'ENTREGADO']
+
+# Nombre completo normalizado (mayúsculas, sin tildes) precalculado para búsquedas
+COLUMNA_NOMBRE = 'NOMBRE_COMPLETO'
+
+
+class ErrorFormato(ValueError):
+    """El archivo no trae las columnas requeridas"""
+
+    def __init__(self, columnas_faltantes):
+        self.columnas_faltantes = columnas_faltantes
+        super().__init__(f"El archivo no contiene las columnas requeridas:\n{', '.join(columnas_faltantes)}")
+
+
+def normalizar_cedula(valor):
+    """Convertir una cédula leída del archivo o del escáner en clave de búsqueda"""
+    cedula = str(valor).strip()
+    # Excel entrega las cédulas numéricas como float (12345678.0)
+    if cedula.endswith('.0') and cedula[:-2].isdigit():
+        cedula = cedula[:-2]
+    return cedula
+
+
+def normalizar_nombre(texto):
+    """Mayúsculas, sin tildes y con espacios simples: forma comparable de un nombre"""
+    texto = unicodedata.normalize('NFKD', str(texto).upper())
+    texto = ''.join(caracter for caracter in texto if not unicodedata.combining(caracter))
+    return re.sub(r'\s+', ' ', texto).strip()
+
+
+def normalizar_nombres(serie):
+    """Versión vectorizada de normalizar_nombre"""
+    return (serie.fillna('').astype(str).str.upper().str.normalize('NFKD')
+            .str.replace('[\u0300-\u036f]', '', regex=True)
+            .str.replace(r'\s+', ' ', regex=True).str.strip())
+
+
+def nombres_completos(df):
+    """Nombre completo normalizado de cada fila de asociados"""
+    nombre = df['NOMBRE 1'].fillna('').astype(str)
+    for columna in ('NOMBRE 2', 'APELLIDO 1', 'APELLIDO 2'):
+        nombre = nombre + ' ' + df[columna].fillna('').astype(str)
+    return normalizar_nombres(nombre)
+
+
+def tipos_compactos(df):
+    """Categorías para las columnas repetitivas y texto contiguo para el resto
+
+    Idempotente y barato: se vuelve a aplicar tras combinar datos de otro
+    archivo, que trae sus propias categorías.
+    """
+    columnas = {columna: df[columna].fillna('').astype(TIPO_TEXTO)
+                for columna in df.columns if columna not in COLUMNAS_CATEGORICAS}
+    for columna in COLUMNAS_CATEGORICAS:
+        valores = df[columna].fillna('').astype(str)
+        if columna == 'ESTADO':
+            valores = valores.replace('', 'PENDIENTE')
+        categorias = set(valores.unique()) | (set(ESTADOS) if columna == 'ESTADO' else set())
+        columnas[columna] = pd.Categorical(valores, categories=sorted(categorias))
+    return df.assign(**columnas)
+
+
+def compactar_asociados(df):
+    """Representación en memoria de los asociados cargados: tipos compactos y nombre normalizado"""
+    if df.empty:
+        return df
+    df = tipos_compactos(df)
+    df[COLUMNA_NOMBRE] = nombres_completos(df)
+    return df
+
+
+def agregar_categorias(df, columna, valores):
+    """Admitir en una columna categórica valores nuevos antes de asignarlos"""
+    if not isinstance(df[columna].dtype, pd.CategoricalDtype):
+        return
+    nuevas = set(map(str, valores)) - set(df[columna].cat.categories)
+    if nuevas:
+        df[columna] = df[columna].cat.add_categories(sorted(nuevas))
+
+
+def normalizar_cedulas(serie):
+    """Versión vectorizada de normalizar_cedula para una columna completa"""
+    return serie.astype(str).str.strip().str.replace(r'^(\d+)\.0$', r'\1', regex=True)
+
+
+def validar_bloque(bloque):
+    """Verificar columnas requeridas y completar las opcionales de un bloque"""
+    columnas_faltantes = [col for col in COLUMNAS_REQUERIDAS if col not in bloque.columns]
+    if columnas_faltantes:
+        raise ErrorFormato(columnas_faltantes)
+
+    for columna, valor in COLUMNAS_OPCIONALES.items():
+        if columna not in bloque.columns:
+            bloque[columna] = valor
+    return bloque
+
+
+def texto_celda(valor):
+    """Convertir una celda de Excel en texto (12345678.0 -> '12345678')"""
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        return str(int(valor))
+    return str(valor).strip()
+
+
+def leer_csv_por_bloques(archivo, tamano_bloque):
+    # Acepta una ruta o un archivo ya abierto (p. ej. una subida de Streamlit)
+    f = open(archivo, 'rb') if isinstance(archivo, str) else archivo
+    try:
+        tamano = f.seek(0, os.SEEK_END) or 1
+        f.seek(0)
+        for bloque in pd.read_csv(f, dtype=TIPOS_COLUMNAS, keep_default_na=False,
+                                  chunksize=tamano_bloque, encoding='utf-8-sig'):
+            yield bloque, min(1.0, f.tell() / tamano)
+    finally:
+        if isinstance(archivo, str):
+            f.close()
+
+
+def leer_excel_por_bloques(archivo, tamano_bloque, nombre):
+    if nombre.lower().endswith('.xls'):
+        # El formato antiguo no admite lectura en streaming: se lee completo como texto
+        df = pd.read_excel(archivo, dtype=str, keep_default_na=False)
+        for inicio in range(0, max(len(df), 1), tamano_bloque):
+            yield df.iloc[inicio:inicio + tamano_bloque], min(1.0, (inicio + tamano_bloque) / max(len(df), 1))
+        return
+
+    from openpyxl import load_workbook
+
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        hoja = libro.worksheets[0]
+        total_filas = hoja.max_row or 0
+        filas = hoja.iter_rows(values_only=True)
+        encabezado = [texto_celda(valor) for valor in next(filas, ())]
+
+        leidas = 0
+        pendientes = []
+        for fila in filas:
+            if not any(valor is not None for valor in fila):
+                continue
+            pendientes.append([texto_celda(valor) for valor in fila])
+            if len(pendientes) == tamano_bloque:
+                leidas += len(pendientes)
+                yield pd.DataFrame(pendientes, columns=encabezado), min(1.0, leidas / max(total_filas, 1))
+                pendientes = []
+
+        if pendientes or leidas == 0:
+            yield pd.DataFrame(pendientes, columns=encabezado), 1.0
+    finally:
+        libro.close()
+
+
+def leer_por_bloques(archivo, tamano_bloque=TAMANO_BLOQUE, nombre=None):
+    """Leer un archivo CSV o Excel en bloques validados: genera (bloque, progreso 0..1)
+
+    `archivo` puede ser una ruta o un objeto tipo archivo; en ese caso `nombre`
+    indica la extensión.
+    """
+    nombre = nombre or archivo
+    if nombre.lower().endswith('.csv'):
+        lector = leer_csv_por_bloques(archivo, tamano_bloque)
+    else:
+        lector = leer_excel_por_bloques(archivo, tamano_bloque, nombre)
+
+    for bloque, progreso in lector:
+        yield validar_bloque(bloque), progreso
+
+
+def hash_filas(df, columnas=COLUMNAS_DATOS):
+    """Huella de 64 bits de los datos de cada fila (sin el estado de entrega)"""
+    if df.empty:
+        return pd.Series(dtype='uint64')
+    return pd.util.hash_pandas_object(df[columnas].fillna('').astype(str), index=False)
+
+
+def columnas_combinables(con_observaciones):
+    """Columnas de datos que un archivo reimportado puede sobrescribir
+
+    Un archivo sin columna OBSERVACIONES no borra las observaciones guardadas.
+    """
+    if con_observaciones:
+        return COLUMNAS_DATOS
+    return [columna for columna in COLUMNAS_DATOS if columna != 'OBSERVACIONES']
+
+
+def calcular_diferencias(actual, hashes_actual, nuevo, columnas=COLUMNAS_DATOS):
+    """Comparar por CEDULA los datos cargados con un archivo nuevo
+
+    Devuelve (nuevos, cambiados, indices_cambiados, indices_eliminados): las filas
+    del archivo que no existían, las que cambiaron junto con el índice de la fila
+    actual a la que corresponden, y los índices actuales ausentes del archivo.
+    Solo se comparan `columnas`; `hashes_actual` son las huellas de todas las
+    COLUMNAS_DATOS y con menos columnas se recalculan para las filas comunes.
+    """
+    cedulas_actual = normalizar_cedulas(actual['CEDULA']).to_numpy(dtype=object)
+    indice_actual = pd.Series(actual.index, index=cedulas_actual)
+    indice_actual = indice_actual[~indice_actual.index.duplicated()]
+
+    nuevo = nuevo.assign(CEDULA=normalizar_cedulas(nuevo['CEDULA']))
+    nuevo = nuevo.drop_duplicates('CEDULA')
+    cedulas_nuevo = nuevo['CEDULA'].to_numpy(dtype=object)
+
+    # Índice actual correspondiente a cada fila del archivo (NaN si es nueva)
+    correspondencia = indice_actual.reindex(cedulas_nuevo).to_numpy()
+    existe = ~pd.isna(correspondencia)
+
+    # Filas comunes: solo las que tienen una huella distinta cambiaron
+    comunes = nuevo[existe]
+    indices_comunes = correspondencia[existe].astype(actual.index.dtype)
+    if list(columnas) == COLUMNAS_DATOS:
+        hashes_comunes = hashes_actual.reindex(indices_comunes).to_numpy()
+    else:
+        hashes_comunes = hash_filas(actual.loc[indices_comunes], columnas).to_numpy()
+    distintos = hash_filas(comunes, columnas).to_numpy() != hashes_comunes
+
+    eliminadas = indice_actual.index.difference(cedulas_nuevo)
+    return (nuevo[~existe], comunes[distintos], indices_comunes[distintos],
+            indice_actual.reindex(eliminadas).tolist())
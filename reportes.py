@@ -0,0 +1,345 @@
+import io
+import os
+import re
+import sys
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import pandas as pd
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.utils import simpleSplit
+from reportlab.pdfgen import canvas
+from reportlab.platypus import SimpleDocTemplate, LongTable, Table, TableStyle, Paragraph, Spacer
+
+# Columnas del DataFrame de asociados que usa el reporte
+COLUMNAS_REPORTE = ['CEDULA', 'NOMBRE 1', 'NOMBRE 2', 'APELLIDO 1', 'APELLIDO 2',
+                    'AGENCIA', 'EMPRESA', 'ESTADO', 'OBSERVACIONES']
+
+ENCABEZADO = ['Cédula', 'Nombre Completo', 'Agencia', 'Empresa', 'Estado', 'Observaciones']
+
+# Filas por tabla: cada bloque ocupa aproximadamente una página A4 con letra 8.
+# reportlab calcula el tamaño de cada tabla por separado, así que muchos bloques
+# pequeños son mucho más rápidos y livianos que una sola tabla con todo.
+FILAS_POR_TABLA = 40
+
+ESTILO_ESTADISTICAS = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 14),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black)
+])
+
+ESTILO_DATOS = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+])
+
+
+def filas_reporte(df):
+    """Filas de texto del reporte: cédula, nombre completo, agencia, empresa, estado y observaciones"""
+    texto = df.reindex(columns=COLUMNAS_REPORTE).fillna('').astype(str)
+    nombre = (texto['NOMBRE 1'] + ' ' + texto['NOMBRE 2'] + ' ' +
+              texto['APELLIDO 1'] + ' ' + texto['APELLIDO 2']).str.split().str.join(' ')
+    estado = texto['ESTADO'].where(texto['ESTADO'] != '', 'PENDIENTE')
+    observaciones = texto['OBSERVACIONES'].where(texto['OBSERVACIONES'].str.len() <= 30,
+                                                 texto['OBSERVACIONES'].str[:30] + '...')
+    return list(zip(texto['CEDULA'].tolist(), nombre.tolist(), texto['AGENCIA'].tolist(),
+                    texto['EMPRESA'].tolist(), estado.tolist(), observaciones.tolist()))
+
+
+def estadisticas_filas(filas):
+    """(total, entregados, pendientes, novedades) de un conjunto de filas del reporte"""
+    entregados = sum(1 for fila in filas if fila[4] == 'ENTREGADO')
+    novedades = sum(1 for fila in filas if fila[5])
+    return len(filas), entregados, len(filas) - entregados, novedades
+
+
+def contenido_reporte(filas, subtitulo):
+    """Flowables del reporte: encabezado, estadísticas y la tabla en bloques por página"""
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=16,
+        spaceAfter=30,
+        alignment=1  # Centrado
+    )
+
+    total, entregados, pendientes, novedades = estadisticas_filas(filas)
+    stats_table = Table([
+        ['Estadística', 'Cantidad'],
+        ['Total Asociados', total],
+        ['Entregados', entregados],
+        ['Pendientes', pendientes],
+        ['Con Novedades', novedades]
+    ])
+    stats_table.setStyle(ESTILO_ESTADISTICAS)
+
+    story = [
+        Paragraph("COOPERENKA", title_style),
+        Paragraph(subtitulo, title_style),
+        Paragraph(f"Fecha: {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']),
+        Spacer(1, 20),
+        stats_table,
+        Spacer(1, 30),
+    ]
+
+    # LongTable por bloques con el encabezado repetido si un bloque cruza de página
+    for inicio in range(0, len(filas), FILAS_POR_TABLA):
+        tabla = LongTable([ENCABEZADO] + filas[inicio:inicio + FILAS_POR_TABLA], repeatRows=1)
+        tabla.setStyle(ESTILO_DATOS)
+        story.append(tabla)
+    return story
+
+
+def pico_memoria():
+    """Pico de memoria residente del proceso actual en bytes (None donde no se puede medir)"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return pico if sys.platform == 'darwin' else pico * 1024
+
+
+def renderizar_pdf(ruta, filas, subtitulo, progreso=None):
+    """Escribir un PDF; devuelve el pico de memoria del proceso que lo generó
+
+    Es una función de módulo para poder ejecutarse en un proceso del pool.
+    """
+    doc = SimpleDocTemplate(ruta, pagesize=A4)
+    story = contenido_reporte(filas, subtitulo)
+    if progreso:
+        total = len(story)
+
+        def avance(tipo, valor):
+            if tipo == 'PROGRESS':
+                progreso(valor / total)
+
+        doc.setProgressCallBack(avance)
+    doc.build(story)
+    return pico_memoria()
+
+
+def unir_pdfs(rutas, destino):
+    from pypdf import PdfWriter
+
+    writer = PdfWriter()
+    for ruta in rutas:
+        writer.append(ruta)
+    with open(destino, 'wb') as f:
+        writer.write(f)
+    writer.close()
+
+
+def generar_reporte(df, destino, por_agencia=False, procesos=None, progreso=None):
+    """Generar el reporte de entregas en PDF (pensado para un hilo de trabajo)
+
+    Con `por_agencia` cada AGENCIA se genera en paralelo en un pool de procesos
+    y los documentos se unen en `destino` en orden alfabético. `progreso(avance)`
+    recibe valores de 0 a 1. Devuelve {'filas', 'documentos', 'pico_memoria'}
+    con el pico en bytes del proceso que más memoria usó (None si no se pudo medir).
+    """
+    filas = filas_reporte(df)
+    if not por_agencia:
+        pico = renderizar_pdf(destino, filas, "Reporte de Entrega de Regalos", progreso)
+        return {'filas': len(filas), 'documentos': 1, 'pico_memoria': pico}
+
+    agencias = {}
+    for fila in filas:
+        agencias.setdefault(fila[2], []).append(fila)
+    del filas
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        rutas = {agencia: os.path.join(carpeta, f"{numero}.pdf")
+                 for numero, agencia in enumerate(sorted(agencias))}
+        total = sum(len(filas_agencia) for filas_agencia in agencias.values())
+        hechas = pico = 0
+
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            # Las agencias grandes primero para repartir mejor la carga
+            futuros = {
+                pool.submit(renderizar_pdf, rutas[agencia], agencias[agencia],
+                            f"Reporte de Entrega de Regalos - {agencia}"): agencia
+                for agencia in sorted(agencias, key=lambda agencia: -len(agencias[agencia]))
+            }
+            for futuro in as_completed(futuros):
+                pico = max(pico, futuro.result() or 0)
+                hechas += len(agencias[futuros[futuro]])
+                if progreso:
+                    progreso(hechas / total)
+
+        unir_pdfs([rutas[agencia] for agencia in sorted(agencias)], destino)
+
+    return {'filas': total, 'documentos': len(agencias), 'pico_memoria': pico or None}
+
+
+# Recibos de entrega: una hoja por asociado con la parte fija dibujada una sola
+# vez por documento como plantilla (Form XObject) y solo los datos por página
+COLUMNAS_RECIBO = ['CEDULA', 'NOMBRE 1', 'NOMBRE 2', 'APELLIDO 1', 'APELLIDO 2',
+                   'AGENCIA', 'EMPRESA', 'ESTADO', 'FECHA_ENTREGA', 'OBSERVACIONES']
+
+# Recibos por documento parcial al repartir el trabajo entre procesos
+RECIBOS_POR_TAREA = 500
+
+# Ancho de los valores del recibo (desde la columna de datos hasta el margen
+# derecho) y líneas que caben para las observaciones antes de la declaración
+ANCHO_VALOR_RECIBO = A4[0] - 60 - 190
+LINEAS_OBSERVACIONES = 3
+
+
+def filtrar_recibos(df, agencia=None, desde=None, hasta=None, estado='ENTREGADO'):
+    """Filas de recibo que cumplen el filtro, ordenadas por agencia y nombre
+
+    `desde` y `hasta` son fechas 'AAAA-MM-DD' inclusivas sobre FECHA_ENTREGA;
+    `estado` None incluye todos los estados.
+    """
+    texto = df.reindex(columns=COLUMNAS_RECIBO).fillna('').astype(str)
+    mascara = pd.Series(True, index=texto.index)
+    if agencia:
+        mascara &= texto['AGENCIA'] == agencia
+    if estado:
+        mascara &= texto['ESTADO'].where(texto['ESTADO'] != '', 'PENDIENTE') == estado
+    fecha = texto['FECHA_ENTREGA'].str[:10]
+    if desde:
+        mascara &= fecha >= desde
+    if hasta:
+        mascara &= (fecha <= hasta) & (fecha != '')
+    texto = texto[mascara].sort_values(['AGENCIA', 'APELLIDO 1', 'NOMBRE 1'])
+
+    nombre = (texto['NOMBRE 1'] + ' ' + texto['NOMBRE 2'] + ' ' +
+              texto['APELLIDO 1'] + ' ' + texto['APELLIDO 2']).str.split().str.join(' ')
+    return list(zip(texto['CEDULA'].tolist(), nombre.tolist(), texto['AGENCIA'].tolist(),
+                    texto['EMPRESA'].tolist(), texto['FECHA_ENTREGA'].tolist(),
+                    texto['OBSERVACIONES'].str[:90].tolist()))
+
+
+def dibujar_plantilla_recibo(c):
+    """Parte fija del recibo: títulos, rótulos de los campos y líneas de firma"""
+    ancho, alto = A4
+    c.beginForm('plantilla_recibo')
+    c.setFont('Helvetica-Bold', 18)
+    c.drawCentredString(ancho / 2, alto - 80, "COOPERENKA")
+    c.setFont('Helvetica', 13)
+    c.drawCentredString(ancho / 2, alto - 102, "Constancia de Entrega de Regalo")
+    c.line(60, alto - 118, ancho - 60, alto - 118)
+
+    c.setFont('Helvetica-Bold', 11)
+    for posicion, rotulo in enumerate(['Cédula:', 'Nombre:', 'Agencia:', 'Empresa:',
+                                       'Fecha de entrega:', 'Observaciones:']):
+        c.drawString(70, alto - 160 - posicion * 28, rotulo)
+
+    c.setFont('Helvetica', 10)
+    c.drawString(70, alto - 360, "Declaro haber recibido a satisfacción el regalo entregado por la cooperativa.")
+    c.line(70, alto - 460, 270, alto - 460)
+    c.line(ancho - 270, alto - 460, ancho - 70, alto - 460)
+    c.drawCentredString(170, alto - 475, "Firma del asociado")
+    c.drawCentredString(ancho - 170, alto - 475, "Entregado por")
+    c.endForm()
+
+
+def dibujar_recibo(c, fila):
+    ancho, alto = A4
+    c.doForm('plantilla_recibo')
+    c.setFont('Helvetica', 11)
+    *datos, observaciones = fila
+    for posicion, valor in enumerate(datos):
+        c.drawString(190, alto - 160 - posicion * 28, valor or '_' * 20)
+
+    # Las observaciones se ajustan al ancho de la hoja en varias líneas
+    lineas = simpleSplit(observaciones, 'Helvetica', 11, ANCHO_VALOR_RECIBO)[:LINEAS_OBSERVACIONES]
+    for numero, linea in enumerate(lineas or ['_' * 20]):
+        c.drawString(190, alto - 160 - len(datos) * 28 - numero * 13, linea)
+    c.showPage()
+
+
+def renderizar_recibos(filas, separados=False):
+    """Recibos de un bloque de filas (ejecutable en un proceso del pool)
+
+    Devuelve los bytes de un PDF con una página por recibo o, con `separados`,
+    una lista de (nombre de archivo, bytes) con un PDF por recibo.
+    """
+    if not separados:
+        salida = io.BytesIO()
+        c = canvas.Canvas(salida, pagesize=A4)
+        dibujar_plantilla_recibo(c)
+        for fila in filas:
+            dibujar_recibo(c, fila)
+        c.save()
+        return salida.getvalue()
+
+    archivos = []
+    for fila in filas:
+        salida = io.BytesIO()
+        c = canvas.Canvas(salida, pagesize=A4)
+        dibujar_plantilla_recibo(c)
+        dibujar_recibo(c, fila)
+        c.save()
+        agencia = re.sub(r'[^\w\- ]', '_', fila[2]).strip() or 'SIN AGENCIA'
+        cedula = re.sub(r'[^\w\- ]', '_', fila[0]).strip() or 'SIN CEDULA'
+        archivos.append((f"{agencia}/{cedula}.pdf", salida.getvalue()))
+    return archivos
+
+
+def nombre_unico(nombre, usados):
+    """Agregar un sufijo (_2, _3...) a un nombre ya usado dentro del ZIP"""
+    base, extension = os.path.splitext(nombre)
+    numero = 1
+    while nombre in usados:
+        numero += 1
+        nombre = f"{base}_{numero}{extension}"
+    usados.add(nombre)
+    return nombre
+
+
+def generar_recibos(df, destino, agencia=None, desde=None, hasta=None, estado='ENTREGADO',
+                    zip_por_recibo=False, procesos=None, progreso=None):
+    """Generar en lote los recibos de entrega que cumplen el filtro
+
+    Los recibos se reparten en bloques entre un pool de procesos. `destino` es
+    un PDF con un recibo por página o, con `zip_por_recibo`, un ZIP con un PDF
+    por asociado agrupado en carpetas por agencia. Devuelve la cantidad generada.
+    """
+    filas = filtrar_recibos(df, agencia, desde, hasta, estado)
+    if not filas:
+        return 0
+
+    bloques = [filas[inicio:inicio + RECIBOS_POR_TAREA] for inicio in range(0, len(filas), RECIBOS_POR_TAREA)]
+    resultados = [None] * len(bloques)
+    hechos = 0
+    with ProcessPoolExecutor(max_workers=procesos) as pool:
+        futuros = {pool.submit(renderizar_recibos, bloque, zip_por_recibo): numero
+                   for numero, bloque in enumerate(bloques)}
+        for futuro in as_completed(futuros):
+            numero = futuros[futuro]
+            resultados[numero] = futuro.result()
+            hechos += len(bloques[numero])
+            if progreso:
+                progreso(hechos / len(filas))
+
+    if zip_por_recibo:
+        # Los bloques se generan en procesos distintos: una cédula repetida solo
+        # se detecta aquí, al escribir el ZIP
+        usados = set()
+        with zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED) as archivo_zip:
+            for archivos in resultados:
+                for nombre, contenido in archivos:
+                    archivo_zip.writestr(nombre_unico(nombre, usados), contenido)
+    else:
+        unir_pdfs([io.BytesIO(contenido) for contenido in resultados], destino)
+    return len(filas)
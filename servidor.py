@@ -0,0 +1,197 @@
+import eventlet
+
+eventlet.monkey_patch()
+
+import os
+import tempfile
+from contextlib import closing, suppress
+
+from eventlet import patcher, tpool
+from flask import Flask, Response, jsonify, render_template, request
+from flask_socketio import SocketIO
+
+import base_datos
+from base_datos import DB_PATH, conectar, init_db
+from busqueda import BuscadorAsociados
+from exportacion import FORMATOS, exportar_base_datos
+from importacion import ErrorFormato, leer_por_bloques
+
+app = Flask(__name__)
+app.config['MAX_CONTENT_LENGTH'] = 64 * 1024 * 1024
+socketio = SocketIO(app, async_mode='eventlet')
+
+# Índice de nombres para la búsqueda aproximada, compartido por los hilos de tpool:
+# tras monkey_patch threading.Lock es verde y se bloquearía desde hilos nativos
+buscador = BuscadorAsociados(patcher.original('threading').Lock())
+
+# threading.local sin parchear: una conexión propia por cada hilo nativo de tpool
+_hilos = patcher.original('threading').local()
+
+
+def _ejecutar(funcion, *args):
+    conn = getattr(_hilos, 'conn', None)
+    if conn is None:
+        conn = _hilos.conn = conectar(DB_PATH)
+    try:
+        return funcion(conn, *args)
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+
+
+def db(funcion, *args):
+    """Ejecutar una función de base_datos en un hilo nativo sin bloquear el hub de eventlet
+
+    SQLite es una llamada bloqueante en C; en tpool solo espera el greenlet que
+    la pidió y el resto de estaciones sigue atendido mientras tanto.
+    """
+    return tpool.execute(_ejecutar, funcion, *args)
+
+
+def usuario_actual():
+    return request.headers.get('X-Usuario') or f"Web {request.remote_addr or ''}".strip()
+
+
+def estadisticas():
+    total, entregados, pendientes, novedades = db(base_datos.get_estadisticas)
+    return {'total': total, 'entregados': entregados, 'pendientes': pendientes, 'novedades': novedades}
+
+
+def publicar_cambio(anterior, nuevo):
+    """Difundir a todas las estaciones el registro modificado y la variación de contadores"""
+    if anterior == nuevo:
+        return
+    socketio.emit('asociado_actualizado', {
+        'asociado': nuevo,
+        'delta': base_datos.delta_contadores(anterior, nuevo),
+    })
+
+
+@app.route('/')
+def index():
+    return render_template('index_realtime.html')
+
+
+@app.route('/api/estadisticas')
+def api_estadisticas():
+    return jsonify(estadisticas())
+
+
+@app.route('/api/buscar')
+def api_buscar():
+    termino = request.args.get('q', '').strip()
+    if not termino:
+        return jsonify([])
+    return jsonify(db(buscador.buscar_registros, termino))
+
+
+@app.route('/api/asociados')
+def api_asociados():
+    # ?since=<versión>: solo lo que cambió desde entonces, más los ids eliminados
+    since = request.args.get('since', type=int)
+    return jsonify(db(base_datos.cambios_desde, since))
+
+
+@app.route('/api/entregar/<int:asociado_id>', methods=['POST'])
+def api_entregar(asociado_id):
+    anterior, nuevo = db(base_datos.aplicar_cambio, asociado_id,
+                         base_datos.registrar_entrega, usuario_actual())
+    if nuevo is None:
+        return jsonify(success=False, error='Asociado no encontrado'), 404
+    publicar_cambio(anterior, nuevo)
+    return jsonify(success=True)
+
+
+@app.route('/api/editar/<int:asociado_id>', methods=['PUT'])
+def api_editar(asociado_id):
+    datos = request.get_json(silent=True)
+    if not isinstance(datos, dict):
+        return jsonify(success=False, error='Se esperaba un objeto JSON'), 400
+    try:
+        anterior, nuevo = db(base_datos.aplicar_cambio, asociado_id,
+                             base_datos.actualizar_asociado, datos, usuario_actual())
+    except ValueError as e:
+        return jsonify(success=False, error=str(e)), 400
+    if nuevo is None:
+        return jsonify(success=False, error='Asociado no encontrado'), 404
+    publicar_cambio(anterior, nuevo)
+    return jsonify(success=True)
+
+
+@app.route('/api/cargar', methods=['POST'])
+def api_cargar():
+    archivo = request.files.get('file')
+    if archivo is None or not archivo.filename:
+        return jsonify(success=False, error='No se recibió ningún archivo'), 400
+    if not archivo.filename.lower().endswith(('.csv', '.xlsx', '.xls')):
+        return jsonify(success=False, error='Formato no soportado: use CSV o Excel'), 400
+
+    def importar(conn):
+        return base_datos.importar_asociados(conn, leer_por_bloques(archivo.stream, nombre=archivo.filename))
+
+    try:
+        resultado = db(importar)
+    except ErrorFormato as e:
+        return jsonify(success=False, error=str(e)), 400
+
+    # Una carga cambia demasiadas filas para difundirlas una a una
+    socketio.emit('datos_cargados', {'estadisticas': estadisticas()})
+
+    mensaje = (f"Importación completa: {resultado['insertados']} nuevos, "
+               f"{resultado['actualizados']} actualizados, {resultado['sin_cambios']} sin cambios")
+    if resultado['rechazados']:
+        mensaje += f", {resultado['rechazados']} filas rechazadas por datos incompletos"
+    return jsonify(success=True, message=mensaje, **resultado)
+
+
+TIPOS_EXPORTACION = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'parquet': 'application/vnd.apache.parquet',
+}
+
+
+@app.route('/api/exportar/<formato>')
+def api_exportar(formato):
+    # ?estado=&agencia=&observaciones=si|no&columnas=CEDULA,NOMBRE 1,...
+    if formato not in FORMATOS:
+        return jsonify(success=False, error=f"Formato no soportado: use {', '.join(FORMATOS)}"), 404
+    columnas = [c.strip() for c in request.args.get('columnas', '').split(',') if c.strip()] or None
+    filtros = {
+        'estado': request.args.get('estado') or None,
+        'agencia': request.args.get('agencia') or None,
+        'observaciones': {'si': True, 'no': False}.get(request.args.get('observaciones')),
+    }
+
+    # El archivo se escribe por lotes en disco y se envía desde ahí: la memoria
+    # del worker no depende del tamaño de la exportación
+    descriptor, ruta = tempfile.mkstemp(suffix=f'.{formato}')
+    os.close(descriptor)
+    try:
+        db(lambda conn: exportar_base_datos(conn, ruta, columnas, formato, **filtros))
+    except Exception as e:
+        with suppress(FileNotFoundError):
+            os.remove(ruta)
+        if isinstance(e, ValueError):
+            return jsonify(success=False, error=str(e)), 400
+        raise
+
+    def enviar():
+        try:
+            with open(ruta, 'rb') as archivo:
+                while bloque := archivo.read(256 * 1024):
+                    yield bloque
+        finally:
+            os.remove(ruta)
+
+    return Response(enviar(), mimetype=TIPOS_EXPORTACION[formato],
+                    headers={'Content-Disposition': f'attachment; filename=asociados.{formato}'})
+
+
+# Crear el esquema una sola vez al cargar el módulo (gunicorn lo importa por worker)
+with closing(conectar(DB_PATH)) as conn:
+    init_db(conn)
+
+
+if __name__ == '__main__':
+    socketio.run(app, host='0.0.0.0', port=5000)
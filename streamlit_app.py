@@ -1,8 +1,12 @@
+import os
+import tempfile
 import streamlit as st
 import pandas as pd
-from datetime import datetime
-import sqlite3
-import os
+import base_datos
+from base_datos import DB_PATH, TAMANO_PAGINA, EscritorAgrupado, PoolConexiones, init_db
+from busqueda import BuscadorAsociados
+from exportacion import COLUMNAS_EXPORTACION, FORMATOS, exportar_base_datos
+from importacion import ErrorFormato, leer_por_bloques
 
 # Configuración de la página
 st.set_page_config(
@@ -11,101 +15,279 @@ st.set_page_config(
     layout="wide"
 )
 
-# Crear/conectar base de datos
-def init_db():
-    conn = sqlite3.connect('cooperenka.db')
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS asociados (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        cedula TEXT UNIQUE NOT NULL,
-        nombre1 TEXT NOT NULL,
-        nombre2 TEXT,
-        apellido1 TEXT NOT NULL,
-        apellido2 TEXT,
-        agencia TEXT NOT NULL,
-        empresa TEXT NOT NULL,
-        observaciones TEXT,
-        estado TEXT DEFAULT 'PENDIENTE',
-        fecha_entrega TEXT,
-        usuario_entrega TEXT
-    )
-    ''')
-    
-    # Insertar datos de ejemplo si la tabla está vacía
-    cursor.execute('SELECT COUNT(*) FROM asociados')
-    if cursor.fetchone()[0] == 0:
-        datos_ejemplo = [
-            ('12345678', 'JUAN', 'CARLOS', 'GARCIA', 'PEREZ', 'PRINCIPAL', 'EMPRESA A', '', 'PENDIENTE', '', ''),
-            ('87654321', 'MARIA', 'ELENA', 'MARTINEZ', 'GONZALEZ', 'ZONA NORTE', 'EMPRESA B', 'Contactar antes de entregar', 'PENDIENTE', '', ''),
-            ('11223344', 'CARLOS', 'ALBERTO', 'RODRIGUEZ', 'HERNANDEZ', 'CENTRO', 'EMPRESA C', '', 'ENTREGADO', '2024-12-15 10:30', 'Sistema'),
-            ('99887766', 'ANA', 'SOFIA', 'LOPEZ', 'DIAZ', 'SUR', 'EMPRESA D', 'Verificar identidad', 'PENDIENTE', '', ''),
-            ('55443322', 'LUIS', 'MIGUEL', 'HERNANDEZ', 'JIMENEZ', 'ORIENTE', 'EMPRESA E', '', 'PENDIENTE', '', '')
-        ]
-        
-        cursor.executemany('''
-        INSERT INTO asociados (cedula, nombre1, nombre2, apellido1, apellido2, agencia, empresa, observaciones, estado, fecha_entrega, usuario_entrega)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', datos_ejemplo)
-    
-    conn.commit()
-    conn.close()
+# Pool de conexiones compartido entre reruns y sesiones
+@st.cache_resource
+def get_pool():
+    pool = PoolConexiones(DB_PATH)
+    with pool.conexion() as conn:
+        init_db(conn)
+    return pool
+
+# Único escritor del proceso: las entregas de todas las sesiones se confirman por lotes
+@st.cache_resource
+def get_escritor():
+    get_pool()  # La base ya inicializada
+    return EscritorAgrupado(DB_PATH)
+
+# Versión de los datos: una consulta como máximo cada 2 s, compartida por todas las
+# sesiones. Las lecturas de abajo la reciben como argumento, así que su caché
+# solo se recalcula cuando algo cambió en la base.
+@st.cache_data(ttl=2, show_spinner=False)
+def get_version_datos():
+    with get_pool().conexion() as conn:
+        return base_datos.get_version(conn)
+
+def invalidar_lecturas():
+    """Tras una escritura propia, la siguiente lectura ve la versión nueva sin esperar"""
+    get_version_datos.clear()
 
 # Funciones de base de datos
-def get_all_asociados():
-    conn = sqlite3.connect('cooperenka.db')
-    df = pd.read_sql_query('SELECT * FROM asociados ORDER BY apellido1, nombre1', conn)
-    conn.close()
-    return df
-
-def get_estadisticas():
-    conn = sqlite3.connect('cooperenka.db')
-    cursor = conn.cursor()
+@st.cache_data(max_entries=4, show_spinner=False)
+def get_agencias(version):
+    with get_pool().conexion() as conn:
+        return base_datos.get_agencias(conn)
+
+@st.cache_data(max_entries=200, show_spinner=False)
+def get_pagina_asociados(version, despues, **filtros):
+    with get_pool().conexion() as conn:
+        return base_datos.get_pagina_asociados(conn, despues=despues, limite=TAMANO_PAGINA + 1, **filtros)
+
+@st.cache_data(max_entries=50, show_spinner=False)
+def contar_asociados(version, **filtros):
+    with get_pool().conexion() as conn:
+        return base_datos.contar_asociados(conn, **filtros)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def get_estadisticas(version):
+    with get_pool().conexion() as conn:
+        return base_datos.get_estadisticas(conn)
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def get_resumen_agencias(version):
+    with get_pool().conexion() as conn:
+        return base_datos.get_resumen_agencias(conn)
+
+# Índice de nombres compartido por todas las sesiones; se pone al día por versión
+@st.cache_resource
+def get_buscador():
+    return BuscadorAsociados()
+
+@st.cache_data(max_entries=200, show_spinner=False)
+def buscar_asociado(version, termino):
+    with get_pool().conexion() as conn:
+        return get_buscador().buscar(conn, termino)
+
+def marcar_entregado(asociado_id, usuario):
+    get_escritor().ejecutar(base_datos.registrar_entrega, asociado_id, usuario)
+    invalidar_lecturas()
+
+def importar_archivo(archivo, progreso=None):
+    try:
+        with get_pool().conexion() as conn:
+            return base_datos.importar_asociados(conn, leer_por_bloques(archivo, nombre=archivo.name), progreso)
+    finally:
+        invalidar_lecturas()
+
+def reiniciar_paginacion():
+    """Al cambiar un filtro la lista vuelve a la primera página"""
+    st.session_state['cursores_lista'] = [None]
+    st.session_state.pop('archivo_exportado', None)
+
+def pagina_anterior():
+    st.session_state['cursores_lista'].pop()
+
+def pagina_siguiente(clave):
+    st.session_state['cursores_lista'].append(clave)
+
+def procesar_escaneo(entrega_automatica):
+    """Resolver la cédula leída por el escáner y dejar el campo listo para la siguiente"""
+    cedula = st.session_state.get('lectura_escaner', '').strip()
+    st.session_state['lectura_escaner'] = ''
+    if not cedula:
+        return
+
+    fila, entregado = None, False
+    if base_datos.es_cedula(cedula):
+        usuario = st.session_state.get('usuario_actual', 'Usuario Web')
+        if entrega_automatica:
+            entregado = get_escritor().ejecutar(base_datos.registrar_entrega_cedula, cedula, usuario)
+        with get_pool().conexion() as conn:
+            df = base_datos.buscar_por_cedula(conn, cedula)
+            fila = None if df.empty else df.iloc[0]
+        if entregado:
+            invalidar_lecturas()
+
+    st.session_state['ultimo_escaneo'] = (cedula, fila, entregado)
+
+def entregar_escaneado(asociado_id, cedula):
+    """Confirmar manualmente la entrega del último asociado escaneado"""
+    usuario = st.session_state.get('usuario_actual', 'Usuario Web')
+    marcar_entregado(asociado_id, usuario)
+    with get_pool().conexion() as conn:
+        fila = base_datos.buscar_por_cedula(conn, cedula).iloc[0]
+    st.session_state['ultimo_escaneo'] = (cedula, fila, True)
+
+def entregar_desde_tarjeta(asociado_id):
+    """Entregar desde una tarjeta de resultados y guardar la fila actualizada para redibujarla"""
+    usuario = st.session_state.get('usuario_actual', 'Usuario Web')
+    marcar_entregado(asociado_id, usuario)
+    with get_pool().conexion() as conn:
+        fila = base_datos.buscar_por_id(conn, asociado_id).iloc[0]
+    st.session_state.setdefault('filas_entregadas', {})[asociado_id] = fila
+
+@st.fragment(run_every=5)
+def mostrar_metricas():
+    """Contadores generales: se refrescan solos sin volver a ejecutar la página"""
+    total, entregados, pendientes, novedades = get_estadisticas(get_version_datos())
     
-    cursor.execute('SELECT COUNT(*) FROM asociados')
-    total = cursor.fetchone()[0]
+    col1, col2, col3, col4 = st.columns(4)
     
-    cursor.execute("SELECT COUNT(*) FROM asociados WHERE estado = 'ENTREGADO'")
-    entregados = cursor.fetchone()[0]
+    with col1:
+        st.metric("📊 Total Asociados", total)
     
-    pendientes = total - entregados
+    with col2:
+        st.metric("✅ Entregados", entregados, delta=f"{(entregados/total*100):.1f}%" if total > 0 else "0%")
     
-    cursor.execute("SELECT COUNT(*) FROM asociados WHERE observaciones != '' AND observaciones IS NOT NULL")
-    novedades = cursor.fetchone()[0]
+    with col3:
+        st.metric("⏳ Pendientes", pendientes)
     
-    conn.close()
+    with col4:
+        st.metric("⚠️ Con Novedades", novedades)
+
+@st.fragment
+def tarjeta_resultado(row):
+    # Tras una entrega el fragmento se repite con la fila actualizada
+    entregada_ahora = int(row['id']) in st.session_state.get('filas_entregadas', {})
+    if entregada_ahora:
+        row = st.session_state['filas_entregadas'][int(row['id'])]
     
-    return total, entregados, pendientes, novedades
-
-def buscar_asociado(termino):
-    conn = sqlite3.connect('cooperenka.db')
-    query = '''
-    SELECT * FROM asociados 
-    WHERE cedula LIKE ? OR nombre1 LIKE ? OR apellido1 LIKE ?
-    OR (nombre1 || ' ' || nombre2 || ' ' || apellido1 || ' ' || apellido2) LIKE ?
-    ORDER BY apellido1, nombre1
-    '''
-    df = pd.read_sql_query(query, conn, params=[f'%{termino}%']*4)
-    conn.close()
-    return df
+    with st.container():
+        col1, col2, col3 = st.columns([3, 1, 1])
 
-def marcar_entregado(asociado_id, usuario):
-    conn = sqlite3.connect('cooperenka.db')
-    cursor = conn.cursor()
+        with col1:
+            nombre_completo = f"{row['nombre1']} {row['nombre2']} {row['apellido1']} {row['apellido2']}".strip()
+            st.markdown(f"**👤 {nombre_completo}**")
+            st.write(f"📊 Cédula: {row['cedula']} | 🏢 Agencia: {row['agencia']} | 🏭 Empresa: {row['empresa']}")
+
+            if row['observaciones']:
+                st.markdown(f"""
+                <div class="observation-alert">
+                    <strong>⚠️ OBSERVACIONES:</strong> {row['observaciones']}
+                </div>
+                """, unsafe_allow_html=True)
+
+        with col2:
+            if row['estado'] == 'ENTREGADO':
+                st.success("✅ ENTREGADO")
+                if row['fecha_entrega']:
+                    st.caption(f"📅 {row['fecha_entrega']}")
+            else:
+                st.warning("⏳ PENDIENTE")
+
+        with col3:
+            if row['estado'] == 'PENDIENTE':
+                st.button("✅ Entregar", key=f"entregar_{row['id']}",
+                          on_click=entregar_desde_tarjeta, args=(int(row['id']),))
+            elif entregada_ahora:
+                st.success("✅ Regalo marcado como entregado!")
+
+        st.markdown("---")
+
+@st.fragment
+def exportar_lista(filtros):
+    """Exportar los asociados de los filtros actuales; solo se repite este fragmento"""
+    with st.expander("⬇️ Exportar registros filtrados"):
+        col_formato, col_columnas = st.columns([1, 3])
+        with col_formato:
+            formato = st.selectbox("Formato:", FORMATOS, format_func=str.upper, key='formato_exportacion')
+        with col_columnas:
+            columnas = st.multiselect("Columnas:", list(COLUMNAS_EXPORTACION),
+                                      default=list(COLUMNAS_EXPORTACION), key='columnas_exportacion')
+        
+        if st.button("📦 Preparar archivo", disabled=not columnas):
+            barra = st.progress(0.0, text="Exportando...")
+            # Se escribe por lotes a un temporal; en memoria queda solo el archivo final
+            descriptor, ruta = tempfile.mkstemp(suffix=f'.{formato}')
+            os.close(descriptor)
+            try:
+                with get_pool().conexion() as conn:
+                    filas = exportar_base_datos(
+                        conn, ruta, columnas, formato, progreso=lambda avance, filas:
+                        barra.progress(avance, text=f"Exportando... {filas:,} filas"), **filtros)
+                with open(ruta, 'rb') as archivo:
+                    st.session_state['archivo_exportado'] = (f'asociados.{formato}', archivo.read(), filas)
+            finally:
+                os.remove(ruta)
+            barra.empty()
+        
+        if 'archivo_exportado' in st.session_state:
+            nombre, contenido, filas = st.session_state['archivo_exportado']
+            st.download_button(f"💾 Descargar {nombre} ({filas:,} filas)", contenido,
+                               file_name=nombre, on_click='ignore')
+
+@st.fragment
+def pagina_busqueda():
+    """Página de búsqueda: escribir o escanear solo vuelve a ejecutar este fragmento"""
+    st.header("🔍 Buscar Asociado")
+    
+    # Modo escáner para lectores de código de barras / cédula
+    col_modo, col_auto = st.columns(2)
+    with col_modo:
+        modo_escaner = st.checkbox("📷 Modo escáner", help="Cada lectura busca la cédula exacta y limpia el campo para la siguiente")
+    with col_auto:
+        entrega_automatica = st.checkbox("⚡ Entregar automáticamente", disabled=not modo_escaner,
+                                         help="Confirma la entrega al leer la cédula, salvo si el asociado tiene observaciones")
     
-    fecha_actual = datetime.now().strftime('%Y-%m-%d %H:%M')
-    cursor.execute('''
-    UPDATE asociados 
-    SET estado = 'ENTREGADO', fecha_entrega = ?, usuario_entrega = ?
-    WHERE id = ?
-    ''', (fecha_actual, usuario, asociado_id))
+    if modo_escaner:
+        st.text_input("Escanear cédula:", key='lectura_escaner', placeholder="Esperando lectura...",
+                      on_change=procesar_escaneo, args=(entrega_automatica,))
+        search_term = ''
+        
+        if 'ultimo_escaneo' in st.session_state:
+            cedula, fila, entregado = st.session_state['ultimo_escaneo']
+            if fila is None:
+                st.error(f"❌ Cédula no encontrada: {cedula}")
+            else:
+                nombre_completo = f"{fila['nombre1']} {fila['nombre2'] or ''} {fila['apellido1']} {fila['apellido2'] or ''}"
+                if entregado:
+                    st.success(f"✅ ENTREGADO: {nombre_completo} ({cedula})")
+                elif fila['estado'] == 'ENTREGADO':
+                    st.info(f"ℹ️ {nombre_completo} ya había recibido su regalo el {fila['fecha_entrega']}")
+                else:
+                    if fila['observaciones']:
+                        st.markdown(f"""
+                        <div class="observation-alert">
+                            <strong>⚠️ OBSERVACIONES:</strong> {fila['observaciones']}
+                        </div>
+                        """, unsafe_allow_html=True)
+                    st.warning(f"⏳ PENDIENTE: {nombre_completo} ({cedula})")
+                    st.button("✅ Entregar", key=f"entregar_escaneo_{fila['id']}",
+                              on_click=entregar_escaneado, args=(int(fila['id']), cedula))
+    else:
+        # Campo de búsqueda
+        search_term = st.text_input(
+            "Buscar por cédula o nombre:",
+            placeholder="Ingresa cédula o nombre del asociado...",
+            help="Puedes buscar por número de cédula o por el inicio de cualquier nombre o apellido"
+        )
     
-    conn.commit()
-    conn.close()
+    if search_term:
+        resultados = buscar_asociado(get_version_datos(), search_term)
+        
+        if resultados.empty:
+            st.warning(f"❌ No se encontraron resultados para: '{search_term}'")
+        else:
+            st.success(f"✅ {len(resultados)} resultado(s) encontrado(s)")
+            if len(resultados) >= base_datos.LIMITE_BUSQUEDA:
+                st.caption(f"Mostrando los {base_datos.LIMITE_BUSQUEDA} resultados más relevantes. Escribe más letras para afinar la búsqueda.")
+            
+            # Cada tarjeta es un fragmento: entregar solo vuelve a dibujar esa tarjeta
+            st.session_state['filas_entregadas'] = {}
+            for _, row in resultados.iterrows():
+                tarjeta_resultado(row)
 
 # Inicializar base de datos
-init_db()
+get_pool()
 
 # CSS personalizado
 st.markdown("""
@@ -151,23 +333,14 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# Única consulta de un rerun sin cambios (y ninguna si la versión sigue en caché)
+version = get_version_datos()
+
 # Obtener estadísticas
-total, entregados, pendientes, novedades = get_estadisticas()
+total, entregados, pendientes, novedades = get_estadisticas(version)
 
 # Dashboard de estadísticas
-col1, col2, col3, col4 = st.columns(4)
-
-with col1:
-    st.metric("📊 Total Asociados", total)
-
-with col2:
-    st.metric("✅ Entregados", entregados, delta=f"{(entregados/total*100):.1f}%" if total > 0 else "0%")
-
-with col3:
-    st.metric("⏳ Pendientes", pendientes)
-
-with col4:
-    st.metric("⚠️ Con Novedades", novedades)
+mostrar_metricas()
 
 # Sidebar para navegación
 st.sidebar.title("🧭 Navegación")
@@ -178,56 +351,7 @@ page = st.sidebar.selectbox(
 
 # Contenido principal según la página
 if page == "🔍 Buscar Asociado":
-    st.header("🔍 Buscar Asociado")
-    
-    # Campo de búsqueda
-    search_term = st.text_input(
-        "Buscar por cédula o nombre:",
-        placeholder="Ingresa cédula o nombre del asociado...",
-        help="Puedes buscar por número de cédula o por cualquier parte del nombre"
-    )
-    
-    if search_term:
-        resultados = buscar_asociado(search_term)
-        
-        if resultados.empty:
-            st.warning(f"❌ No se encontraron resultados para: '{search_term}'")
-        else:
-            st.success(f"✅ {len(resultados)} resultado(s) encontrado(s)")
-            
-            for index, row in resultados.iterrows():
-                with st.container():
-                    col1, col2, col3 = st.columns([3, 1, 1])
-                    
-                    with col1:
-                        nombre_completo = f"{row['nombre1']} {row['nombre2']} {row['apellido1']} {row['apellido2']}".strip()
-                        st.markdown(f"**👤 {nombre_completo}**")
-                        st.write(f"📊 Cédula: {row['cedula']} | 🏢 Agencia: {row['agencia']} | 🏭 Empresa: {row['empresa']}")
-                        
-                        if row['observaciones']:
-                            st.markdown(f"""
-                            <div class="observation-alert">
-                                <strong>⚠️ OBSERVACIONES:</strong> {row['observaciones']}
-                            </div>
-                            """, unsafe_allow_html=True)
-                    
-                    with col2:
-                        if row['estado'] == 'ENTREGADO':
-                            st.success("✅ ENTREGADO")
-                            if row['fecha_entrega']:
-                                st.caption(f"📅 {row['fecha_entrega']}")
-                        else:
-                            st.warning("⏳ PENDIENTE")
-                    
-                    with col3:
-                        if row['estado'] == 'PENDIENTE':
-                            if st.button(f"✅ Entregar", key=f"entregar_{row['id']}"):
-                                usuario = st.session_state.get('usuario_actual', 'Usuario Web')
-                                marcar_entregado(row['id'], usuario)
-                                st.success("✅ Regalo marcado como entregado!")
-                                st.experimental_rerun()
-                    
-                    st.markdown("---")
+    pagina_busqueda()
 
 elif page == "📋 Lista Completa":
     st.header("📋 Lista Completa de Asociados")
@@ -236,35 +360,37 @@ elif page == "📋 Lista Completa":
     col1, col2, col3 = st.columns(3)
     
     with col1:
-        filtro_estado = st.selectbox("Filtrar por estado:", ["Todos", "PENDIENTE", "ENTREGADO"])
+        filtro_estado = st.selectbox("Filtrar por estado:", ["Todos", "PENDIENTE", "ENTREGADO"],
+                                     key='filtro_estado', on_change=reiniciar_paginacion)
     
     with col2:
-        df_asociados = get_all_asociados()
-        agencias = ["Todas"] + sorted(df_asociados['agencia'].unique().tolist())
-        filtro_agencia = st.selectbox("Filtrar por agencia:", agencias)
+        agencias = ["Todas"] + get_agencias(version)
+        filtro_agencia = st.selectbox("Filtrar por agencia:", agencias,
+                                      key='filtro_agencia', on_change=reiniciar_paginacion)
     
     with col3:
-        filtro_novedades = st.selectbox("Filtrar:", ["Todos", "Con observaciones", "Sin observaciones"])
+        filtro_novedades = st.selectbox("Filtrar:", ["Todos", "Con observaciones", "Sin observaciones"],
+                                        key='filtro_novedades', on_change=reiniciar_paginacion)
     
-    # Aplicar filtros
-    df_filtrado = df_asociados.copy()
-    
-    if filtro_estado != "Todos":
-        df_filtrado = df_filtrado[df_filtrado['estado'] == filtro_estado]
-    
-    if filtro_agencia != "Todas":
-        df_filtrado = df_filtrado[df_filtrado['agencia'] == filtro_agencia]
+    # Los filtros se resuelven en SQL; solo se trae la página visible
+    filtros = {
+        'estado': None if filtro_estado == "Todos" else filtro_estado,
+        'agencia': None if filtro_agencia == "Todas" else filtro_agencia,
+        'observaciones': {"Con observaciones": True, "Sin observaciones": False}.get(filtro_novedades),
+    }
+    cursores = st.session_state.setdefault('cursores_lista', [None])
     
-    if filtro_novedades == "Con observaciones":
-        df_filtrado = df_filtrado[df_filtrado['observaciones'].notna() & (df_filtrado['observaciones'] != '')]
-    elif filtro_novedades == "Sin observaciones":
-        df_filtrado = df_filtrado[(df_filtrado['observaciones'].isna()) | (df_filtrado['observaciones'] == '')]
+    # Una fila de más indica si existe página siguiente
+    df_pagina = get_pagina_asociados(version, cursores[-1], **filtros)
+    hay_siguiente = len(df_pagina) > TAMANO_PAGINA
+    df_pagina = df_pagina.iloc[:TAMANO_PAGINA]
     
-    st.subheader(f"📊 Registros ({len(df_filtrado)} de {len(df_asociados)})")
+    total_filtrado = contar_asociados(version, **filtros)
+    st.subheader(f"📊 Registros ({total_filtrado} de {total})")
     
-    if not df_filtrado.empty:
+    if not df_pagina.empty:
         # Preparar datos para mostrar
-        df_display = df_filtrado.copy()
+        df_display = df_pagina.copy()
         df_display['nombre_completo'] = df_display['nombre1'] + ' ' + df_display['nombre2'] + ' ' + df_display['apellido1'] + ' ' + df_display['apellido2']
         
         # Mostrar tabla
@@ -273,43 +399,78 @@ elif page == "📋 Lista Completa":
             use_container_width=True,
             hide_index=True
         )
+        
+        # Navegación por clave: la siguiente página empieza después de la última fila
+        ultima = df_pagina.iloc[-1]
+        clave = (ultima['apellido1'], ultima['nombre1'], int(ultima['id']))
+        total_paginas = max(1, -(-total_filtrado // TAMANO_PAGINA))
+        
+        col_anterior, col_pagina, col_siguiente = st.columns([1, 2, 1])
+        with col_anterior:
+            st.button("⬅️ Anterior", disabled=len(cursores) == 1, on_click=pagina_anterior)
+        with col_pagina:
+            st.caption(f"Página {len(cursores)} de {total_paginas}")
+        with col_siguiente:
+            st.button("Siguiente ➡️", disabled=not hay_siguiente, on_click=pagina_siguiente, args=(clave,))
     else:
         st.info("📭 No hay registros que coincidan con los filtros seleccionados.")
+    
+    exportar_lista(filtros)
 
 elif page == "📊 Estadísticas":
     st.header("📊 Estadísticas Detalladas")
     
-    df_asociados = get_all_asociados()
+    resumen = get_resumen_agencias(version)
     
-    if not df_asociados.empty:
+    if not resumen.empty:
         col1, col2 = st.columns(2)
         
         with col1:
             # Gráfico de estado
-            estados = df_asociados['estado'].value_counts()
+            estados = pd.Series({'ENTREGADO': entregados, 'PENDIENTE': pendientes}, name='count')
             st.subheader("📈 Estado de Entregas")
             st.bar_chart(estados)
         
         with col2:
             # Gráfico por agencia
-            agencias = df_asociados['agencia'].value_counts()
+            agencias = resumen.set_index('agencia')['total']
             st.subheader("🏢 Distribución por Agencia")
             st.bar_chart(agencias)
         
         # Tabla resumen por agencia
         st.subheader("📋 Resumen por Agencia")
-        resumen_agencias = df_asociados.groupby('agencia')['estado'].value_counts().unstack(fill_value=0)
-        if 'ENTREGADO' in resumen_agencias.columns and 'PENDIENTE' in resumen_agencias.columns:
-            resumen_agencias['Total'] = resumen_agencias.sum(axis=1)
-            resumen_agencias['% Entregados'] = (resumen_agencias['ENTREGADO'] / resumen_agencias['Total'] * 100).round(1)
+        resumen_agencias = resumen.set_index('agencia').rename(columns={
+            'total': 'Total', 'entregados': 'ENTREGADO', 'pendientes': 'PENDIENTE', 'novedades': 'Novedades'
+        })
+        resumen_agencias['% Entregados'] = (resumen_agencias['ENTREGADO'] / resumen_agencias['Total'] * 100).round(1)
         
-        st.dataframe(resumen_agencias, use_container_width=True)
+        st.dataframe(resumen_agencias[['ENTREGADO', 'PENDIENTE', 'Novedades', 'Total', '% Entregados']], use_container_width=True)
 
 elif page == "📁 Cargar Datos":
     st.header("📁 Cargar Datos")
     
-    st.info("🔄 Funcionalidad de carga disponible. Sistema funcionando con datos de ejemplo.")
+    archivo = st.file_uploader("Archivo de asociados (CSV o Excel):", type=['csv', 'xlsx', 'xls'],
+                               help="Los asociados existentes se actualizan por cédula; su estado de entrega se conserva")
+    
+    if archivo is not None and st.button("📥 Importar", type="primary"):
+        barra = st.progress(0.0, text="Importando...")
+        try:
+            resumen = importar_archivo(archivo, lambda avance: barra.progress(avance, text="Importando..."))
+        except ErrorFormato as e:
+            barra.empty()
+            st.error(f"❌ {e}")
+        except Exception as e:
+            barra.empty()
+            st.error(f"❌ Error al importar el archivo: {e}")
+        else:
+            barra.progress(1.0, text="Importación completa")
+            st.success(f"✅ {resumen['insertados']} nuevos, {resumen['actualizados']} actualizados, "
+                       f"{resumen['sin_cambios']} sin cambios")
+            if resumen['rechazados']:
+                st.warning(f"⚠️ {resumen['rechazados']} fila(s) rechazada(s) por datos obligatorios vacíos "
+                           "(cédula, nombre 1, apellido 1, agencia o empresa)")
     
+
     # Mostrar formato esperado
     st.subheader("📋 Formato Esperado")
     formato_ejemplo = pd.DataFrame({
@@ -0,0 +1,66 @@
+import pandas as pd
+import pytest
+
+import bitacora
+from bitacora import Bitacora
+from importacion import COLUMNA_NOMBRE, compactar_asociados
+
+
+@pytest.fixture
+def archivo(tmp_path, monkeypatch):
+    monkeypatch.setattr(bitacora, 'ARCHIVO_SESION', str(tmp_path / 'sesion.json'))
+    return str(tmp_path / 'asociados.csv')
+
+
+def asociados():
+    return compactar_asociados(pd.DataFrame({
+        'CEDULA': ['1', '2', '3'],
+        'APELLIDO 1': ['GARCIA', 'LOPEZ', 'DIAZ'], 'APELLIDO 2': ['', '', ''],
+        'NOMBRE 1': ['JUAN', 'ANA', 'LUIS'], 'NOMBRE 2': ['', '', ''],
+        'AGENCIA': ['NORTE', 'SUR', 'NORTE'], 'EMPRESA': ['A', 'B', 'A'],
+        'OBSERVACIONES': ['', '', ''], 'ESTADO': ['PENDIENTE'] * 3, 'FECHA_ENTREGA': [''] * 3,
+    }))
+
+
+def test_recuperar_instantanea_y_eventos(archivo):
+    df = asociados()
+    sesion = Bitacora(archivo, datos=df)
+    sesion.registrar('entrega', 0, {'ESTADO': 'ENTREGADO', 'FECHA_ENTREGA': '2024-12-15 10:00'})
+    sesion.registrar('edicion', 1, {'NOMBRE 1': 'ANDREA', 'AGENCIA': 'CENTRO'})
+    sesion.cerrar()
+
+    recuperados, secuencia, reproducidos = bitacora.recuperar(archivo)
+
+    assert (secuencia, reproducidos) == (2, 2)
+    assert recuperados.loc[0, 'ESTADO'] == 'ENTREGADO'
+    assert recuperados.loc[0, 'FECHA_ENTREGA'] == '2024-12-15 10:00'
+    assert recuperados.loc[1, 'AGENCIA'] == 'CENTRO'
+    assert recuperados.loc[1, COLUMNA_NOMBRE] == 'ANDREA LOPEZ'
+    assert recuperados.loc[2, 'ESTADO'] == 'PENDIENTE'
+
+
+def test_datos_recuperados_admiten_entregas(archivo):
+    # Solo la instantánea, sin eventos: los datos no pueden quedar de solo lectura
+    Bitacora(archivo, datos=asociados()).cerrar()
+
+    recuperados, _, reproducidos = bitacora.recuperar(archivo)
+    recuperados.loc[2, 'ESTADO'] = 'ENTREGADO'
+    recuperados.loc[2, 'CEDULA'] = '30'
+
+    assert reproducidos == 0
+    assert recuperados.loc[2, 'ESTADO'] == 'ENTREGADO'
+
+
+def test_instantanea_recorta_la_bitacora(archivo):
+    df = asociados()
+    sesion = Bitacora(archivo, datos=df)
+    sesion.registrar('entrega', 0, {'ESTADO': 'ENTREGADO', 'FECHA_ENTREGA': 'x'})
+    df.loc[0, ['ESTADO', 'FECHA_ENTREGA']] = ['ENTREGADO', 'x']
+    sesion.solicitar_instantanea(df)
+    sesion.registrar('entrega', 1, {'ESTADO': 'ENTREGADO', 'FECHA_ENTREGA': 'y'})
+    sesion.cerrar()
+
+    assert [evento['n'] for evento in bitacora.leer_eventos(sesion.ruta)] == [2]
+    recuperados, secuencia, reproducidos = bitacora.recuperar(archivo)
+    assert (secuencia, reproducidos) == (2, 1)
+    assert list(recuperados['ESTADO']) == ['ENTREGADO', 'ENTREGADO', 'PENDIENTE']
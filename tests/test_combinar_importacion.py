@@ -0,0 +1,95 @@
+import queue
+import threading
+
+import pandas as pd
+import pytest
+
+import app
+import bitacora
+from bitacora import Bitacora
+from importacion import compactar_asociados
+
+SUSPENDIDO = 'No entregar - Suspendido'
+
+
+def asociados():
+    return pd.DataFrame({
+        'CEDULA': ['1', '2', '3'],
+        'APELLIDO 1': ['GARCIA', 'LOPEZ', 'DIAZ'], 'APELLIDO 2': ['', '', ''],
+        'NOMBRE 1': ['JUAN', 'ANA', 'LUIS'], 'NOMBRE 2': ['', '', ''],
+        'AGENCIA': ['NORTE', 'SUR', 'NORTE'], 'EMPRESA': ['A', 'B', 'A'],
+        'OBSERVACIONES': [SUSPENDIDO, '', 'obs'], 'ESTADO': ['PENDIENTE'] * 3, 'FECHA_ENTREGA': [''] * 3,
+    })
+
+
+@pytest.fixture
+def sistema(tmp_path, monkeypatch):
+    """La aplicación sin ventana: solo los datos y sus índices"""
+    monkeypatch.setattr(bitacora, 'ARCHIVO_SESION', str(tmp_path / 'sesion.json'))
+    monkeypatch.setattr(app.messagebox, 'showinfo', lambda *args, **kwargs: None)
+    monkeypatch.setattr(app.messagebox, 'showwarning', lambda *args, **kwargs: None)
+    sistema = app.SistemaEntregaRegalos.__new__(app.SistemaEntregaRegalos)
+    sistema.datos_asociados = compactar_asociados(asociados())
+    sistema.contadores = app.ContadoresEntregas()
+    sistema.reconstruir_indices()
+    sistema.archivo_actual = str(tmp_path / 'asociados.csv')
+    sistema.bitacora = Bitacora(sistema.archivo_actual, datos=sistema.datos_asociados)
+    sistema.refrescar_filas = lambda indices: None
+    sistema.actualizar_tabla = sistema.actualizar_estadisticas = sistema.limpiar_busqueda = lambda: None
+    yield sistema
+    sistema.cerrar_bitacora()
+
+
+def combinar_archivo(sistema, tmp_path, df):
+    """Leer `df` como CSV igual que la importación y combinarlo con los datos cargados"""
+    ruta = str(tmp_path / 'nuevo.csv')
+    df.to_csv(ruta, index=False)
+    cola = queue.Queue()
+    sistema.leer_archivo_en_hilo(ruta, cola, threading.Event())
+    mensaje = cola.get()
+    while mensaje[0] == 'progreso':
+        mensaje = cola.get()
+    assert mensaje[0] == 'fin'
+    return sistema.combinar_importacion(mensaje[1], sistema.archivo_actual, *mensaje[2:])
+
+
+def test_archivo_sin_observaciones_las_conserva(sistema, tmp_path):
+    resumen = combinar_archivo(sistema, tmp_path, asociados().drop(columns='OBSERVACIONES'))
+
+    assert resumen == {'nuevos': 0, 'actualizados': 0, 'eliminados': 0, 'sin_cambios': 3}
+    assert list(sistema.datos_asociados['OBSERVACIONES']) == [SUSPENDIDO, '', 'obs']
+
+
+def test_cambios_sin_observaciones_conservan_las_guardadas(sistema, tmp_path):
+    nuevo = asociados().drop(columns='OBSERVACIONES')
+    nuevo.loc[0, 'EMPRESA'] = 'C'
+
+    resumen = combinar_archivo(sistema, tmp_path, nuevo)
+    sistema.cerrar_bitacora()
+
+    assert resumen['actualizados'] == 1
+    recuperados, _, _ = bitacora.recuperar(sistema.archivo_actual)
+    for datos in (sistema.datos_asociados, recuperados):
+        assert datos.loc[0, 'EMPRESA'] == 'C'
+        assert list(datos['OBSERVACIONES']) == [SUSPENDIDO, '', 'obs']
+
+
+def test_columna_observaciones_vacia_las_borra(sistema, tmp_path):
+    nuevo = asociados()
+    nuevo['OBSERVACIONES'] = ''
+
+    resumen = combinar_archivo(sistema, tmp_path, nuevo)
+
+    assert resumen['actualizados'] == 2
+    assert list(sistema.datos_asociados['OBSERVACIONES']) == ['', '', '']
+
+
+def test_archivo_vacio_no_modifica_los_datos(sistema, tmp_path):
+    antes = sistema.datos_asociados.copy()
+
+    resumen = combinar_archivo(sistema, tmp_path, asociados().iloc[:0])
+    sistema.cerrar_bitacora()
+
+    assert resumen is None
+    pd.testing.assert_frame_equal(sistema.datos_asociados, antes)
+    assert list(bitacora.leer_eventos(bitacora.rutas_sesion(sistema.archivo_actual)[0])) == []
@@ -0,0 +1,41 @@
+import sqlite3
+
+import pytest
+
+from base_datos import EscritorAgrupado
+
+
+def consultar(conn):
+    return conn.execute('SELECT 42').fetchone()[0]
+
+
+def test_error_al_conectar_responde_a_todos_y_reintenta(tmp_path):
+    escritor = EscritorAgrupado(str(tmp_path / 'no_existe' / 'entregas.db'))
+    futuros = [escritor.enviar(consultar) for _ in range(5)]
+
+    for futuro in futuros:
+        with pytest.raises(sqlite3.OperationalError):
+            futuro.result(5)
+
+    # La siguiente llamada arranca un hilo nuevo
+    escritor.ruta = str(tmp_path / 'entregas.db')
+    assert escritor.ejecutar(consultar) == 42
+    escritor.cerrar()
+
+
+def test_error_del_hilo_responde_al_lote_y_reintenta(tmp_path, monkeypatch):
+    escritor = EscritorAgrupado(str(tmp_path / 'entregas.db'))
+    ejecutar_lote = EscritorAgrupado._ejecutar_lote
+    llamadas = []
+
+    def fallar_una_vez(self, conn, lote):
+        llamadas.append(len(lote))
+        if len(llamadas) == 1:
+            raise RuntimeError('fallo del escritor')
+        return ejecutar_lote(self, conn, lote)
+
+    monkeypatch.setattr(EscritorAgrupado, '_ejecutar_lote', fallar_una_vez)
+    with pytest.raises(RuntimeError):
+        escritor.ejecutar(consultar)
+    assert escritor.ejecutar(consultar) == 42
+    escritor.cerrar()